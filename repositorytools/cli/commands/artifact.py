@@ -1,11 +1,14 @@
 from __future__ import print_function
 
 import argparse
+import csv
 import json
+import os
 import sys
 
 import repositorytools
-from repositorytools.cli.common import CLI
+import repositorytools.lib.concurrency
+from repositorytools.cli.common import CLI, add_retention_arguments, retention_rule_from_args, execute_cleanup_plan
 from repositorytools.lib.repository import logger
 
 __all__ = ['ArtifactCLI', 'artifact_cli']
@@ -26,13 +29,35 @@ class ArtifactCLI(CLI):
                                  "staging repo")
         subparser.add_argument("--upload-filelist", action="store_true", default=False, help="uploads list of uploaded "
                                                                                                  "files")
+        subparser.add_argument("--compress-filelist", action="store_true", default=False,
+                               help="sends the list of uploaded files gzipped")
         subparser.add_argument("--artifact", help="name of artifact, if omitted, will be detected from filename")
         subparser.add_argument("--version", help="version of artifact, if omitted, will be detected from filename")
         subparser.add_argument("-d", "--description", dest="description", default='No description',
                                    help="Description of a staging repository")
         subparser.add_argument("--use-direct-put", action="store_true", help="don't use REST API, but directly put the file to it's probable path. Doesn't generate maven metadata. Good for uploading to snapshot repositories.")
+        subparser.add_argument("--checksums", action="store_true", default=False,
+                               help="with --use-direct-put or -s, uploads also .sha1 and .md5 files computed while "
+                                    "the artifact is sent")
+        subparser.add_argument("--journal", action="store_true", default=False,
+                               help="skip files this host already uploaded to the repository, e.g. when a failed job "
+                                    "is restarted, and upload files only once when more jobs upload the same files")
+        subparser.add_argument("--verify", choices=['each', 'batch', 'none'], default='each',
+                               help="each: ask the server for URL of each uploaded file, batch: compute URLs locally "
+                                    "and check them all at the end, none: compute URLs locally without checking")
+        subparser.add_argument("--fan-out", action="store_true", default=False,
+                               help="upload also to servers listed in REPOSITORY_REPLICA_URLS, the file is read once "
+                                    "and sent to all servers at once")
+        subparser.add_argument("--required", choices=['all', 'primary', 'any'], default='all',
+                               help="with --fan-out, which servers have to succeed, primary is REPOSITORY_URL")
 
-        subparser.add_argument("local_file", help="path to an artifact on your machine")
+        subparser.add_argument("--filename",
+                               help="with - as local_file, name of the uploaded file, name and version are detected "
+                                    "from it, e.g. foo-1.2.3.tar.gz")
+
+        subparser.add_argument("local_file", help="path to an artifact on your machine, - streams it from standard "
+                                                  "input, which requires --use-direct-put or -s, e.g. tar cz dist | artifact "
+                                                  "upload --use-direct-put --filename foo-1.2.3.tar.gz - ...")
         subparser.add_argument("repo_id_or_profile_name", help="id of target repository (normal repo) or profile name (staging repo - option -s)")
         subparser.add_argument("group", help="artifact group")
         subparser.set_defaults(func=self.upload)
@@ -56,42 +81,231 @@ class ArtifactCLI(CLI):
         subparser.add_argument("coordinates", help="group:artifact:version[:classifier[:extension]]", nargs='+')
         subparser.set_defaults(func=self.set_metadata)
 
+        # set metadata of many artifacts
+        subparser = subparsers.add_parser('set-metadata-bulk', help="Sets metadata of many artifacts listed in a file."
+                                                                    " Only changed keys are sent")
+        subparser.add_argument("--format", dest="input_format", choices=['jsonl', 'csv'],
+                               help="format of the input file, if omitted, will be detected from file extension, "
+                                    "stdin is jsonl. jsonl: one object per line with keys coordinates, metadata and "
+                                    "optionally repo_id. csv: header with column coordinates, optionally repo_id, "
+                                    "other columns are metadata keys, empty values are set as empty strings")
+        subparser.add_argument("--max-workers", type=int, default=repositorytools.lib.concurrency.DEFAULT_MAX_WORKERS,
+                               help="number of requests sent in parallel")
+        subparser.add_argument("repo_id", help="id of repository containing artifacts without repo_id in input file")
+        subparser.add_argument("input_file", help="path to the input file, - for stdin")
+        subparser.set_defaults(func=self.set_metadata_bulk)
+
         # resolve
         subparser = subparsers.add_parser('resolve', help="Resolves artifacts' URLs")
+        subparser.add_argument("--version-scheme", choices=['maven', 'rpm'], default='maven',
+                               help="how versions are compared when version is a range, default %(default)s")
         subparser.add_argument("repo_id", help="id of repository containing the artifact")
-        subparser.add_argument("coordinates", help="group:artifact:version[:classifier[:extension]]", nargs='+')
+        subparser.add_argument("coordinates", help="group:artifact:version[:classifier[:extension]], version can be"
+                                                   " a range, e.g. [1.2,2.0), the newest matching version is used",
+                               nargs='+')
         subparser.set_defaults(func=self.resolve)
+
+        # download
+        subparser = subparsers.add_parser('download', help="Downloads artifacts, from the closest mirror listed in "
+                                                           "REPOSITORY_MIRROR_URLS if there are mirrors")
+        subparser.add_argument("--version-scheme", choices=['maven', 'rpm'], default='maven',
+                               help="how versions are compared when version is a range, default %(default)s")
+        subparser.add_argument("-o", "--output-dir", default='.', help="directory where artifacts are written, "
+                                                                        "default current directory")
+        subparser.add_argument("repo_id", help="id of repository containing the artifact")
+        subparser.add_argument("coordinates", help="group:artifact:version[:classifier[:extension]], version can be"
+                                                   " a range, e.g. [1.2,2.0), the newest matching version is used",
+                               nargs='+')
+        subparser.set_defaults(func=self.download)
+
+        # search
+        subparser = subparsers.add_parser('search', help="Searches artifacts in a local index of repository contents")
+        subparser.add_argument("--index", default=repositorytools.DEFAULT_INDEX_PATH,
+                               help="path to the index file, default %(default)s")
+        subparser.add_argument("--refresh", action="store_true", default=False,
+                               help="refresh the index before searching, done always if the repository was never "
+                                    "indexed")
+        subparser.add_argument("--fetch-sha1", action="store_true", default=False,
+                               help="when refreshing, download also sha1 checksums of new artifacts")
+        subparser.add_argument("--limit", type=int, help="maximum number of results")
+        subparser.add_argument("--output-format", choices=['urls', 'coordinates', 'json'], default='urls',
+                               help="format of the output, default %(default)s")
+        subparser.add_argument("repo_id", help="id of repository")
+        subparser.add_argument("query", nargs='?', default='',
+                               help="group[:artifact[:version[:classifier[:extension]]]], group and artifact are "
+                                    "prefixes, version can be a maven range, e.g. com.fooware:foo:[1.0,2.0)")
+        subparser.set_defaults(func=self.search)
+
+        # copy
+        subparser = subparsers.add_parser('copy', help="Copies artifacts to another repository, possibly on another "
+                                                       "server, without storing them on disk")
+        subparser.add_argument("--source-url", help="url of the source repository server, if omitted, artifacts are "
+                                                    "copied within one server")
+        subparser.add_argument("--source-user", help="username for the source server, password is read from "
+                                                     "SOURCE_REPOSITORY_PASSWORD environment variable. If omitted, "
+                                                     "the source server is accessed anonymously")
+        subparser.add_argument("--no-skip-existing", dest="skip_existing", action="store_false", default=True,
+                               help="copy also artifacts whose sha1 in destination is the same")
+        subparser.add_argument("--max-workers", type=int, default=repositorytools.lib.concurrency.DEFAULT_MAX_WORKERS,
+                               help="number of artifacts copied in parallel")
+        subparser.add_argument("source_repo_id", help="id of repository containing the artifacts")
+        subparser.add_argument("repo_id", help="id of destination repository")
+        subparser.add_argument("coordinates", help="group:artifact:version[:classifier[:extension]]", nargs='+')
+        subparser.set_defaults(func=self.copy)
+
+        # cleanup
+        subparser = subparsers.add_parser('cleanup', help="Deletes old versions of artifacts from a repository, "
+                                                          "listed in a local index (see search)")
+        subparser.add_argument("--index", default=repositorytools.DEFAULT_INDEX_PATH,
+                               help="path to the index file, default %(default)s")
+        subparser.add_argument("--version-scheme", choices=['maven', 'rpm'], default='maven',
+                               help="how versions are ordered, default %(default)s")
+        add_retention_arguments(subparser)
+        subparser.add_argument("repo_id", help="id of repository")
+        subparser.set_defaults(func=self.cleanup)
         return parser
 
-    def resolve(self, args):
+    def _resolve_artifacts(self, args):
         artifacts = [ repositorytools.RemoteArtifact.from_repo_id_and_coordinates(args.repo_id, coordinates_item)
                       for coordinates_item in args.coordinates ]
 
         for artifact in artifacts:
-            self.repository.resolve_artifact(artifact)
+            if artifact.version.startswith(('[', '(')):
+                self.repository.resolve_latest(artifact, scheme=args.version_scheme)
+            else:
+                self.repository.resolve_artifact(artifact)
+
+        return artifacts
+
+    def resolve(self, args):
+        artifacts = self._resolve_artifacts(args)
 
         output = '\n'.join(artifact.url for artifact in artifacts)
-        print(output)
+        print(output, file=self.out)
+        return output
+
+    def download(self, args):
+        paths = [self.repository.download_artifact(artifact, args.output_dir)
+                 for artifact in self._resolve_artifacts(args)]
+
+        output = '\n'.join(paths)
+        print(output, file=self.out)
         return output
 
+    def search(self, args):
+        fields = args.query.split(':')
+        fields += [''] * (5 - len(fields))
+        group, artifact, version, classifier, extension = fields[:5]
+
+        index = repositorytools.RepositoryIndex(args.index)
+        try:
+            if args.refresh or index.get_refresh_time(args.repo_id) is None:
+                index.refresh(self.repository, args.repo_id, fetch_sha1=args.fetch_sha1)
+
+            artifacts = index.search(args.repo_id, group=group, artifact=artifact, version=version or None,
+                                     classifier=classifier or None, extension=extension or None, limit=args.limit)
+        finally:
+            index.close()
+
+        if args.output_format == 'json':
+            output = '\n'.join(json.dumps({'coordinates': a.get_coordinates_string(), 'url': a.url, 'sha1': a.sha1})
+                               for a in artifacts)
+        elif args.output_format == 'coordinates':
+            output = '\n'.join(a.get_coordinates_string() for a in artifacts)
+        else:
+            output = '\n'.join(a.url for a in artifacts)
+
+        print(output, file=self.out)
+        return artifacts
+
+    def copy(self, args):
+        if args.source_url:
+            password = os.environ.get('SOURCE_REPOSITORY_PASSWORD')
+            if args.source_user and not password:
+                raise ValueError('--source-user requires SOURCE_REPOSITORY_PASSWORD environment variable')
+
+            # REPOSITORY_* variables describe the destination server, its credentials mustn't be sent to the source
+            source_client = repositorytools.repository_client_factory(
+                repository_url=args.source_url, user=args.source_user or '', password=password, mirror_urls=(),
+                replica_urls=())
+        else:
+            source_client = self.repository
+
+        artifacts = [repositorytools.RemoteArtifact.from_repo_id_and_coordinates(args.source_repo_id, coordinates_item)
+                     for coordinates_item in args.coordinates]
+        copied = self.repository.copy_artifacts(artifacts, args.repo_id, source_client=source_client,
+                                                skip_existing=args.skip_existing, max_workers=args.max_workers)
+
+        print('\n'.join(artifact.url for artifact in copied), file=self.out)
+        return copied
+
+    def cleanup(self, args):
+        rule = retention_rule_from_args(args)
+
+        index = repositorytools.RepositoryIndex(args.index)
+        try:
+            # deciding on stale data could delete something we want to keep
+            index.refresh(self.repository, args.repo_id)
+            artifacts = index.search(args.repo_id)
+        finally:
+            index.close()
+
+        # the index lists all artifacts of the repository
+        plan = repositorytools.plan_artifacts_cleanup(artifacts, rule, scheme=args.version_scheme,
+                                                      whole_directories=True)
+        return execute_cleanup_plan(plan, self.repository, args, self.out)
+
     def upload(self, args):
+        if args.local_file == '-':
+            if not args.filename:
+                raise ValueError('--filename is required when uploading from standard input')
+
+            # multipart uploads of the REST API need the length in advance, so the whole input would be read to memory
+            if not args.use_direct_put and not args.staging:
+                raise ValueError('--use-direct-put or -s is required when uploading from standard input')
+
+            # the content is streamed to the server, not stored in a temporary file
+            local_path, source = args.filename, getattr(sys.stdin, 'buffer', sys.stdin)
+        else:
+            local_path, source = args.local_file, None
+
         try:
-            artifact = repositorytools.LocalArtifact(local_path=args.local_file, group=args.group,
-                                                     artifact=args.artifact, version=args.version)
+            artifact = repositorytools.LocalArtifact(local_path=local_path, group=args.group, artifact=args.artifact,
+                                                     version=args.version, source=source)
         except repositorytools.NameVerDetectionError as e:
             logger.exception('Unable to create instance of local artifact: %s', e)
             sys.exit(1)
 
+        journal = repositorytools.UploadJournal() if args.journal else None
+        checksum_sidecars = ('sha1', 'md5') if args.checksums else ()
+
+        if args.fan_out:
+            if args.staging:
+                raise ValueError('--fan-out can not be used with staging repositories')
+
+            result = self.repository.publish_artifacts([artifact], args.repo_id_or_profile_name,
+                                                       required=args.required, use_direct_put=args.use_direct_put,
+                                                       verify=args.verify, checksum_sidecars=checksum_sidecars)
+            return result.remote_artifacts
+
         if args.staging:
             if not args.use_existing:
                 return self.repository.upload_artifacts_to_new_staging([artifact], args.repo_id_or_profile_name, True,
                                                                        description=args.description,
-                                                                       upload_filelist=args.upload_filelist)
+                                                                       upload_filelist=args.upload_filelist,
+                                                                       compress_filelist=args.compress_filelist,
+                                                                       verify=args.verify,
+                                                                       checksum_sidecars=checksum_sidecars)
             else:
                 return self.repository.upload_artifacts_to_staging([artifact], args.repo_id_or_profile_name, True,
-                                                                   upload_filelist=args.upload_filelist)
+                                                                   upload_filelist=args.upload_filelist,
+                                                                   compress_filelist=args.compress_filelist,
+                                                                   verify=args.verify, journal=journal,
+                                                                   checksum_sidecars=checksum_sidecars)
         else:
-            return self.repository.upload_artifacts([artifact], args.repo_id_or_profile_name, use_direct_put=args.use_direct_put)
+            return self.repository.upload_artifacts([artifact], args.repo_id_or_profile_name, use_direct_put=args.use_direct_put,
+                                                    verify=args.verify, journal=journal,
+                                                    checksum_sidecars=checksum_sidecars)
 
     def delete(self, args):
         self.repository.delete_artifact(args.url)
@@ -100,14 +314,67 @@ class ArtifactCLI(CLI):
         artifact = repositorytools.RemoteArtifact.from_repo_id_and_coordinates(args.repo_id, args.coordinates)
         metadata = self.repository.get_artifact_metadata(artifact)
         output = json.dumps(metadata)
-        print(output)
+        print(output, file=self.out)
         return output
 
     def set_metadata(self, args):
         metadata = json.loads(args.metadata)
-        for coordinates_item in args.coordinates:
-            artifact = repositorytools.RemoteArtifact.from_repo_id_and_coordinates(args.repo_id, coordinates_item)
-            self.repository.set_artifact_metadata(artifact, metadata)
+        artifacts_metadata = [(repositorytools.RemoteArtifact.from_repo_id_and_coordinates(args.repo_id,
+                                                                                           coordinates_item), metadata)
+                              for coordinates_item in args.coordinates]
+        self.repository.set_artifacts_metadata(artifacts_metadata)
+
+    def set_metadata_bulk(self, args):
+        input_format = args.input_format or _detect_metadata_file_format(args.input_file)
+
+        if args.input_file == '-':
+            artifacts_metadata = read_artifacts_metadata(sys.stdin, args.repo_id, input_format)
+        else:
+            with open(args.input_file) as f:
+                artifacts_metadata = read_artifacts_metadata(f, args.repo_id, input_format)
+
+        return self.repository.set_artifacts_metadata(artifacts_metadata, max_workers=args.max_workers)
+
+
+def _detect_metadata_file_format(path):
+    if path == '-':
+        return 'jsonl'
+
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+
+    if extension in ('jsonl', 'json'):
+        return 'jsonl'
+    elif extension == 'csv':
+        return 'csv'
+    else:
+        raise ValueError('Unable to detect format of {path}, please specify --format'.format(path=path))
+
+
+def read_artifacts_metadata(f, repo_id, input_format):
+    """
+    Reads (RemoteArtifact, metadata) pairs from a file, see help of set-metadata-bulk for description of formats.
+
+    :param f: file object
+    :param repo_id: id of repository used for records without repo_id
+    :param input_format: 'jsonl' or 'csv'
+    :return: list of (RemoteArtifact, dict) pairs
+    """
+    if input_format == 'jsonl':
+        records = (json.loads(line) for line in f if line.strip())
+    elif input_format == 'csv':
+        # empty values are kept, a row shorter than the header has None in the missing columns, a longer one has the
+        # extra values under the key None
+        records = ({'coordinates': row.pop('coordinates'), 'repo_id': row.pop('repo_id', None),
+                    'metadata': dict((key, value) for key, value in row.items()
+                                     if key is not None and value is not None)}
+                   for row in csv.DictReader(f))
+    else:
+        raise ValueError('Unknown format {input_format}'.format(input_format=input_format))
+
+    return [(repositorytools.RemoteArtifact.from_repo_id_and_coordinates(record.get('repo_id') or repo_id,
+                                                                         record['coordinates']),
+             record['metadata'])
+            for record in records]
 
 
 artifact_cli = ArtifactCLI()
@@ -1,9 +1,16 @@
 from __future__ import print_function
 
 import argparse
+import csv
+import heapq
+import itertools
 import json
+from collections import OrderedDict
 
-from repositorytools.cli.common import CLI
+import six
+
+import repositorytools
+from repositorytools.cli.common import CLI, add_retention_arguments, retention_rule_from_args, execute_cleanup_plan
 
 __all__ = ['RepoCLI', 'repo_cli']
 
@@ -49,10 +56,36 @@ class RepoCLI(CLI):
         # list
         subparser = subparsers.add_parser('list', help='Lists all reposititories')
         subparser.add_argument("-s", "--staging", action="store_true", help='List staging repositories instead of normal repositories')
-        subparser.add_argument("--output-format", help='Format of the output list', choices=['json', 'ids'])
+        subparser.add_argument("--output-format", help='Format of the output list, json is one array, jsonl one object '
+                                                      'per line, default ids',
+                               choices=['json', 'jsonl', 'csv', 'tsv', 'ids'])
         subparser.add_argument("--filter", help='JSON-serialized dictionary containing filters, for example \'{"description":"foo"}\'')
+        subparser.add_argument("--fields", help='comma-separated fields of repositories to output, default all for '
+                                                'json and jsonl, {fields} for csv and tsv'.format(
+                                                    fields=','.join(_DEFAULT_TABLE_FIELDS)))
+        subparser.add_argument("--sort", metavar="FIELD", help='sort by a field, -FIELD for descending order, e.g. '
+                                                               '-createdTimestamp')
+        subparser.add_argument("--limit", type=int, help='maximum number of repositories')
 
         subparser.set_defaults(func=self.list)
+
+        # wait
+        subparser = subparsers.add_parser('wait', help='Waits until staging repositories are closed, released etc. '
+                                                       'Prints id of each repository as soon as it gets there')
+        subparser.add_argument("--state", choices=['open', 'closed', 'released', 'dropped'], default='closed',
+                               help='wanted state of the repositories')
+        subparser.add_argument("--timeout", type=float, default=600, help='maximum number of seconds to wait')
+        subparser.add_argument("repo_ids", help='id of staging repository, e.g. releases-1000', nargs='+')
+        subparser.set_defaults(func=self.wait)
+
+        # cleanup
+        subparser = subparsers.add_parser('cleanup', help='Drops old staging repositories')
+        subparser.add_argument("-s", "--staging", action="store_true", help='Cleanup staging repositories, the only'
+                                                                            ' supported option now')
+        subparser.add_argument("--filter", help='JSON-serialized dictionary containing filters, for example '
+                                                '\'{"type":"closed"}\'')
+        add_retention_arguments(subparser)
+        subparser.set_defaults(func=self.cleanup)
         return parser
 
     def create(self, args):
@@ -80,23 +113,134 @@ class RepoCLI(CLI):
             raise Exception('Drop of normal repositories not supported yet')
 
     def list(self, args):
+        """
+        Writes repositories one by one as they're parsed from the response
+
+        :return: number of listed repositories
+        """
+        output_format = args.output_format or 'ids'
+        if args.fields and output_format == 'ids':
+            raise ValueError('--fields can be used only with --output-format json, jsonl, csv or tsv')
+
         if args.staging:
             if args.filter:
                 filter_dict = json.loads(args.filter)
             else:
                 filter_dict = None
-            repos = self.repository.list_staging_repos(filter_dict)
+            repos = self.repository.iter_staging_repos(filter_dict)
         else:
             # repos = self.repository.list_repos(args.filter)
             raise Exception('Listing normal repositories not supported yet')
 
-        if args.output_format == 'json':
-            output = json.dumps(repos)
+        fields = args.fields.split(',') if args.fields else None
+        if fields is None and args.output_format in ('csv', 'tsv'):
+            fields = list(_DEFAULT_TABLE_FIELDS)
+
+        if fields is not None:
+            repos = (_project(repo, fields) for repo in repos)
+
+        repos = _sort_and_limit(repos, args.sort, args.limit)
+        return _write_records(repos, output_format, fields, self.out)
+
+    def wait(self, args):
+        def print_reached(repo_id, data):
+            print(repo_id, file=self.out)
+            self.out.flush()
+
+        return self.repository.wait_for_staging_state(args.repo_ids, args.state, timeout=args.timeout,
+                                                      on_reached=print_reached)
+
+    def cleanup(self, args):
+        if not args.staging:
+            raise Exception('Cleanup of normal repositories not supported yet, use artifact cleanup')
+
+        rule = retention_rule_from_args(args)
+        filter_dict = json.loads(args.filter) if args.filter else None
+        plan = repositorytools.plan_staging_cleanup(self.repository.list_staging_repos(filter_dict), rule)
+        return execute_cleanup_plan(plan, self.repository, args, self.out)
+
+
+_DEFAULT_TABLE_FIELDS = ('repositoryId', 'type', 'profileName', 'userId', 'createdDate', 'description')
+
+# output is flushed after this many records, so a consumer of a pipe gets them in batches
+_FLUSH_EVERY = 1000
+
+
+def _project(record, fields):
+    return OrderedDict((field, record.get(field)) for field in fields)
+
+
+def _sort_and_limit(records, sort=None, limit=None):
+    """
+    :param records: iterable of dicts
+    :param sort: field to sort by, -field for descending order, None keeps order
+    :param limit: maximum number of records, None for all
+    :return: iterable of dicts, without sort it's lazy, with limit only the first records are kept in memory
+    """
+    if sort is None:
+        return records if limit is None else itertools.islice(records, limit)
+
+    field = sort.lstrip('-')
+    reverse = sort.startswith('-')
+
+    def key(record):
+        # missing values go last
+        value = record.get(field)
+        return (value is None) != reverse, value
+
+    if limit is None:
+        return sorted(records, key=key, reverse=reverse)
+
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    return select(limit, records, key=key)
+
+
+def _format_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def _write_records(records, output_format, fields, out):
+    """
+    Writes records one by one, flushing them in batches
+
+    :param output_format: json, jsonl, csv, tsv or ids
+    :param fields: names of columns of csv and tsv
+    :return: number of written records
+    """
+    count = 0
+    writer = None
+
+    if output_format in ('csv', 'tsv'):
+        writer = csv.writer(out, delimiter='\t' if output_format == 'tsv' else ',', lineterminator='\n')
+        writer.writerow(fields)
+    elif output_format == 'json':
+        out.write('[')
+
+    for record in records:
+        if output_format == 'jsonl':
+            out.write(json.dumps(record) + '\n')
+        elif output_format == 'json':
+            out.write((', ' if count else '') + json.dumps(record))
+        elif writer is not None:
+            writer.writerow([_format_cell(record.get(field)) for field in fields])
         else:
-            output = '\n'.join(repo['repositoryId'] for repo in repos)
+            out.write(record['repositoryId'] + '\n')
+
+        count += 1
+        if count % _FLUSH_EVERY == 0:
+            out.flush()
+
+    if output_format == 'json':
+        out.write(']\n')
+    out.flush()
 
-        print(output)
-        return output
+    return count
 
 
 repo_cli = RepoCLI()
@@ -1,12 +1,17 @@
 import abc
-import collections
+import argparse
+import json
 import logging
+import shlex
 import sys
 
-# noinspection PyUnresolvedReferences
-from six.moves import http_client
+try:
+    from collections.abc import Callable
+except ImportError:  # Python 2
+    from collections import Callable
 
 import repositorytools
+from repositorytools.lib.concurrency import imap_concurrently, DEFAULT_MAX_WORKERS
 
 logger = logging.getLogger(sys.argv[0])
 
@@ -14,6 +19,9 @@ logger = logging.getLogger(sys.argv[0])
 def configure_logging(quiet, debug):
     logging.captureWarnings(True)
     if debug:
+        # noinspection PyUnresolvedReferences
+        from six.moves import http_client
+
         logging.basicConfig(level=logging.DEBUG)
         http_client.HTTPConnection.debuglevel = 1
         requests_log = logging.getLogger("requests.packages.urllib3")
@@ -23,9 +31,128 @@ def configure_logging(quiet, debug):
         logging.basicConfig(level=logging.INFO)
 
 
-class CLI(collections.Callable):
+def add_retention_arguments(parser):
+    """
+    Adds arguments describing a retention rule to a sub-command parser, see retention_rule_from_args
+    """
+    parser.add_argument("--pattern", default='*', help="shell-style pattern of items which may be deleted, default "
+                                                       "%(default)s")
+    parser.add_argument("--keep-last", type=int, help="number of newest items which are always kept")
+    parser.add_argument("--older-than", type=float, metavar="DAYS", help="delete only items older than DAYS")
+    parser.add_argument("--execute", action="store_true", default=False,
+                        help="really delete, without this only prints what would be deleted")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="number of requests sent in parallel")
+
+
+def retention_rule_from_args(args):
+    if args.keep_last is None and args.older_than is None:
+        raise ValueError('At least one of --keep-last and --older-than has to be specified')
+
+    return repositorytools.RetentionRule(pattern=args.pattern, keep_last=args.keep_last,
+                                         older_than_days=args.older_than)
+
+
+def execute_cleanup_plan(plan, repository, args, out=None):
+    """
+    Prints the plan and executes it if --execute was given
+
+    :param out: stream the plan is printed to, default stdout
+    :return: the plan
+    """
+    lines = plan.describe()
+    (out or sys.stdout).write('\n'.join(lines) + '\n')
+
+    if args.execute:
+        plan.execute(repository, max_workers=args.max_workers)
+        logger.info('Deleted %d items', len(lines))
+    else:
+        logger.info('Dry run, %d items would be deleted, use --execute to delete them', len(lines))
+
+    return plan
+
+
+class _Profiling(object):
+    """
+    Context manager implementing --timings and --profile
+
+    With --profile, the main thread runs under cProfile, whose stats are saved to FILE, they can be viewed by
+    python -m pstats FILE. Where tracemalloc is available, the biggest allocations are written to FILE.memory.txt.
+    Durations of phases of repository operations are printed to stderr as a table at the end.
+    """
+    MEMORY_TOP = 30
+
+    def __init__(self, profile_path, timings):
+        self.profile_path = profile_path
+        self.recorder = repositorytools.SpanRecorder() if profile_path or timings else None
+        self._profiler = None
+        self._tracemalloc = None
+
+    def __enter__(self):
+        if self.recorder is not None:
+            self.recorder.__enter__()
+
+        if self.profile_path:
+            # profilers are imported only when asked for, they aren't needed by normal runs
+            import cProfile
+
+            try:
+                import tracemalloc
+            except ImportError:  # Python 2
+                logger.info('tracemalloc is not available, memory is not profiled')
+            else:
+                self._tracemalloc = tracemalloc
+                tracemalloc.start()
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+            logger.info('Profile saved to %s', self.profile_path)
+
+        if self._tracemalloc is not None:
+            snapshot = self._tracemalloc.take_snapshot()
+            self._tracemalloc.stop()
+            memory_path = self.profile_path + '.memory.txt'
+
+            with open(memory_path, 'w') as f:
+                for statistic in snapshot.statistics('lineno')[:self.MEMORY_TOP]:
+                    f.write('{0}\n'.format(statistic))
+            logger.info('Biggest allocations saved to %s', memory_path)
+
+        if self.recorder is not None:
+            self.recorder.__exit__(exc_type, exc_val, exc_tb)
+            if self.recorder.get_summary():
+                sys.stderr.write(self.recorder.format_summary() + '\n')
+
+
+def _to_json(obj):
+    """
+    Makes results of sub-commands serializable, used as default of json.dumps
+    """
+    if isinstance(obj, repositorytools.Artifact):
+        result = {'coordinates': obj.get_coordinates_string()}
+
+        for attribute in ('repo_id', 'url'):
+            if hasattr(obj, attribute):
+                result[attribute] = getattr(obj, attribute)
+
+        return result
+
+    return str(obj)
+
+
+class CLI(Callable):
     """
     Base class for cli
+
+    Parser and repository client are created lazily, so importing a command and asking for its version or help is
+    fast.
     """
     __metaclass__ = abc.ABCMeta
 
@@ -36,18 +163,104 @@ class CLI(collections.Callable):
         """
         pass
 
+    @staticmethod
+    def _add_global_arguments(parser):
+        """
+        Adds arguments which don't belong to any sub-command
+        """
+        parser.add_argument("-D", "--debug", action="store_true", dest="debug", default=False,
+                            help="Print lots of debugging information")
+        parser.add_argument("-Q", "--quiet", action="store_true", dest="quiet", default=False,
+                            help="Print less information")
+        parser.add_argument("-V", "--version", action="store_true", dest="display_version", default=False,
+                            help="Prints version and exit")
+        parser.add_argument("--batch", metavar="FILE",
+                            help="Runs many sub-commands over one repository session. FILE (- for stdin) contains "
+                                 "one command per line, either a JSON list of arguments, e.g. "
+                                 "[\"resolve\", \"releases\", \"com.fooware:foo:1.0\"], a JSON object with "
+                                 "keys args and optionally id, or a plain command line. One JSON result per "
+                                 "line is printed to stdout")
+        parser.add_argument("--batch-workers", type=int, default=1, metavar="N",
+                            help="Number of batch commands run in parallel")
+        parser.add_argument("--report-format", choices=['text', 'teamcity', 'jsonl'],
+                            help="How uploaded artifacts are reported. text: urls, teamcity: service messages, "
+                                 "jsonl: JSON lines with all events, e.g. start, end, size and duration of each "
+                                 "upload. Default is teamcity when running in TeamCity, text otherwise")
+        parser.add_argument("--timings", action="store_true", default=False,
+                            help="Prints a table with durations of phases, e.g. creating of a staging repository, "
+                                 "hashing, HTTP requests and JSON decoding, to stderr at the end")
+        parser.add_argument("--profile", metavar="FILE",
+                            help="Saves cProfile stats of the main thread to FILE and the biggest memory "
+                                 "allocations to FILE.memory.txt, implies --timings")
+
     def __init__(self):
-        self.parser = self._get_parser()
-        self.parser.add_argument("-D", "--debug", action="store_true", dest="debug", default=False,
-                                 help="Print lots of debugging information")
-        self.parser.add_argument("-Q", "--quiet", action="store_true", dest="quiet", default=False,
-                                 help="Print less information")
-        self.parser.add_argument("-V", "--version", action="store_true", dest="display_version", default=False,
-                                 help="Prints version and exit")
-        self.repository = None
+        self._parser = None
+        self._repository = None
+        self._reporter = None
+        self._out = None
+        self._batch_failures = 0
+
+    @property
+    def parser(self):
+        """
+        :return: argparse.ArgumentParser, built on first access
+        """
+        if self._parser is None:
+            parser = self._get_parser()
+            self._add_global_arguments(parser)
+            self._parser = parser
+
+        return self._parser
+
+    def _parse_args(self, args=None):
+        """
+        --batch doesn't need a sub-command, but argparse of Python 2 always requires one, so global arguments are
+        parsed first by a parser without sub-commands.
+
+        :return: argparse.Namespace
+        """
+        global_parser = argparse.ArgumentParser(add_help=False)
+        self._add_global_arguments(global_parser)
+        global_args, rest = global_parser.parse_known_args(args)
+
+        if not global_args.batch:
+            return self.parser.parse_args(args)
+
+        if rest:
+            self.parser.error('sub-commands of --batch are read from FILE, unexpected arguments: {rest}'.format(
+                rest=' '.join(rest)))
+
+        return global_args
+
+    @property
+    def out(self):
+        """
+        :return: stream sub-commands print their output to, stderr in batch mode, where stdout contains only results
+        """
+        return self._out or sys.stdout
+
+    def _ensure_repository(self):
+        """
+        Creates the repository client, if it doesn't exist yet
+        """
+        if self._repository is None:
+            self._repository = repositorytools.repository_client_factory()
+            self._repository.reporter = self._reporter
+
+    @property
+    def repository(self):
+        """
+        :return: repository client, created when a sub-command uses it for the first time
+        """
+        self._ensure_repository()
+        return self._repository
+
+    @repository.setter
+    def repository(self, value):
+        self._repository = value
 
     def run(self, args=None):
-        args_namespace = self.parser.parse_args(args)
+        args_namespace = self._parse_args(args)
         configure_logging(args_namespace.quiet, args_namespace.debug)
         if args_namespace.display_version:
             print('repositorytools v{}'.format(repositorytools.__version__))
@@ -58,11 +271,97 @@ class CLI(collections.Callable):
         logger.info('Started %s, with arguments %s', sys.argv[0], str(used_args))
 
         """
-        This runs the function that is assigned to the sub-command by calling of set_defaults
+        This runs the function that is assigned to the sub-command by calling of set_defaults. Each run gets its own
+        repository client, so it picks up current environment variables.
+        """
+        self.repository = None
+        self._batch_failures = 0
+
+        # events are written in batches by a background thread, the rest at exit. In batch mode they go to stderr, so
+        # they don't mix with results.
+        renderer = repositorytools.get_renderer(args_namespace.report_format) if args_namespace.report_format else None
+        reporter_out = sys.stderr if args_namespace.batch else None
+        with _Profiling(args_namespace.profile, args_namespace.timings), \
+                repositorytools.EventReporter(renderer, out=reporter_out) as reporter:
+            self._reporter = reporter
+            try:
+                if args_namespace.batch:
+                    self._batch_failures = self.run_batch(args_namespace.batch, args_namespace.batch_workers)
+                    return self._batch_failures
+
+                return args_namespace.func(args_namespace)
+            finally:
+                self._reporter = None
+
+    def run_batch(self, path, workers=1, out=None):
+        """
+        Runs sub-commands listed in a file, see help of --batch. All of them share one repository client.
+
+        Output of the sub-commands goes to stderr, see the out property, so results are the only thing in out.
+
+        :param path: path to the file, - for stdin
+        :param workers: number of commands run in parallel
+        :param out: stream results are written to, one JSON per line, default stdout
+        :return: number of failed commands
         """
-        self.repository = repositorytools.repository_client_factory()
-        return args_namespace.func(args_namespace)
+        if path == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(path) as f:
+                lines = f.readlines()
+
+        commands = [(line_number, line.strip()) for line_number, line in enumerate(lines, 1) if line.strip()]
+
+        # create the client before starting threads, so they all share it
+        self._ensure_repository()
+
+        out = out or sys.stdout
+        failures = 0
+        self._out = sys.stderr
+        try:
+            for result in imap_concurrently(self._run_batch_command, commands, workers):
+                if result['error'] is not None:
+                    failures += 1
+                out.write(json.dumps(result, default=_to_json) + '\n')
+                out.flush()
+        finally:
+            self._out = None
+
+        logger.info('Batch finished, %d of %d commands failed', failures, len(commands))
+        return failures
+
+    def _run_batch_command(self, command):
+        line_number, line = command
+        result = {'line': line_number, 'result': None, 'error': None}
+
+        try:
+            if line.startswith('[') or line.startswith('{'):
+                parsed = json.loads(line)
+            else:
+                parsed = shlex.split(line)
+
+            if isinstance(parsed, dict):
+                result['id'] = parsed.get('id')
+                args = parsed['args']
+            else:
+                args = parsed
+
+            result['args'] = args
+            args_namespace = self.parser.parse_args(args)
+
+            if not hasattr(args_namespace, 'func'):
+                raise ValueError('No sub-command specified')
+
+            result['result'] = args_namespace.func(args_namespace)
+        except SystemExit as e:
+            # raised by argparse and some sub-commands
+            result['error'] = 'exited with code {code}'.format(code=e.code)
+        except Exception as e:
+            logger.debug('batch command on line %d failed', line_number, exc_info=True)
+            result['error'] = '{type}: {message}'.format(type=type(e).__name__, message=e)
+
+        return result
 
     def __call__(self, *args):
         self.run(*args)
-        return 0  # exit code
+        return 1 if self._batch_failures else 0  # exit code
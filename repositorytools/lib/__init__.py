@@ -1,4 +1,16 @@
 from .artifact import *
+from .hashing import *
+from .jsonstream import *
+from .compression import *
+from .events import *
+from .spans import *
+from .mirrors import *
 from .repository import *
+from .version import *
+from .index import *
+from .retention import *
+from .nexus3 import *
+from .artifactory import *
+from .journal import *
 
 __author__ = 'msamia'
@@ -1,11 +1,16 @@
-__all__ = ['NameVerDetectionError', 'Artifact', 'LocalArtifact', 'LocalRpmArtifact', 'RemoteArtifact']
+__all__ = ['NameVerDetectionError', 'Artifact', 'LocalArtifact', 'LocalRpmArtifact', 'RemoteArtifact', 'ArtifactSource',
+           'FileSource', 'BufferSource', 'StreamSource']
 
 import six.moves.urllib.parse
+import abc
 import itertools
 import re
 import os
 import logging
 
+from repositorytools.lib.hashing import DEFAULT_ALGORITHMS, get_cached_checksums, hash_buffer, hash_file, hash_files
+from repositorytools.lib.spans import span
+
 logger = logging.getLogger(__name__)
 
 class ArtifactError(Exception):
@@ -16,6 +21,195 @@ class NameVerDetectionError(ArtifactError):
     pass
 
 
+class _IterableReader(object):
+    """
+    Base of file-like objects sent as bodies of requests. requests treats only iterables as streams, so they're
+    iterated by chunks of CHUNK_SIZE bytes returned by read() of the descendant.
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.CHUNK_SIZE), b'')
+
+
+class _BufferReader(object):
+    """
+    File-like object reading a memoryview. requests can send the rest of it as it is, without copying, see getbuffer.
+    """
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+
+    def __len__(self):
+        # requests takes it as Content-Length, requests_toolbelt as number of bytes left, so there's no tell()
+        return len(self._view) - self._position
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        data = self._view[self._position:end].tobytes()
+        self._position = max(self._position, end)
+        return data
+
+    def seek(self, offset, whence=0):
+        base = {0: 0, 1: self._position, 2: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def getbuffer(self):
+        """
+        :return: memoryview of the content not read yet, like io.BytesIO.getbuffer
+        """
+        return self._view[self._position:]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _StreamReader(_IterableReader):
+    """
+    Reader of a stream, which isn't closed with it. It has no length, so requests sends it chunked.
+    """
+    def __init__(self, f):
+        self._f = f
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class ArtifactSource(object):
+    """
+    Content of a local artifact
+    """
+    # number of bytes, None while it isn't known
+    size = None
+    # False if the content can be read only once
+    reopenable = True
+
+    @abc.abstractmethod
+    def open(self, sized=False):
+        """
+        :param sized: if True, the returned object has a length, e.g. multipart bodies need it in advance. Content of
+         unknown length is read into memory then.
+        :return: file-like object opened in binary mode, to be closed by the caller
+        """
+
+    @abc.abstractmethod
+    def get_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        """
+        :param algorithms: names of hashlib algorithms
+        :return: dict algorithm -> hex digest
+        """
+
+    def get_cached_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        """
+        :param algorithms: names of hashlib algorithms
+        :return: dict algorithm -> hex digest if the content is hashed already, e.g. by
+         LocalArtifact.compute_checksums, None otherwise
+        """
+        return None
+
+
+class FileSource(ArtifactSource):
+    """
+    Local file
+    """
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open(self, sized=False):
+        return open(self.path, 'rb')
+
+    def get_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        return hash_file(self.path, algorithms)
+
+    def get_cached_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        return get_cached_checksums(self.path, algorithms)
+
+
+class BufferSource(ArtifactSource):
+    """
+    Content in memory, e.g. bytes, bytearray or memoryview, which is uploaded without being copied
+    """
+    def __init__(self, data):
+        view = memoryview(data)
+        if view.itemsize != 1 or view.ndim != 1:
+            # e.g. array.array('I'), its bytes are uploaded, memoryview of Python 2 can't be cast, so they're copied
+            view = view.cast('B') if hasattr(view, 'cast') else memoryview(view.tobytes())
+        self.data = view
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def open(self, sized=False):
+        return _BufferReader(self.data)
+
+    def get_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        return hash_buffer(self.data, algorithms)
+
+
+class StreamSource(ArtifactSource):
+    """
+    Binary file-like object, e.g. standard input of a pipeline, which is read once while it's uploaded. Its checksums
+    can't be computed in advance.
+    """
+    reopenable = False
+
+    def __init__(self, f):
+        self._f = f
+        self._opened = False
+
+    def open(self, sized=False):
+        if self._opened:
+            raise ArtifactError('Content of a stream can be read only once')
+        self._opened = True
+
+        if not sized:
+            return _StreamReader(self._f)
+
+        # the length is known only when the whole stream is read
+        data = self._f.read()
+        self.size = len(data)
+        return _BufferReader(memoryview(data))
+
+    def get_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        raise ArtifactError("Checksums of a stream can't be computed before it's uploaded, it can be read only once")
+
+
+def _as_source(content):
+    """
+    :param content: ArtifactSource, bytes-like object or binary file-like object
+    :return: ArtifactSource
+    """
+    if isinstance(content, ArtifactSource):
+        return content
+
+    if hasattr(content, 'read'):
+        return StreamSource(content)
+
+    return BufferSource(content)
+
+
 class Artifact(object):
     """
     Generic class describing an artifact
@@ -33,6 +227,15 @@ class Artifact(object):
                                                                               classifier=self.classifier,
                                                                               extension=self.extension)
 
+    def get_maven_path(self):
+        """
+        :return: path of the artifact in a maven2 layout repository, e.g. com/fooware/foo/1.0/foo-1.0-sources.jar
+        """
+        classifier = '-' + self.classifier if self.classifier else ''
+        return '{group}/{artifact}/{version}/{artifact}-{version}{classifier}.{extension}'.format(
+            group=self.group.replace('.', '/'), artifact=self.artifact, version=self.version, classifier=classifier,
+            extension=self.extension)
+
     def __repr__(self):
         return self.get_coordinates_string()
 
@@ -41,10 +244,18 @@ class LocalArtifact(Artifact):
     """
     Artifact for upload to repository
     """
-    def __init__(self, group, local_path, artifact='', version='', classifier='', extension=''):
+    def __init__(self, group, local_path, artifact='', version='', classifier='', extension='', source=None):
+        """
+        :param local_path: path to the file, with source only its name, which is used to detect coordinates and as the
+         name of the uploaded file, e.g. foo-1.0.tar.gz
+        :param source: content, if it isn't read from local_path: ArtifactSource, bytes-like object, e.g. bytes or
+         memoryview, or a binary file-like object, e.g. standard input, which can be uploaded only once
+        """
         self.local_path = local_path
+        self.source = FileSource(local_path) if source is None else _as_source(source)
 
-        artifact_detected, version_detected, extension_detected = self.detect_name_ver_ext()
+        with span('detect_coordinates'):
+            artifact_detected, version_detected, extension_detected = self.detect_name_ver_ext()
 
         if not artifact:
             artifact = artifact_detected
@@ -58,6 +269,37 @@ class LocalArtifact(Artifact):
         super(LocalArtifact, self).__init__(group=group, artifact=artifact, version=version, classifier=classifier,
                                             extension=extension)
 
+    def get_checksums(self, algorithms=DEFAULT_ALGORITHMS):
+        """
+        :param algorithms: names of hashlib algorithms
+        :return: dict algorithm -> hex digest of the content, see repositorytools.lib.hashing
+        """
+        return self.source.get_checksums(algorithms)
+
+    def get_sha1(self):
+        """
+        :return: sha1 of the file as hex string
+        """
+        return self.get_checksums(('sha1',))['sha1']
+
+    @staticmethod
+    def compute_checksums(local_artifacts, algorithms=DEFAULT_ALGORITHMS, processes=None):
+        """
+        Hashes files of many artifacts in a pool of processes. Results are cached, so following calls of
+        get_checksums and get_sha1 don't read the files again. Content of other sources is hashed in this process.
+
+        :param local_artifacts: list[LocalArtifact]
+        :param algorithms: names of hashlib algorithms
+        :param processes: size of the pool, None for number of CPUs
+        :return: list of dicts algorithm -> hex digest
+        """
+        is_file = [isinstance(local_artifact.source, FileSource) for local_artifact in local_artifacts]
+        hashed = iter(hash_files([local_artifact.source.path for local_artifact, file_ in zip(local_artifacts, is_file)
+                                  if file_], algorithms, processes))
+
+        return [next(hashed) if file_ else local_artifact.get_checksums(algorithms)
+                for local_artifact, file_ in zip(local_artifacts, is_file)]
+
     def detect_name_ver_ext(self):
         base_name = os.path.basename(self.local_path)
         result = re.match('^(?# name)(.*?)-(?=\d)(?# version)(\d.*)\.(?# extension)([^.]+)$', base_name)
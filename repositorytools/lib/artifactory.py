@@ -0,0 +1,91 @@
+"""
+Client of JFrog Artifactory
+"""
+
+__all__ = ['ArtifactoryRepositoryClient']
+
+import logging
+import os
+
+from repositorytools.lib.artifact import RemoteArtifact
+from repositorytools.lib.index import parse_artifact_path
+from repositorytools.lib.repository import RepositoryClient, ArtifactNotFoundError
+from repositorytools.lib.version import version_key
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactoryRepositoryClient(RepositoryClient):
+    """
+    Class for working with JFrog Artifactory. repository_url has to point to the Artifactory application, e.g.
+    https://repo.example.com/artifactory
+    """
+    _status_path = 'api/system/ping'
+
+    def _get_content_path(self, repo_id, path):
+        return '{repo_id}/{path}'.format(repo_id=repo_id, path=path.lstrip('/'))
+
+    def resolve_artifact(self, remote_artifact):
+        params = {'g': remote_artifact.group, 'a': remote_artifact.artifact, 'repos': remote_artifact.repo_id}
+        if remote_artifact.version:
+            params['v'] = remote_artifact.version
+        if remote_artifact.classifier:
+            params['c'] = remote_artifact.classifier
+
+        repository_url, data = self._read_json('api/search/gavc', params=params)
+        results = data['results']
+        storage_prefix = '/api/storage/{repo_id}/'.format(repo_id=remote_artifact.repo_id)
+        classifier = remote_artifact.classifier or ''
+        extension = remote_artifact.extension or 'jar'
+
+        found = []
+        for result in results:
+            uri = result['uri']
+            if storage_prefix not in uri:
+                continue
+
+            path = uri.split(storage_prefix, 1)[1]
+            coordinates = parse_artifact_path(path)
+            if coordinates is None or coordinates[3] != classifier or coordinates[4] != extension:
+                continue
+
+            found.append((path, coordinates))
+
+        if not found:
+            raise ArtifactNotFoundError('Artifact {coordinates} not found in {repo_id}'.format(
+                coordinates=remote_artifact.get_coordinates_string(), repo_id=remote_artifact.repo_id))
+
+        # e.g. the newest timestamped snapshot
+        path, coordinates = max(found, key=lambda item: version_key(item[1][2]))
+
+        remote_artifact.group, remote_artifact.artifact, remote_artifact.version = coordinates[:3]
+        remote_artifact.classifier, remote_artifact.extension = classifier, extension
+        remote_artifact.url = self.get_content_url(remote_artifact.repo_id, path, repository_url)
+
+    def _upload_artifact(self, local_artifact, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False,
+                         resolve=True, checksum_sidecars=()):
+        remote_artifact = RemoteArtifact(group=local_artifact.group, artifact=local_artifact.artifact,
+                                         version=local_artifact.version, classifier=local_artifact.classifier,
+                                         extension=local_artifact.extension, repo_id=repo_id)
+        remote_artifact.url = self.get_content_url(repo_id, remote_artifact.get_maven_path())
+
+        logger.info('-> Uploading %s', os.path.basename(local_artifact.local_path))
+
+        # checksum deploy: if Artifactory already has a file with this checksum, no content has to be sent. A stream
+        # can be read only once, so its checksum isn't known in advance and it's always sent.
+        r = None
+        headers = {'Content-Type': 'application/octet-stream'}
+        if local_artifact.source.reopenable:
+            remote_artifact.sha1 = headers['X-Checksum-Sha1'] = local_artifact.get_sha1()
+            r = self._session.put(remote_artifact.url, verify=self._verify_ssl,
+                                  headers={'X-Checksum-Deploy': 'true', 'X-Checksum-Sha1': remote_artifact.sha1})
+
+        if r is None or r.status_code == 404:
+            with local_artifact.source.open() as f:
+                r = self._session.put(remote_artifact.url, headers=headers, data=self._get_request_body(f),
+                                      verify=self._verify_ssl)
+        else:
+            logger.debug('%s deployed by checksum', remote_artifact.url)
+
+        r.raise_for_status()
+        return remote_artifact
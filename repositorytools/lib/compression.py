@@ -0,0 +1,36 @@
+"""
+Compressing bodies of JSON requests sent to repository servers
+
+Artifacts are never sent compressed. A server which ignores Content-Encoding of requests would store the compressed
+bytes as the artifact, and checksums computed locally wouldn't match.
+"""
+
+__all__ = ['COMPRESSIONS', 'compress']
+
+import zlib
+
+# value of Content-Encoding -> wbits argument of zlib, gzip has a header and a trailer, deflate is zlib format
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+COMPRESSIONS = tuple(sorted(_WBITS))
+
+# smaller bodies aren't worth compressing
+MIN_SIZE = 1024
+
+
+def _compressor(encoding):
+    try:
+        return zlib.compressobj(6, zlib.DEFLATED, _WBITS[encoding])
+    except KeyError:
+        raise ValueError('Unsupported compression {encoding}, use one of {compressions}'.format(
+            encoding=encoding, compressions=', '.join(COMPRESSIONS)))
+
+
+def compress(data, encoding):
+    """
+    :param data: bytes
+    :param encoding: 'gzip' or 'deflate'
+    :return: compressed bytes
+    """
+    compressor = _compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
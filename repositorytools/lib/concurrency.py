@@ -0,0 +1,90 @@
+"""
+Helpers for running repository operations concurrently
+"""
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def _thread_pool(processes):
+    # multiprocessing is slow to import and not needed by most command line invocations
+    from multiprocessing.pool import ThreadPool
+    return ThreadPool(processes)
+
+
+def map_concurrently(func, iterable, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Like map(), but calls func in a pool of threads. Order of results is preserved and the first exception raised
+    by func is re-raised in the calling thread.
+
+    :param func: callable taking one argument
+    :param iterable: items to call func with
+    :param max_workers: maximum number of threads, 1 means calling func sequentially in the current thread
+    :return: list of results
+    """
+    items = list(iterable)
+
+    if max_workers is None or max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    pool = _thread_pool(min(max_workers, len(items)))
+    try:
+        return pool.map(func, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def imap_concurrently(func, iterable, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Like map_concurrently, but yields results one by one as soon as they are available, still in order of items.
+
+    :param func: callable taking one argument
+    :param iterable: items to call func with
+    :param max_workers: maximum number of threads, 1 means calling func sequentially in the current thread
+    :return: generator of results
+    """
+    if max_workers is None or max_workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    pool = _thread_pool(max_workers)
+    try:
+        for result in pool.imap(func, iterable):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+class BackgroundTask(object):
+    """
+    Runs a callable in a background thread, so the caller can do something else meanwhile.
+
+    Usage::
+
+        with BackgroundTask(client.create_staging_repo, 'releases', 'foo') as task:
+            prepare_something()
+            repo_id = task.result()
+    """
+    def __init__(self, func, *args, **kwargs):
+        self._pool = _thread_pool(1)
+        self._async_result = self._pool.apply_async(func, args, kwargs)
+
+    def result(self):
+        """
+        Waits for the callable to finish.
+
+        :return: return value of the callable, re-raises its exception if it failed
+        """
+        return self._async_result.get()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,199 @@
+"""
+Structured events of repository operations and their rendering
+
+Clients emit events to a reporter, which only buffers them. The buffer is rendered and written in batches, so code
+uploading thousands of files doesn't wait for the terminal or the CI server log.
+"""
+
+from __future__ import print_function
+
+__all__ = ['Event', 'EventReporter', 'TextRenderer', 'TeamCityRenderer', 'JsonLinesRenderer', 'get_renderer',
+           'default_renderer', 'UPLOAD_STARTED', 'UPLOAD_FINISHED', 'UPLOAD_FAILED', 'ARTIFACTS_CREATED']
+
+import json
+import os
+import sys
+import threading
+import time
+
+# kinds of events, events of uploads to more servers at once have also repository_url
+UPLOAD_STARTED = 'upload_started'  # local_path, repo_id, size
+UPLOAD_FINISHED = 'upload_finished'  # local_path, repo_id, size, duration, url
+UPLOAD_FAILED = 'upload_failed'  # local_path, repo_id, size, duration, error
+ARTIFACTS_CREATED = 'artifacts_created'  # repo_id, remote_artifacts
+
+
+class Event(object):
+    """
+    Something which happened, with a kind, time and attributes specific for the kind
+    """
+    def __init__(self, kind, **fields):
+        self.kind = kind
+        self.time = time.time()
+        self.fields = fields
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['fields'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_dict(self):
+        """
+        :return: dict serializable to JSON, artifacts are represented by their coordinates and url
+        """
+        result = {'event': self.kind, 'time': self.time}
+
+        for name, value in self.fields.items():
+            if name == 'remote_artifacts':
+                value = [{'coordinates': a.get_coordinates_string(), 'url': a.url} for a in value]
+            elif isinstance(value, Exception):
+                value = '{type}: {message}'.format(type=type(value).__name__, message=value)
+            result[name] = value
+
+        return result
+
+    def __repr__(self):
+        return 'Event({kind}, {fields})'.format(kind=self.kind, fields=self.fields)
+
+
+class TextRenderer(object):
+    """
+    Urls of created artifacts to stdout, one per line, their caption to stderr
+    """
+    def render(self, events, out, err):
+        for event in events:
+            if event.kind == ARTIFACTS_CREATED:
+                err.write('The following files were uploaded to repository {repo_id}\n'.format(repo_id=event.repo_id))
+                out.write(''.join(a.url + '\n' for a in event.remote_artifacts))
+
+
+def _teamcity_escape(value):
+    for char, escaped in (('|', '||'), ("'", "|'"), ('\n', '|n'), ('\r', '|r'), ('[', '|['), (']', '|]')):
+        value = value.replace(char, escaped)
+    return value
+
+
+class TeamCityRenderer(object):
+    """
+    TeamCity service messages, created artifacts are highlighted, failed uploads reported as warnings
+    """
+    def render(self, events, out, err):
+        lines = []
+
+        for event in events:
+            if event.kind == ARTIFACTS_CREATED:
+                caption = _teamcity_escape('The following files were uploaded to repository {repo_id}'.format(
+                    repo_id=event.repo_id))
+                lines.extend("##teamcity[highlight title='{caption}' text='{text}']".format(
+                    caption=caption, text=_teamcity_escape('<a href="{url}">{url}</a>'.format(url=a.url)))
+                    for a in event.remote_artifacts)
+
+            elif event.kind == UPLOAD_FAILED:
+                lines.append("##teamcity[message text='{text}' status='WARNING']".format(
+                    text=_teamcity_escape('Upload of {path} failed: {error}'.format(path=event.local_path,
+                                                                                    error=event.error))))
+
+        out.write(''.join(line + '\n' for line in lines))
+
+
+class JsonLinesRenderer(object):
+    """
+    All events, one JSON object per line
+    """
+    def render(self, events, out, err):
+        out.write(''.join(json.dumps(event.to_dict(), sort_keys=True) + '\n' for event in events))
+
+
+_RENDERERS = {
+    'text': TextRenderer,
+    'teamcity': TeamCityRenderer,
+    'jsonl': JsonLinesRenderer,
+}
+
+
+def get_renderer(name):
+    """
+    :param name: 'text', 'teamcity' or 'jsonl'
+    :return: renderer instance
+    """
+    try:
+        return _RENDERERS[name]()
+    except KeyError:
+        raise ValueError('Unknown output format {name}, use one of {names}'.format(
+            name=name, names=', '.join(sorted(_RENDERERS))))
+
+
+def default_renderer():
+    """
+    :return: TeamCityRenderer when running in TeamCity, TextRenderer otherwise
+    """
+    return TeamCityRenderer() if os.environ.get('TEAM_CITY_URL') else TextRenderer()
+
+
+class EventReporter(object):
+    """
+    Buffers events and writes them rendered in batches. emit() only appends to the buffer. Used as a context manager,
+    the buffer is written by a background thread every flush_interval seconds and at exit, otherwise by calling
+    flush().
+
+    Usage::
+
+        with EventReporter(JsonLinesRenderer()) as reporter:
+            client.reporter = reporter
+            client.upload_artifacts(local_artifacts, 'releases')
+    """
+    def __init__(self, renderer=None, out=None, err=None, flush_interval=1.0):
+        """
+        :param renderer: TextRenderer, TeamCityRenderer, JsonLinesRenderer or any object with method
+         render(events, out, err), if None, default_renderer() is used
+        :param out: stream for the output, sys.stdout at the time of writing if None
+        :param err: stream for captions and other human-readable additions, sys.stderr at the time of writing if None
+        :param flush_interval: seconds between writes of the background thread
+        """
+        self.renderer = renderer or default_renderer()
+        self._out = out
+        self._err = err
+        self._flush_interval = flush_interval
+        self._events = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def emit(self, event):
+        """
+        :param event: Event
+        """
+        with self._lock:
+            self._events.append(event)
+
+    def flush(self):
+        """
+        Renders and writes buffered events
+        """
+        # writes of concurrent flushes aren't interleaved and keep order of events
+        with self._write_lock:
+            with self._lock:
+                events, self._events = self._events, []
+
+            if events:
+                out = self._out or sys.stdout
+                self.renderer.render(events, out, self._err or sys.stderr)
+                out.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+    def __enter__(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,173 @@
+"""
+Computing checksums of local files
+
+All requested digests are computed in one pass over a file, big files are memory-mapped instead of read into
+buffers. Results are cached by path, size, modification time and inode, so a file is hashed only once per process
+unless it changes.
+"""
+
+__all__ = ['DEFAULT_ALGORITHMS', 'hash_file', 'hash_files', 'hash_buffer', 'get_cached_checksums']
+
+import hashlib
+import os
+
+import six
+
+from repositorytools.lib.spans import span
+
+DEFAULT_ALGORITHMS = ('md5', 'sha1', 'sha256')
+
+# smaller files are read, bigger are memory-mapped
+MMAP_THRESHOLD = 4 * 1024 * 1024
+_BLOCK_SIZE = 1024 * 1024
+# digests are updated by slices of a mapped file, so that the other digests reuse pages still in CPU caches
+_MMAP_SLICE_SIZE = 8 * 1024 * 1024
+
+_CACHE_SIZE = 100000
+_cache = {}
+
+
+def _cache_key(path):
+    st = os.stat(path)
+    mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+    return os.path.abspath(path), st.st_size, mtime, st.st_ino
+
+
+def _update_by_slices(digests, buf, size):
+    """
+    Updates digests by slices of a buffer, e.g. of a memory-mapped file
+    """
+    if six.PY2:
+        for offset in range(0, size, _MMAP_SLICE_SIZE):
+            chunk = buf[offset:offset + _MMAP_SLICE_SIZE]
+            if isinstance(chunk, memoryview):
+                chunk = chunk.tobytes()
+            for digest in digests:
+                digest.update(chunk)
+    else:
+        # slices of memoryview don't copy the data
+        with memoryview(buf) as view:
+            for offset in range(0, size, _MMAP_SLICE_SIZE):
+                with view[offset:offset + _MMAP_SLICE_SIZE] as chunk:
+                    for digest in digests:
+                        digest.update(chunk)
+
+
+def _compute(path, size, algorithms):
+    digests = [hashlib.new(algorithm) for algorithm in algorithms]
+
+    with open(path, 'rb') as f:
+        if size >= MMAP_THRESHOLD:
+            import mmap
+
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                _update_by_slices(digests, mapped, size)
+            finally:
+                mapped.close()
+        else:
+            for block in iter(lambda: f.read(_BLOCK_SIZE), b''):
+                for digest in digests:
+                    digest.update(block)
+
+    return dict(zip(algorithms, (digest.hexdigest() for digest in digests)))
+
+
+def _compute_for_key(args):
+    key, algorithms = args
+    return _compute(key[0], key[1], algorithms)
+
+
+def _store(key, checksums):
+    if len(_cache) >= _CACHE_SIZE:
+        _cache.clear()
+
+    _cache.setdefault(key, {}).update(checksums)
+
+
+def hash_file(path, algorithms=DEFAULT_ALGORITHMS):
+    """
+    :param path: path to a local file
+    :param algorithms: names of hashlib algorithms
+    :return: dict algorithm -> hex digest
+    """
+    return hash_files([path], algorithms, processes=1)[0]
+
+
+def get_cached_checksums(path, algorithms=DEFAULT_ALGORITHMS):
+    """
+    :param path: path to a local file
+    :param algorithms: names of hashlib algorithms
+    :return: dict algorithm -> hex digest if the file is hashed by all algorithms already and hasn't changed since,
+     None otherwise
+    """
+    cached = _cache.get(_cache_key(path), {})
+    if not all(algorithm in cached for algorithm in algorithms):
+        return None
+
+    return dict((algorithm, cached[algorithm]) for algorithm in algorithms)
+
+
+def hash_buffer(data, algorithms=DEFAULT_ALGORITHMS):
+    """
+    Computes checksums of content in memory, they aren't cached as the content may change.
+
+    :param data: bytes-like object, e.g. bytes, bytearray or memoryview of bytes
+    :param algorithms: names of hashlib algorithms
+    :return: dict algorithm -> hex digest
+    """
+    with span('hash'):
+        digests = [hashlib.new(algorithm) for algorithm in algorithms]
+        _update_by_slices(digests, data, len(data))
+        return dict(zip(algorithms, (digest.hexdigest() for digest in digests)))
+
+
+def hash_files(paths, algorithms=DEFAULT_ALGORITHMS, processes=None):
+    """
+    Computes checksums of many files, files which aren't cached yet are hashed in a pool of processes.
+
+    :param paths: list of paths to local files
+    :param algorithms: names of hashlib algorithms
+    :param processes: size of the pool, None for number of CPUs, 1 for hashing in the current process
+    :return: list of dicts algorithm -> hex digest, in the same order as paths
+    """
+    with span('hash'):
+        return _hash_files(paths, tuple(algorithms), processes)
+
+
+def _hash_files(paths, algorithms, processes):
+    keys = [_cache_key(path) for path in paths]
+
+    missing = []
+    seen = set()
+    for key in keys:
+        cached = _cache.get(key, {})
+        todo = tuple(algorithm for algorithm in algorithms if algorithm not in cached)
+        if todo and key not in seen:
+            seen.add(key)
+            missing.append((key, todo))
+
+    if len(missing) > 1 and processes != 1:
+        # multiprocessing is slow to import and not needed by most command line invocations
+        from multiprocessing import Pool, cpu_count
+
+        pool = Pool(min(processes or cpu_count(), len(missing)))
+        try:
+            results = pool.map(_compute_for_key, missing, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_compute_for_key(item) for item in missing]
+
+    computed = dict((key, checksums) for (key, _), checksums in zip(missing, results))
+    for key, checksums in computed.items():
+        _store(key, checksums)
+
+    result = []
+    for key in keys:
+        checksums = dict(_cache.get(key, {}))
+        checksums.update(computed.get(key, {}))
+        result.append(dict((algorithm, checksums[algorithm]) for algorithm in algorithms))
+
+    return result
@@ -0,0 +1,285 @@
+"""
+Local index of repository contents for searching artifacts without knowing their exact coordinates
+"""
+
+__all__ = ['RepositoryIndex', 'DEFAULT_INDEX_PATH']
+
+import logging
+import os
+import re
+import time
+
+from repositorytools.lib.artifact import RemoteArtifact
+from repositorytools.lib.concurrency import map_concurrently, DEFAULT_MAX_WORKERS
+from repositorytools.lib.version import VersionRange
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'repositorytools', 'index.sqlite')
+
+# files which are not artifacts but describe them
+_IGNORED_EXTENSIONS = ('.md5', '.sha1', '.sha256', '.sha512', '.asc')
+_IGNORED_PREFIXES = ('maven-metadata', '_')
+
+_SNAPSHOT_RE = re.compile(r'^(\d{8}\.\d{6}-\d+|SNAPSHOT)(.*)$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    repo_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    last_modified TEXT,
+    is_leaf INTEGER,
+    PRIMARY KEY (repo_id, path)
+);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (repo_id, parent);
+CREATE TABLE IF NOT EXISTS artifacts (
+    repo_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    artifact_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    classifier TEXT NOT NULL,
+    extension TEXT NOT NULL,
+    sha1 TEXT,
+    last_modified TEXT,
+    url TEXT,
+    PRIMARY KEY (repo_id, path)
+);
+CREATE INDEX IF NOT EXISTS artifacts_parent ON artifacts (repo_id, parent);
+CREATE INDEX IF NOT EXISTS artifacts_ga ON artifacts (repo_id, group_id, artifact_id);
+CREATE TABLE IF NOT EXISTS refreshes (
+    repo_id TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+
+def parse_artifact_path(path):
+    """
+    Gets coordinates of an artifact from its path in a maven2 layout repository.
+
+    :param path: e.g. com/fooware/foo/1.0/foo-1.0-sources.jar
+    :return: tuple (group, artifact, version, classifier, extension) or None if the path is not an artifact
+    """
+    parts = path.strip('/').split('/')
+
+    if len(parts) < 4:
+        return None
+
+    filename, version, artifact = parts[-1], parts[-2], parts[-3]
+    group = '.'.join(parts[:-3])
+
+    if filename.startswith(_IGNORED_PREFIXES) or filename.endswith(_IGNORED_EXTENSIONS):
+        return None
+
+    if version.endswith('-SNAPSHOT'):
+        prefix = '{artifact}-{base}'.format(artifact=artifact, base=version[:-len('SNAPSHOT')])
+        if not filename.startswith(prefix):
+            return None
+        match = _SNAPSHOT_RE.match(filename[len(prefix):])
+        if not match:
+            return None
+        version = version[:-len('SNAPSHOT')] + match.group(1)
+        rest = match.group(2)
+    else:
+        prefix = '{artifact}-{version}'.format(artifact=artifact, version=version)
+        if not filename.startswith(prefix):
+            return None
+        rest = filename[len(prefix):]
+
+    if rest.startswith('-') and '.' in rest:
+        classifier, extension = rest[1:].split('.', 1)
+    elif rest.startswith('.'):
+        classifier, extension = '', rest[1:]
+    else:
+        return None
+
+    return group, artifact, version, classifier, extension
+
+
+class RepositoryIndex(object):
+    """
+    Index of repository contents stored in a SQLite database.
+
+    The index is built by crawling directory listings. A refresh lists all directories again, except for directories
+    containing only files (usually version directories) whose last modification time didn't change, these are the
+    vast majority of listings.
+    """
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        """
+        :param path: path to the database file, ':memory:' for an index kept only in memory
+        """
+        import sqlite3
+
+        if path != ':memory:':
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def get_refresh_time(self, repo_id):
+        """
+        :return: unix time of last refresh of given repository or None if it was never indexed
+        """
+        row = self._db.execute('SELECT refreshed_at FROM refreshes WHERE repo_id = ?', (repo_id,)).fetchone()
+        return row and row[0]
+
+    def refresh(self, client, repo_id, fetch_sha1=False, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Updates the index with current contents of a repository.
+
+        :param client: NexusRepositoryClient
+        :param repo_id: id of repository
+        :param fetch_sha1: if True, downloads .sha1 files of new artifacts, which costs one request per artifact
+        :param max_workers: number of directories listed in parallel
+        :return: number of listed directories
+        """
+        logger.info('Refreshing index of repository %s', repo_id)
+        pending = ['']
+        listed = 0
+        sha1_paths = []
+
+        while pending:
+            listings = map_concurrently(lambda path: (path, client.list_content(repo_id, path)), pending, max_workers)
+            listed += len(listings)
+            pending = []
+
+            with self._db:
+                for path, entries in listings:
+                    pending.extend(self._update_directory(client, repo_id, path, entries, sha1_paths))
+
+        if fetch_sha1 and sha1_paths:
+            checksums = map_concurrently(lambda path: client.read_content(repo_id, path + '.sha1').split()[0],
+                                         sha1_paths, max_workers)
+            with self._db:
+                self._db.executemany('UPDATE artifacts SET sha1 = ? WHERE repo_id = ? AND path = ?',
+                                     [(sha1, repo_id, path) for path, sha1 in zip(sha1_paths, checksums)])
+
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO refreshes (repo_id, refreshed_at) VALUES (?, ?)',
+                             (repo_id, time.time()))
+
+        logger.info('Index of repository %s refreshed, %d directories listed', repo_id, listed)
+        return listed
+
+    def _update_directory(self, client, repo_id, path, entries, sha1_paths):
+        """
+        Stores a listing of one directory.
+
+        :return: list of subdirectories which have to be listed
+        """
+        directories = {}
+        files = {}
+
+        for entry in entries:
+            entry_path = entry['relativePath'].lstrip('/')
+
+            if entry['leaf']:
+                files[entry_path] = entry
+            elif not entry['text'].startswith('.'):
+                directories[entry_path.rstrip('/') + '/'] = entry
+
+        known = dict((row[0], (row[1], row[2])) for row in self._db.execute(
+            'SELECT path, last_modified, is_leaf FROM directories WHERE repo_id = ? AND parent = ?', (repo_id, path)))
+
+        for removed in set(known) - set(directories):
+            for table in ('directories', 'artifacts'):
+                self._db.execute('DELETE FROM {table} WHERE repo_id = ? AND substr(path, 1, ?) = ?'.format(
+                    table=table), (repo_id, len(removed), removed))
+
+        if path:
+            self._db.execute('UPDATE directories SET is_leaf = ? WHERE repo_id = ? AND path = ?',
+                             (int(not directories), repo_id, path))
+
+        self._db.execute('DELETE FROM artifacts WHERE repo_id = ? AND parent = ?', (repo_id, path))
+
+        rows = []
+        for file_path, entry in files.items():
+            coordinates = parse_artifact_path(file_path)
+            if coordinates is None:
+                continue
+
+            rows.append((repo_id, file_path, path) + coordinates +
+                        (entry.get('lastModified'), client.get_content_url(repo_id, file_path)))
+
+            if file_path + '.sha1' in files:
+                sha1_paths.append(file_path)
+
+        self._db.executemany('INSERT INTO artifacts (repo_id, path, parent, group_id, artifact_id, version, '
+                             'classifier, extension, last_modified, url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+        pending = []
+        for directory_path, entry in directories.items():
+            last_modified, is_leaf = known.get(directory_path, (None, None))
+
+            if is_leaf and last_modified is not None and last_modified == entry.get('lastModified'):
+                continue
+
+            self._db.execute('INSERT OR REPLACE INTO directories (repo_id, path, parent, last_modified, is_leaf) '
+                             'VALUES (?, ?, ?, ?, ?)', (repo_id, directory_path, path, entry.get('lastModified'),
+                                                        is_leaf))
+            pending.append(directory_path)
+
+        return pending
+
+    def search(self, repo_id, group='', artifact='', version=None, classifier=None, extension=None, limit=None):
+        """
+        Searches artifacts in the index.
+
+        :param repo_id: id of repository
+        :param group: prefix of group
+        :param artifact: prefix of artifact, if group is given, group has to match exactly
+        :param version: version or a maven version range, e.g. [1.0,2.0)
+        :param classifier: exact classifier, None for any
+        :param extension: exact extension, None for any
+        :param limit: maximum number of results
+        :return: list[RemoteArtifact], each has also attributes sha1, path and last_modified
+        """
+        query = ['SELECT group_id, artifact_id, version, classifier, extension, url, sha1, path, last_modified '
+                 'FROM artifacts WHERE repo_id = ?']
+        params = [repo_id]
+
+        # prefixes are searched using ranges, so the index can be used
+        if artifact:
+            if group:
+                query.append('AND group_id = ?')
+                params.append(group)
+            query.append('AND artifact_id >= ? AND artifact_id < ?')
+            params.extend([artifact, artifact + u'\uffff'])
+        elif group:
+            query.append('AND group_id >= ? AND group_id < ?')
+            params.extend([group, group + u'\uffff'])
+
+        for column, value in (('classifier', classifier), ('extension', extension)):
+            if value is not None:
+                query.append('AND {column} = ?'.format(column=column))
+                params.append(value)
+
+        query.append('ORDER BY group_id, artifact_id, path')
+
+        version_range = version and VersionRange(version)
+        result = []
+
+        for row in self._db.execute(' '.join(query), params):
+            if version_range is not None and row[2] not in version_range:
+                continue
+
+            remote_artifact = RemoteArtifact(group=row[0], artifact=row[1], version=row[2], classifier=row[3],
+                                             extension=row[4], url=row[5], repo_id=repo_id)
+            remote_artifact.sha1 = row[6]
+            remote_artifact.path = row[7]
+            remote_artifact.last_modified = row[8]
+            result.append(remote_artifact)
+
+            if limit and len(result) >= limit:
+                break
+
+        return result
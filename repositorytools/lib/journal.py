@@ -0,0 +1,214 @@
+"""
+Journal of uploads shared by processes on one host, so identical uploads are done only once
+"""
+
+__all__ = ['UploadJournal', 'DEFAULT_JOURNAL_PATH']
+
+import contextlib
+import errno
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+from repositorytools.lib.artifact import RemoteArtifact
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'repositorytools', 'uploads.sqlite')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    repo_id TEXT NOT NULL,
+    coordinates TEXT NOT NULL,
+    sha1 TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner TEXT,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    PRIMARY KEY (repo_id, coordinates, sha1)
+);
+"""
+
+_IN_PROGRESS = 'in_progress'
+_DONE = 'done'
+
+
+def _is_alive(pid):
+    """
+    :return: True if a process with the pid exists, on Windows always True, see UploadJournal
+    """
+    # signal 0 only checks the process on POSIX, os.kill of Windows terminates it whatever the signal is
+    if sys.platform == 'win32':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # EPERM means the process exists, but belongs to somebody else
+        return e.errno == errno.EPERM
+    return True
+
+
+class UploadJournal(object):
+    """
+    Records which files were uploaded where, keyed by repository, coordinates and sha1 of the file.
+
+    The journal is a SQLite database, whose file locking serializes access of concurrent processes. A process about
+    to upload a file claims it first. Other processes wanting to upload the same file wait until the upload finishes
+    and take its result, and a restarted job skips files it already uploaded.
+
+    Usage::
+
+        journal = UploadJournal()
+        client.upload_artifacts(local_artifacts, 'releases', journal=journal)
+    """
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, max_age=7 * 24 * 60 * 60, stale_after=60 * 60, poll_interval=1.0):
+        """
+        :param path: path to the database file
+        :param max_age: how many seconds finished uploads are remembered
+        :param stale_after: after how many seconds an unfinished upload is considered abandoned, even if its process
+         is still alive. On Windows, uploads of crashed processes are taken over only after this time, elsewhere as
+         soon as the process is gone.
+        :param poll_interval: how often to check uploads of other processes, in seconds
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.max_age = max_age
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+
+        with self._transaction() as db:
+            for statement in _SCHEMA.split(';'):
+                db.execute(statement)
+            db.execute('DELETE FROM uploads WHERE state = ? AND updated_at < ?', (_DONE, time.time() - max_age))
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        import sqlite3
+
+        # autocommit mode, transactions are started explicitly, IMMEDIATE takes the write lock right away
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    @staticmethod
+    def _get_owner():
+        # threads of one process may upload the same file too
+        return '{host}:{pid}:{thread}'.format(host=socket.gethostname(), pid=os.getpid(),
+                                              thread=threading.current_thread().ident)
+
+    def _is_abandoned(self, owner, updated_at):
+        if time.time() - updated_at > self.stale_after:
+            return True
+
+        host, pid, _ = owner.split(':')
+        return host == socket.gethostname() and not _is_alive(int(pid))
+
+    def _claim(self, keys):
+        """
+        :param keys: list of (repo_id, coordinates, sha1)
+        :return: tuple (dict key -> RemoteArtifact of finished uploads, list of claimed keys, list of keys being
+         uploaded by others)
+        """
+        done, claimed, busy = {}, [], []
+        owner = self._get_owner()
+
+        with self._transaction() as db:
+            for key in keys:
+                row = db.execute('SELECT state, owner, updated_at, result FROM uploads WHERE repo_id = ? AND '
+                                 'coordinates = ? AND sha1 = ?', key).fetchone()
+
+                if row is not None:
+                    state, _, updated_at, result = row
+                    if state == _DONE:
+                        done[key] = _remote_artifact_from_json(result)
+                        continue
+                    if row[1] != owner and not self._is_abandoned(row[1], updated_at):
+                        busy.append(key)
+                        continue
+
+                db.execute('INSERT OR REPLACE INTO uploads (repo_id, coordinates, sha1, state, owner, updated_at) '
+                           'VALUES (?, ?, ?, ?, ?, ?)', key + (_IN_PROGRESS, owner, time.time()))
+                claimed.append(key)
+
+        return done, claimed, busy
+
+    def _finish(self, results):
+        with self._transaction() as db:
+            db.executemany('UPDATE uploads SET state = ?, updated_at = ?, result = ? WHERE repo_id = ? AND '
+                           'coordinates = ? AND sha1 = ?',
+                           [(_DONE, time.time(), _remote_artifact_to_json(remote_artifact)) + key
+                            for key, remote_artifact in results])
+
+    def _release(self, keys):
+        with self._transaction() as db:
+            db.executemany('DELETE FROM uploads WHERE repo_id = ? AND coordinates = ? AND sha1 = ? AND owner = ? AND '
+                           'state = ?', [key + (self._get_owner(), _IN_PROGRESS) for key in keys])
+
+    def upload(self, repo_id, local_artifacts, upload):
+        """
+        Uploads artifacts which weren't uploaded yet.
+
+        :param repo_id: id of target repository
+        :param local_artifacts: list[LocalArtifact]
+        :param upload: callable taking a list of LocalArtifacts, returning list of RemoteArtifacts
+        :return: list[RemoteArtifact] in the same order as local_artifacts, each has attribute journaled, True if it
+         was uploaded earlier or by another process
+        """
+        keys = [(repo_id, local_artifact.get_coordinates_string(), local_artifact.get_sha1())
+                for local_artifact in local_artifacts]
+        unique_keys = sorted(set(keys), key=keys.index)
+        results = {}
+
+        while len(results) < len(unique_keys):
+            done, claimed, busy = self._claim([key for key in unique_keys if key not in results])
+
+            for key, remote_artifact in done.items():
+                logger.info('%s already uploaded to %s, skipping', key[1], repo_id)
+                remote_artifact.journaled = True
+                results[key] = remote_artifact
+
+            if claimed:
+                try:
+                    uploaded = upload([local_artifacts[keys.index(key)] for key in claimed])
+                except Exception:
+                    self._release(claimed)
+                    raise
+
+                self._finish(list(zip(claimed, uploaded)))
+
+                for key, remote_artifact in zip(claimed, uploaded):
+                    remote_artifact.journaled = False
+                    results[key] = remote_artifact
+
+            if busy and not claimed:
+                logger.debug('Waiting for other uploads of %s', ', '.join(key[1] for key in busy))
+                time.sleep(self.poll_interval)
+
+        return [results[key] for key in keys]
+
+
+def _remote_artifact_to_json(remote_artifact):
+    return json.dumps(dict(group=remote_artifact.group, artifact=remote_artifact.artifact,
+                           version=remote_artifact.version, classifier=remote_artifact.classifier,
+                           extension=remote_artifact.extension, url=remote_artifact.url,
+                           repo_id=remote_artifact.repo_id))
+
+
+def _remote_artifact_from_json(text):
+    return RemoteArtifact(**json.loads(text))
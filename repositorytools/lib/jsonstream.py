@@ -0,0 +1,125 @@
+"""
+Parsing items of a big JSON array as they arrive, so they don't have to be kept in memory all together
+"""
+
+__all__ = ['iter_array_items']
+
+import json
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',:]}'
+
+
+class _Buffer(object):
+    """
+    Text read from a stream, of which only the part not parsed yet is kept
+    """
+    def __init__(self, f, chunk_size):
+        self._f = f
+        self._chunk_size = chunk_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self, size=None):
+        """
+        :param size: number of characters to read, default chunk_size
+        :return: False at the end of the stream
+        """
+        if self.eof:
+            return False
+
+        chunk = self._f.read(size or self._chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        # drops the parsed part
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """
+        :return: next character which isn't whitespace, it isn't consumed, None at the end of the stream
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+
+            if not self.read_more():
+                return None
+
+    def expect(self, chars):
+        char = self.next_char()
+        if char is None or char not in chars:
+            raise ValueError('Expected one of {chars!r} at position {pos}, got {char!r}'.format(
+                chars=chars, pos=self.pos, char=char))
+        self.pos += 1
+        return char
+
+    def decode(self, decoder):
+        """
+        :return: next JSON value
+        """
+        self.next_char()
+
+        while True:
+            # a value bigger than a chunk is parsed from its start again after each read, the unparsed text is at
+            # least doubled by each read, so that big values are parsed in linear time
+            size = max(self._chunk_size, len(self.text) - self.pos)
+
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self.read_more(size):
+                    raise
+                continue
+
+            # a value is followed by whitespace or a delimiter, otherwise e.g. a number may continue in the next chunk
+            if (end >= len(self.text) or self.text[end] not in _DELIMITERS) and self.read_more(size):
+                continue
+
+            self.pos = end
+            return value
+
+
+def iter_array_items(f, key, chunk_size=_CHUNK_SIZE):
+    """
+    Yields items of an array in a JSON object, e.g. of {"data": [...]}, as they're read. The array has to be a value of
+    the top-level object, other values of the object are skipped.
+
+    :param f: file-like object returning text, e.g. a decoded HTTP response
+    :param key: key of the array in the top-level object
+    :return: generator of decoded items
+    """
+    decoder = json.JSONDecoder()
+    buf = _Buffer(f, chunk_size)
+
+    buf.expect('{')
+    if buf.next_char() == '}':
+        return
+
+    while True:
+        name = buf.decode(decoder)
+        buf.expect(':')
+
+        if name == key:
+            buf.expect('[')
+
+            if buf.next_char() == ']':
+                buf.pos += 1
+            else:
+                while True:
+                    yield buf.decode(decoder)
+                    if buf.expect(',]') == ']':
+                        break
+        else:
+            buf.decode(decoder)
+
+        if buf.expect(',}') == '}':
+            return
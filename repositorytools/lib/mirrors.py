@@ -0,0 +1,97 @@
+"""
+Choosing the closest healthy mirror of a repository server
+"""
+
+__all__ = ['MirrorSelector', 'DEFAULT_PROBE_INTERVAL']
+
+import logging
+import threading
+import time
+
+from repositorytools.lib.concurrency import map_concurrently
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_INTERVAL = 300
+
+
+class MirrorSelector(object):
+    """
+    Orders mirrors of a repository server by latency. All mirrors are probed concurrently when they are needed for the
+    first time and again after probe_interval seconds. A mirror which failed isn't used until it passes the next
+    probe.
+
+    Usage::
+
+        selector = MirrorSelector(['https://repo-eu.example.com', 'https://repo-us.example.com'], probe)
+        for url in selector.get_ordered():
+            ...
+    """
+    def __init__(self, urls, probe, probe_interval=DEFAULT_PROBE_INTERVAL, clock=time.time):
+        """
+        :param urls: base urls of the mirrors
+        :param probe: callable taking a url, raising an exception if the mirror isn't healthy, its duration is taken
+         as latency of the mirror
+        :param probe_interval: how often latencies are measured again, in seconds
+        :param clock: function returning current time in seconds, for tests
+        """
+        self.urls = list(urls)
+        self._probe = probe
+        self._probe_interval = probe_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._latencies = {}
+        self._probed_at = None
+
+    def _measure(self, url):
+        start = time.time()
+        try:
+            self._probe(url)
+        except Exception as e:
+            logger.warning('Mirror %s is not available: %s', url, e)
+            return None
+        return time.time() - start
+
+    def probe(self):
+        """
+        Measures latencies of all mirrors now.
+        """
+        latencies = map_concurrently(self._measure, self.urls, len(self.urls))
+
+        with self._lock:
+            self._latencies = dict((url, latency) for url, latency in zip(self.urls, latencies)
+                                   if latency is not None)
+            self._probed_at = self._clock()
+
+        logger.debug('Latencies of mirrors: %s', self._latencies)
+
+    def _is_probe_due(self):
+        return self._probed_at is None or self._clock() - self._probed_at >= self._probe_interval
+
+    def get_latencies(self):
+        """
+        :return: dict url -> latency in seconds of healthy mirrors, as measured by the last probe
+        """
+        with self._lock:
+            return dict(self._latencies)
+
+    def get_ordered(self):
+        """
+        :return: urls of healthy mirrors, the fastest first
+        """
+        if self._is_probe_due():
+            # threads needing mirrors at the same time wait for one probe
+            with self._probe_lock:
+                if self._is_probe_due():
+                    self.probe()
+
+        with self._lock:
+            return sorted(self._latencies, key=self._latencies.get)
+
+    def mark_failed(self, url):
+        """
+        Excludes a mirror till the next probe, e.g. because a request to it failed
+        """
+        with self._lock:
+            self._latencies.pop(url, None)
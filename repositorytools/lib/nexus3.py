@@ -0,0 +1,122 @@
+"""
+Client of Sonatype Nexus Repository 3
+"""
+
+__all__ = ['Nexus3RepositoryClient']
+
+import logging
+import os
+
+from repositorytools.lib.artifact import RemoteArtifact
+from repositorytools.lib.repository import RepositoryClient, ArtifactNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# versions for which the newest one is resolved
+_LATEST_VERSIONS = ('', 'LATEST', 'RELEASE')
+
+
+class Nexus3RepositoryClient(RepositoryClient):
+    """
+    Class for working with Sonatype Nexus Repository 3, uses its REST API service/rest/v1
+    """
+    # maven2 component upload documents three assets per request
+    _max_assets_per_upload = 3
+
+    _status_path = 'service/rest/v1/status'
+
+    def _get_content_path(self, repo_id, path):
+        return 'repository/{repo_id}/{path}'.format(repo_id=repo_id, path=path.lstrip('/'))
+
+    def resolve_artifact(self, remote_artifact):
+        params = {
+            'repository': remote_artifact.repo_id,
+            'maven.groupId': remote_artifact.group,
+            'maven.artifactId': remote_artifact.artifact,
+            'maven.extension': remote_artifact.extension or 'jar',
+            # empty classifier matches only assets without classifier
+            'maven.classifier': remote_artifact.classifier or '',
+            'sort': 'version',
+            'direction': 'desc',
+        }
+
+        if remote_artifact.version not in _LATEST_VERSIONS:
+            params['maven.baseVersion'] = remote_artifact.version
+
+        # downloadUrl points to the mirror which answered
+        items = self._read_json('service/rest/v1/search/assets', params=params)[1]['items']
+
+        if not items:
+            raise ArtifactNotFoundError('Artifact {coordinates} not found in {repo_id}'.format(
+                coordinates=remote_artifact.get_coordinates_string(), repo_id=remote_artifact.repo_id))
+
+        asset = items[0]
+        maven2 = asset.get('maven2', {})
+
+        remote_artifact.group = maven2.get('groupId', remote_artifact.group)
+        remote_artifact.artifact = maven2.get('artifactId', remote_artifact.artifact)
+        remote_artifact.version = maven2.get('version', remote_artifact.version)
+        remote_artifact.classifier = maven2.get('classifier', remote_artifact.classifier or '')
+        remote_artifact.extension = maven2.get('extension', remote_artifact.extension)
+        remote_artifact.url = asset['downloadUrl']
+
+        if 'baseVersion' in maven2:
+            remote_artifact.base_version = maven2['baseVersion']
+        if 'sha1' in asset.get('checksum', {}):
+            remote_artifact.sha1 = asset['checksum']['sha1']
+
+    def _upload_artifact(self, local_artifact, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False,
+                         resolve=True, checksum_sidecars=()):
+        return self._upload_component([local_artifact], repo_id)[0]
+
+    def _upload_component(self, local_artifacts, repo_id, **kwargs):
+        """
+        Uploads files of one component by one request.
+
+        :param local_artifacts: list[LocalArtifact], all with the same group, artifact and version
+        :param repo_id: id of target repository
+        :param kwargs: ignored, Nexus 3 components are always uploaded the same way
+        :return: list[RemoteArtifact]
+        """
+        from requests_toolbelt import MultipartEncoder
+
+        first = local_artifacts[0]
+        fields = [
+            ('maven2.groupId', first.group),
+            ('maven2.artifactId', first.artifact),
+            ('maven2.version', first.version),
+        ]
+        files = []
+
+        try:
+            for i, local_artifact in enumerate(local_artifacts, 1):
+                filename = os.path.basename(local_artifact.local_path)
+                logger.info('-> Uploading %s', filename)
+
+                # multipart bodies need the length in advance
+                f = local_artifact.source.open(sized=True)
+                files.append(f)
+
+                asset = 'maven2.asset{i}'.format(i=i)
+                fields.append((asset, (filename, f, 'application/octet-stream')))
+                fields.append((asset + '.extension', local_artifact.extension))
+                if local_artifact.classifier:
+                    fields.append((asset + '.classifier', local_artifact.classifier))
+
+            m = MultipartEncoder(fields=fields)
+            self._send('service/rest/v1/components', method='POST', params={'repository': repo_id}, data=m,
+                       headers={'Content-Type': m.content_type})
+        finally:
+            for f in files:
+                f.close()
+
+        # Nexus 3 stores uploaded files in maven2 layout, so their urls are known without asking the server
+        result = []
+        for local_artifact in local_artifacts:
+            remote_artifact = RemoteArtifact(group=local_artifact.group, artifact=local_artifact.artifact,
+                                             version=local_artifact.version, classifier=local_artifact.classifier,
+                                             extension=local_artifact.extension, repo_id=repo_id)
+            remote_artifact.url = self.get_content_url(repo_id, remote_artifact.get_maven_path())
+            result.append(remote_artifact)
+
+        return result
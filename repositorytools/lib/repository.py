@@ -4,21 +4,53 @@ Contains classes for manipulating with a repository server
 
 from __future__ import print_function
 
-__all__ = ['RepositoryClientError', 'WrongDataTypeError', 'ArtifactNotFoundError',
-           'NexusRepositoryClient', 'NexusProRepositoryClient', 'repository_client_factory']
-
-import requests
+__all__ = ['RepositoryClientError', 'WrongDataTypeError', 'ArtifactNotFoundError', 'StagingStateError', 'PublishError',
+           'RepositoryClient',
+           'NexusRepositoryClient', 'NexusProRepositoryClient', 'repository_client_factory', 'detect_repository_type',
+           'PublishResult', 'VERIFY_EACH', 'VERIFY_BATCH', 'VERIFY_NONE', 'PUBLISH_ALL', 'PUBLISH_PRIMARY',
+           'PUBLISH_ANY']
+
+import abc
+import codecs
 import logging
 import os
 import sys
 import json
 import base64
-
-from repositorytools.lib.artifact import RemoteArtifact
-from requests_toolbelt import MultipartEncoder
+import gzip
+import tempfile
+import threading
+import time
+
+import six
+
+from repositorytools.lib.artifact import LocalArtifact, RemoteArtifact, FileSource, _IterableReader
+from repositorytools.lib import compression
+from repositorytools.lib.compression import COMPRESSIONS
+from repositorytools.lib import events
+from repositorytools.lib.concurrency import map_concurrently, imap_concurrently, BackgroundTask, DEFAULT_MAX_WORKERS
+from repositorytools.lib.jsonstream import iter_array_items
+from repositorytools.lib.mirrors import MirrorSelector
+from repositorytools.lib.spans import span
+from repositorytools.lib.version import latest_version
 
 logger = logging.getLogger(__name__)
 
+# see RepositoryClient.upload_artifacts
+VERIFY_EACH = 'each'
+VERIFY_BATCH = 'batch'
+VERIFY_NONE = 'none'
+_VERIFY_MODES = (VERIFY_EACH, VERIFY_BATCH, VERIFY_NONE)
+
+# which servers have to succeed, see NexusRepositoryClient.publish_artifacts
+PUBLISH_ALL = 'all'
+PUBLISH_PRIMARY = 'primary'
+PUBLISH_ANY = 'any'
+_PUBLISH_POLICIES = (PUBLISH_ALL, PUBLISH_PRIMARY, PUBLISH_ANY)
+
+# states of staging repositories, in order of their lifecycle
+_STAGING_STATES = ('open', 'closed', 'released', 'dropped')
+
 
 class RepositoryClientError(Exception):
     """
@@ -32,44 +64,612 @@ class WrongDataTypeError(RepositoryClientError):
 class ArtifactNotFoundError(RepositoryClientError):
     pass
 
+class StagingStateError(RepositoryClientError):
+    """
+    Raised when a staging repository fails to get to a wanted state, e.g. because closing failed or it takes too long
+    """
+    pass
+
+class PublishError(RepositoryClientError):
+    """
+    Raised when publishing to more servers fails on servers required by the policy, see
+    NexusRepositoryClient.publish_artifacts. Attribute result is the PublishResult, with what succeeded where.
+    """
+    def __init__(self, message, result):
+        super(PublishError, self).__init__(message)
+        self.result = result
+
+# best-effort memo, not an LRU: when it's full it's emptied and filled again, like the cache of checksums. Entries
+# are tiny and a miss only costs encoding again, threads may race on it harmlessly.
+_ARTIFACT_URN_CACHE_SIZE = 10000
+_artifact_urn_cache = {}
+
+
+def _encode_artifact_urn(coordinates):
+    """
+    Encodes artifact id used by custom metadata API, results are memoized because the same artifacts are usually read
+    and then written.
+
+    :param coordinates: coordinates string, see Artifact.get_coordinates_string
+    :return: base64-encoded 'urn:maven/artifact#<coordinates>' as text
+    """
+    try:
+        return _artifact_urn_cache[coordinates]
+    except KeyError:
+        pass
+
+    artifact_id = 'urn:maven/artifact#{coordinates}'.format(coordinates=coordinates)
+    logger.debug('artifact_id: %s', artifact_id)
+    result = base64.b64encode(artifact_id.encode('utf-8')).decode('ascii')
+
+    if len(_artifact_urn_cache) >= _ARTIFACT_URN_CACHE_SIZE:
+        _artifact_urn_cache.clear()
+
+    _artifact_urn_cache[coordinates] = result
+    return result
+
+
+REPOSITORY_TYPES_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'repositorytools', 'repository_types.json')
+REPOSITORY_TYPES_CACHE_MAX_AGE = 24 * 60 * 60
+# servers which weren't recognized are probed again after this many seconds
+REPOSITORY_TYPES_NEGATIVE_CACHE_MAX_AGE = 60 * 60
+# seconds, a repository server answers its status endpoints quickly, an unreachable one shouldn't delay startup
+PROBE_TIMEOUT = 3
+
+# repository url -> type, detected in this process
+_repository_types = {}
+
+
+class _ServerUnreachable(Exception):
+    pass
+
+
+def _probe_repository_type(repository_url, verify_ssl=True, auth=None, timeout=PROBE_TIMEOUT):
+    """
+    Asks the server which kind of repository it is, every kind has its own status endpoint. If the server can't be
+    connected, the other endpoints aren't tried.
+
+    :param auth: tuple (user, password), servers with anonymous access disabled answer only with credentials
+    :return: one of REPOSITORY_TYPES keys or None if the server wasn't recognized
+    """
+    import requests
+
+    session = requests.session()
+    session.auth = auth
+    headers = {'accept': 'application/json'}
+
+    def get(path):
+        try:
+            return session.get('{url}/{path}'.format(url=repository_url.rstrip('/'), path=path), headers=headers,
+                               verify=verify_ssl, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _ServerUnreachable(e)
+        except requests.RequestException as e:
+            logger.debug('Probing %s/%s failed: %s', repository_url, path, e)
+            return None
+
+    try:
+        return _probe_endpoints(get)
+    except _ServerUnreachable as e:
+        logger.debug('Probing %s failed: %s', repository_url, e)
+        return None
+    finally:
+        session.close()
+
+
+def _probe_endpoints(get):
+    r = get('service/local/status')
+    if r is not None and r.status_code == 200:
+        try:
+            edition = r.json()['data'].get('editionShort')
+        except (ValueError, KeyError, AttributeError):
+            edition = None
+        if edition is not None:
+            return 'nexus-pro' if edition == 'PRO' else 'nexus'
+
+    r = get('service/rest/v1/status')
+    if r is not None and r.status_code == 200:
+        return 'nexus3'
+
+    r = get('api/system/ping')
+    if r is not None and r.status_code == 200 and r.text.strip() == 'OK':
+        return 'artifactory'
+
+    return None
+
+
+def _read_repository_types_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _write_repository_types_cache(cache_path, cache):
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # written to a temporary file and renamed, so concurrent processes never read a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError) as e:
+        logger.debug('Unable to write %s: %s', cache_path, e)
+
+
+def detect_repository_type(repository_url, verify_ssl=True, cache_path=REPOSITORY_TYPES_CACHE_PATH, auth=None):
+    """
+    Detects kind of a repository server. The server is probed only once, results are cached in this process and in
+    cache_path for REPOSITORY_TYPES_CACHE_MAX_AGE seconds, servers which weren't recognized for
+    REPOSITORY_TYPES_NEGATIVE_CACHE_MAX_AGE seconds.
+
+    :param repository_url: url to repository server
+    :param verify_ssl: False if you don't want to verify SSL certificate of the server
+    :param cache_path: file with cached results, None to not use it
+    :param auth: tuple (user, password) sent with the probes
+    :return: one of REPOSITORY_TYPES keys or None if the server wasn't recognized
+    """
+    try:
+        return _repository_types[repository_url]
+    except KeyError:
+        pass
+
+    cache = _read_repository_types_cache(cache_path) if cache_path else {}
+    cached = cache.get(repository_url)
+    if cached:
+        max_age = REPOSITORY_TYPES_CACHE_MAX_AGE if cached['type'] else REPOSITORY_TYPES_NEGATIVE_CACHE_MAX_AGE
+
+    if cached and time.time() - cached['detected_at'] < max_age:
+        repository_type = cached['type']
+    else:
+        repository_type = _probe_repository_type(repository_url, verify_ssl, auth)
+        logger.debug('Repository %s detected as %s', repository_url, repository_type)
+
+        if cache_path:
+            cache[repository_url] = {'type': repository_type, 'detected_at': time.time()}
+            _write_repository_types_cache(cache_path, cache)
+
+    _repository_types[repository_url] = repository_type
+    return repository_type
+
+
+def _get_repository_types():
+    # imported here, because these modules import this one
+    from repositorytools.lib.nexus3 import Nexus3RepositoryClient
+    from repositorytools.lib.artifactory import ArtifactoryRepositoryClient
+
+    return {
+        'nexus': NexusRepositoryClient,
+        'nexus-pro': NexusProRepositoryClient,
+        'nexus3': Nexus3RepositoryClient,
+        'artifactory': ArtifactoryRepositoryClient,
+    }
+
+
 def repository_client_factory(*args, **kwargs):
     """
     Detects which kind of repository user wants to use and returns appropriate instance of it.
 
-    :param args:
-    :param kwargs:
-    :return:
+    The kind can be forced by argument repository_type or environment variable REPOSITORY_TYPE, one of 'nexus',
+    'nexus-pro', 'nexus3' and 'artifactory'. Otherwise the server is probed with the configured credentials, see
+    detect_repository_type. If the server can't be recognized, Nexus Professional is assumed, unless the kind is
+    'auto', which requires the detection to succeed.
+
+    :param args: repository_url, user and password, the other arguments have to be passed by name, because the client
+     classes order them differently
+    :param kwargs: arguments of the client class and repository_type
+    :return: instance of a RepositoryClient descendant
     """
-    # short-term TODO: detect between Nexus and NexusPro
-    # long-term TODO: detect and support also Artifactory and ArtifactoryPro
-    return NexusProRepositoryClient(*args, **kwargs)
+    if len(args) > 3:
+        raise TypeError('repository_client_factory() takes at most 3 positional arguments (repository_url, user, '
+                        'password), {count} given'.format(count=len(args)))
+
+    repository_types = _get_repository_types()
+    repository_type = kwargs.pop('repository_type', None) or os.environ.get('REPOSITORY_TYPE')
+
+    if not repository_type or repository_type == 'auto':
+        def argument(name, position, environment_variable):
+            value = kwargs.get(name, args[position] if len(args) > position else None)
+            return os.environ.get(environment_variable) if value is None else value
+
+        repository_url = argument('repository_url', 0, 'REPOSITORY_URL') or RepositoryClient.DEFAULT_REPOSITORY_URL
+        # '' is anonymous access, see RepositoryClient
+        user = argument('user', 1, 'REPOSITORY_USER')
+        auth = (user, argument('password', 2, 'REPOSITORY_PASSWORD')) if user else None
+        detected = detect_repository_type(repository_url, kwargs.get('verify_ssl', True), auth=auth)
+
+        if detected is None and repository_type == 'auto':
+            raise RepositoryClientError('Unable to detect kind of repository {url}, set REPOSITORY_TYPE'.format(
+                url=repository_url))
+
+        if detected is None:
+            logger.warning('Unable to detect kind of repository %s, assuming Nexus Professional', repository_url)
+            detected = 'nexus-pro'
 
+        repository_type = detected
 
-class NexusRepositoryClient(object):
+    try:
+        cls = repository_types[repository_type]
+    except KeyError:
+        raise RepositoryClientError('Unknown repository type {repository_type}, use one of {types}'.format(
+            repository_type=repository_type, types=', '.join(sorted(repository_types))))
+
+    # only Nexus Professional has staging repositories
+    if cls is not NexusProRepositoryClient:
+        kwargs.pop('staging_repository_url', None)
+
+    # publishing to replicas is implemented for Nexus 2 only
+    if not issubclass(cls, NexusRepositoryClient):
+        kwargs.pop('replica_urls', None)
+
+    return cls(*args, **kwargs)
+
+def _group_by_component(local_artifacts, max_size):
     """
-    Class for working with Sonatype Nexus OSS
+    Groups artifacts with the same group, artifact and version, keeping order of their first occurrence.
+
+    :param local_artifacts: list[LocalArtifact]
+    :param max_size: maximum number of artifacts in a group, bigger groups are split
+    :return: list of lists of tuples (index in local_artifacts, LocalArtifact)
+    """
+    if max_size <= 1:
+        return [[(i, local_artifact)] for i, local_artifact in enumerate(local_artifacts)]
+
+    groups = []
+    open_groups = {}
+
+    for i, local_artifact in enumerate(local_artifacts):
+        key = (local_artifact.group, local_artifact.artifact, local_artifact.version)
+        group = open_groups.get(key)
+
+        if group is None or len(group) >= max_size:
+            group = open_groups[key] = []
+            groups.append(group)
+
+        group.append((i, local_artifact))
+
+    return groups
+
+
+class _ResponseStream(_IterableReader):
+    """
+    File-like wrapper of a streamed response, which lets requests send it with Content-Length instead of chunked
+    encoding, which not all servers accept.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, response):
+        self._raw = response.raw
+        self._length = int(response.headers['Content-Length'])
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        return self._raw.read(None if size < 0 else size)
+
+
+class _HashingReader(_IterableReader):
+    """
+    File-like wrapper of a stream, which computes checksums of the content as it's being sent, so the content is read
+    only once. Its length isn't known, so requests sends it chunked.
+    """
+    def __init__(self, f, algorithms):
+        import hashlib
+
+        self._f = f
+        self._digests = [(algorithm, hashlib.new(algorithm)) for algorithm in algorithms]
+
+    @staticmethod
+    def for_source(f, algorithms, source):
+        """
+        :param f: file-like object opened by source.open
+        :param source: ArtifactSource
+        :return: _HashingReader, or _SizedHashingReader if the length of the content is known
+        """
+        if source.size is not None:
+            return _SizedHashingReader(f, algorithms, source.size)
+
+        return _HashingReader(f, algorithms)
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        for _, digest in self._digests:
+            digest.update(data)
+        return data
+
+    def hexdigests(self):
+        """
+        :return: dict algorithm -> hex digest of the content read so far
+        """
+        return dict((algorithm, digest.hexdigest()) for algorithm, digest in self._digests)
+
+
+class _SizedHashingReader(_HashingReader):
+    """
+    _HashingReader of content with a known length, e.g. a local file or a buffer, which is sent with Content-Length
+    """
+    def __init__(self, f, algorithms, length):
+        """
+        :param f: file-like object at its beginning
+        :param length: number of bytes in f
+        """
+        super(_SizedHashingReader, self).__init__(f, algorithms)
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+
+class _Tee(object):
+    """
+    Splits a file-like object into more readers, so its content is read once and sent to more servers at once.
+
+    Chunks are passed to the readers through bounded queues, so memory use is bounded and the slowest reader sets the
+    pace. A closed reader, e.g. one whose request failed, doesn't hold up the others.
+
+    Usage::
+
+        tee = _Tee(f, length, 2)
+        with BackgroundTask(tee.pump) as task:
+            map_concurrently(send, tee.readers)
+            task.result()
+    """
+    CHUNK_SIZE = 1024 * 1024
+    QUEUE_SIZE = 8
+
+    def __init__(self, f, length, count):
+        """
+        :param f: file-like object opened in binary mode
+        :param length: number of bytes which will be read from f, None if it isn't known, then readers are sent
+         chunked
+        :param count: number of readers
+        """
+        from six.moves import queue
+
+        self._f = f
+        if length is None:
+            self.readers = [_TeeReader(queue.Queue(self.QUEUE_SIZE)) for _ in range(count)]
+        else:
+            self.readers = [_SizedTeeReader(queue.Queue(self.QUEUE_SIZE), length) for _ in range(count)]
+
+    def pump(self):
+        """
+        Reads the source and passes its chunks to the readers, till its end. Runs in a background thread.
+        """
+        try:
+            for chunk in iter(lambda: self._f.read(self.CHUNK_SIZE), b''):
+                if all(reader.closed for reader in self.readers):
+                    return
+
+                for reader in self.readers:
+                    reader._put(chunk)
+        except Exception as e:
+            for reader in self.readers:
+                reader._put(e)
+            raise
+
+        for reader in self.readers:
+            reader._put(b'')
+
+
+class _TeeReader(_IterableReader):
+    """
+    One output of _Tee, a file-like object which can be sent by requests
+    """
+    CHUNK_SIZE = _Tee.CHUNK_SIZE
+
+    _PUT_TIMEOUT = 0.1
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._chunk = b''
+        self._position = 0
+        self._eof = False
+        self.closed = False
+
+    def _put(self, item):
+        from six.moves import queue
+
+        while not self.closed:
+            try:
+                self._chunks.put(item, timeout=self._PUT_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def read(self, size=-1):
+        while self._position >= len(self._chunk):
+            if self._eof:
+                return b''
+
+            item = self._chunks.get()
+            if isinstance(item, Exception):
+                raise item
+
+            self._chunk, self._position, self._eof = item, 0, not item
+
+        end = len(self._chunk) if size is None or size < 0 else self._position + size
+        data = self._chunk[self._position:end]
+        self._position += len(data)
+        return data
+
+    def close(self):
+        """
+        Stops receiving chunks, the other readers continue without this one
+        """
+        self.closed = True
+
+
+class _SizedTeeReader(_TeeReader):
+    """
+    _TeeReader of content with a known length, which is sent with Content-Length
+    """
+    def __init__(self, chunks, length):
+        super(_SizedTeeReader, self).__init__(chunks)
+        self._remaining = length
+
+    def __len__(self):
+        # requests takes it as Content-Length, requests_toolbelt as number of bytes left
+        return self._remaining
+
+    def read(self, size=-1):
+        data = super(_SizedTeeReader, self).read(size)
+        self._remaining -= len(data)
+        return data
+
+
+class PublishResult(object):
+    """
+    Outcome of NexusRepositoryClient.publish_artifacts on each server
+    """
+    def __init__(self, repository_urls):
+        """
+        :param repository_urls: urls of the servers, the primary one first
+        """
+        self.repository_urls = list(repository_urls)
+
+        # repository url -> list[RemoteArtifact] uploaded there, in order of local artifacts
+        self.remote_artifacts = dict((url, []) for url in self.repository_urls)
+
+        # repository url -> exception which made the server fail, no more artifacts were sent there after it
+        self.errors = {}
+
+    @property
+    def succeeded(self):
+        """
+        :return: urls of servers which got all artifacts
+        """
+        return [url for url in self.repository_urls if url not in self.errors]
+
+    @property
+    def failed(self):
+        """
+        :return: urls of servers which failed
+        """
+        return [url for url in self.repository_urls if url in self.errors]
+
+    def is_acceptable(self, required):
+        """
+        :param required: PUBLISH_ALL, PUBLISH_PRIMARY or PUBLISH_ANY
+        :return: True if servers required by the policy succeeded
+        """
+        if required == PUBLISH_ALL:
+            return not self.errors
+        if required == PUBLISH_PRIMARY:
+            return self.repository_urls[0] not in self.errors
+        return bool(self.succeeded)
+
+
+class _Filelist(object):
+    """
+    List of coordinates of uploaded artifacts, one per line. Kept in memory while small, then spooled to a temporary
+    file.
+    """
+    MAX_MEMORY_SIZE = 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+    GZIP_MAGIC = b'\x1f\x8b'
+
+    def __init__(self, compress=False):
+        self._file = tempfile.SpooledTemporaryFile(max_size=self.MAX_MEMORY_SIZE)
+        self._stream = gzip.GzipFile(fileobj=self._file, mode='wb') if compress else self._file
+        self._empty = True
+
+    def add(self, remote_artifact):
+        line = remote_artifact.get_coordinates_string()
+        if not self._empty:
+            line = '\n' + line
+        self._stream.write(line.encode('utf-8'))
+        self._empty = False
+
+    def iter_chunks(self):
+        """
+        :return: generator of chunks of the (compressed) filelist, requests sends it using chunked encoding
+        """
+        if self._stream is not self._file:
+            # writes gzip trailer, doesn't close underlying file
+            self._stream.close()
+
+        self._file.seek(0)
+        return iter(lambda: self._file.read(self.CHUNK_SIZE), b'')
+
+    def close(self):
+        self._file.close()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class RepositoryClient(object):
+    """
+    Base class of clients of repository servers, descendants implement methods specific for a kind of server
+
+    Clients are thread-safe, one client can be shared by a pool of threads, which then reuse its connections.
     """
     DEFAULT_REPOSITORY_URL = 'https://repository'
 
-    def __init__(self, repository_url=None, user=None, password=None, verify_ssl=True):
+    # how many files of one component can be uploaded by one request, see _upload_component
+    _max_assets_per_upload = 1
+
+    # cheap request telling whether the server is up, used for probing mirrors
+    _status_path = None
+    _MIRROR_PROBE_TIMEOUT = 5
+
+    # maximum number of idle connections kept per host, more threads than this can use the client, but then some
+    # connections aren't reused
+    _POOL_MAXSIZE = 32
+
+    def __init__(self, repository_url=None, user=None, password=None, verify_ssl=True, compression=None,
+                 mirror_urls=None):
         """
 
         :param repository_url: url to repository server
-        :param user: username for connecting to repository
+        :param user: username for connecting to repository, if None, it's taken from environment variable
+         REPOSITORY_USER, '' for anonymous access
         :param password: password for connecting to repository
         :param verify_ssl: False if you don't want to verify SSL certificate of the server
+        :param compression: 'gzip' or 'deflate' to compress bodies of JSON requests. Use it only if the server (or a
+         proxy in front of it) decodes Content-Encoding of requests. If the server refuses a compressed request, it's
+         sent again uncompressed and compression is turned off. Artifacts are always sent uncompressed.
+        :param mirror_urls: urls of read mirrors of the server, e.g. in other sites. Resolving and downloading use the
+         closest healthy one, falling back to the others and to repository_url. If None, they are taken from
+         environment variable REPOSITORY_MIRROR_URLS, separated by spaces.
         :return:
         """
         self._verify_ssl = verify_ssl
+        self._versions_cache = {}
+
+        # EventReporter, which gets events of uploads, if None, only created artifacts are written right away
+        self.reporter = None
+
+        self._compression = compression or os.environ.get('REPOSITORY_COMPRESSION') or None
+        if self._compression is not None and self._compression not in COMPRESSIONS:
+            raise ValueError('compression has to be one of {compressions}'.format(
+                compressions=', '.join(COMPRESSIONS)))
 
         if repository_url:
             self._repository_url = repository_url
         else:
             self._repository_url = os.environ.get('REPOSITORY_URL', self.DEFAULT_REPOSITORY_URL)
 
-        self._session = requests.session()
+        if mirror_urls is None:
+            mirror_urls = os.environ.get('REPOSITORY_MIRROR_URLS', '').split()
 
-        if not user:
+        # the server itself is probed too, it may be the closest one
+        self._mirrors = MirrorSelector(list(mirror_urls) + [self._repository_url],
+                                       self._probe_mirror) if mirror_urls else None
+
+        # imported here to keep startup of command line tools fast, see tests/import_time_benchmark.py
+        from requests.adapters import HTTPAdapter
+
+        # one pool of connections for sessions of all threads, see _session
+        self._adapter = HTTPAdapter(pool_maxsize=self._POOL_MAXSIZE)
+        self._local = threading.local()
+        self._auth = None
+
+        if user is None:
             user = os.environ.get('REPOSITORY_USER')
 
         if user:
@@ -79,164 +679,576 @@ class NexusRepositoryClient(object):
                 except KeyError:
                     logger.error('Repository password not specified. Please specify repository password in environment'
                                  ' variable "REPOSITORY_PASSWORD"')
-            self._session.auth = (user, password)
+            self._auth = (user, password)
+
+    @property
+    def _session(self):
+        """
+        requests.Session of the current thread. Sessions aren't thread-safe, so each thread gets its own, but they all
+        share the pool of connections, which is.
+        """
+        session = getattr(self._local, 'session', None)
+
+        if session is None:
+            import requests
+
+            session = requests.Session()
+            session.auth = self._auth
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+
+        return session
+
+    def close(self):
+        """
+        Closes pooled connections. The client can still be used, new connections are opened when needed.
+        """
+        self._adapter.close()
 
+    @abc.abstractmethod
+    def _get_content_path(self, repo_id, path):
+        """
+        :param repo_id: id of repository
+        :param path: path of a file in the repository, e.g. com/fooware/foo/1.0/foo-1.0.jar
+        :return: path of the file relative to repository url
+        """
+        pass
+
+    @abc.abstractmethod
     def resolve_artifact(self, remote_artifact):
-        data = self._send_json('service/local/artifact/maven/resolve', params=dict(g=remote_artifact.group,
-                                                               a=remote_artifact.artifact,
-                                                               v=remote_artifact.version,
-                                                               r=remote_artifact.repo_id,
-                                                               c=remote_artifact.classifier,
-                                                               e=remote_artifact.extension))['data']
+        """
+        Fills url and other attributes of remote_artifact, which has to have at least group, artifact, version and
+        repo_id set.
 
-        remote_artifact.group = data.get('groupId', remote_artifact.group)
-        remote_artifact.artifact = data.get('artifactId', remote_artifact.artifact)
-        remote_artifact.version = data.get('version', remote_artifact.version)
-        remote_artifact.classifier = data.get('classifier', remote_artifact.classifier)
-        remote_artifact.extension = data.get('extension', remote_artifact.extension)
+        :param remote_artifact: RemoteArtifact
+        """
+        pass
 
-        remote_artifact.url = '{repository_url}/content/repositories/{repo}{artifact_path}'.format(
-            repository_url=self._repository_url, repo=remote_artifact.repo_id, artifact_path=data['repositoryPath'])
+    @abc.abstractmethod
+    def _upload_artifact(self, local_artifact, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False,
+                         resolve=True, checksum_sidecars=()):
+        """
+        Uploads one artifact, see upload_artifacts. path_prefix, hostname_for_download and use_direct_put are
+        specific for Nexus 2, other servers may ignore them.
 
-        remote_artifact.present_locally = data['presentLocally']
-        remote_artifact.snapshot = data['snapshot']
-        remote_artifact.snapshot_buildnumber = data['snapshotBuildNumber']
-        remote_artifact.snapshot_timestamp = data['snapshotTimeStamp']
-        if 'baseVersion' in data:
-            remote_artifact.base_version = data['baseVersion']
-        if 'sha1' in data:
-            remote_artifact.sha1 = data.get('sha1')
+        :param resolve: if False, url of the uploaded artifact is computed locally instead of asking the server,
+         where possible
+        :param checksum_sidecars: see upload_artifacts
+
+        :return: RemoteArtifact
+        """
+        pass
+
+    def get_content_url(self, repo_id, path, repository_url=None):
+        """
+        :param repo_id: id of repository
+        :param path: path of a file in the repository, e.g. com/fooware/foo/1.0/foo-1.0.jar
+        :param repository_url: url of a mirror, if None, url of the server is used
+        :return: url for downloading the file
+        """
+        return '{repository_url}/{content_path}'.format(repository_url=repository_url or self._repository_url,
+                                                        content_path=self._get_content_path(repo_id, path))
+
+    def read_content(self, repo_id, path):
+        """
+        Downloads a small text file, e.g. a checksum, from a repository.
+
+        :param repo_id: id of repository
+        :param path: path of the file in the repository
+        :return: content of the file as text
+        """
+        return self._read(self._get_content_path(repo_id, path))[1].text
+
+    def download_artifact(self, remote_artifact, local_path):
+        """
+        Downloads an artifact to a local file, from the closest healthy mirror if there are mirrors.
+
+        :param remote_artifact: RemoteArtifact, it's resolved first if it has no url
+        :param local_path: path of the file to write, or of a directory where the file is written under its remote
+         name
+        :return: path of the written file
+        """
+        if not remote_artifact.url:
+            self.resolve_artifact(remote_artifact)
+
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, remote_artifact.url.rsplit('/', 1)[-1])
+
+        logger.info('<- Downloading %s', remote_artifact.url)
+        path = self._get_server_path(remote_artifact.url)
+        headers = {'Accept-Encoding': 'identity'}
+
+        if path is None:
+            r = self._session.get(remote_artifact.url, stream=True, verify=self._verify_ssl, headers=headers)
+            r.raise_for_status()
+        else:
+            _, r = self._read(path, stream=True, headers=headers)
+
+        try:
+            with open(local_path, 'wb') as f:
+                for chunk in r.iter_content(_ResponseStream.CHUNK_SIZE):
+                    f.write(chunk)
+        except Exception:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise
+        finally:
+            r.close()
+
+        return local_path
+
+    def _get_server_path(self, url):
+        """
+        :param url: url on this server or on one of its mirrors
+        :return: path relative to url of the server, None if url is elsewhere
+        """
+        for repository_url in [self._repository_url] + (self._mirrors.urls if self._mirrors else []):
+            prefix = repository_url.rstrip('/') + '/'
+            if url.startswith(prefix):
+                return url[len(prefix):]
+
+        return None
+
+    def _probe_mirror(self, repository_url):
+        r = self._session.get('{url}/{path}'.format(url=repository_url, path=self._status_path or ''),
+                              verify=self._verify_ssl, timeout=self._MIRROR_PROBE_TIMEOUT)
+        r.close()
+        r.raise_for_status()
+
+    def _read(self, path, **kwargs):
+        """
+        Sends a GET request to the closest healthy mirror. Mirrors which fail are skipped and the next ones are tried,
+        404 is taken as not replicated yet.
+
+        :return: tuple (url of the server or mirror which answered, response)
+        """
+        if self._mirrors is None:
+            return self._repository_url, self._send(path, **kwargs)
+
+        import requests
+
+        candidates = self._mirrors.get_ordered()
+        if self._repository_url not in candidates:
+            # the last resort, even if its probe failed
+            candidates.append(self._repository_url)
+
+        for i, repository_url in enumerate(candidates):
+            try:
+                return repository_url, self._send(path, repository_url=repository_url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if i == len(candidates) - 1:
+                    raise
+
+                if isinstance(e, requests.HTTPError) and e.response.status_code == 404:
+                    logger.info('%s not found on %s, trying next mirror', path, repository_url)
+                elif isinstance(e, requests.HTTPError) and e.response.status_code < 500:
+                    raise
+                else:
+                    logger.warning('Mirror %s failed, trying next one: %s', repository_url, e)
+                    self._mirrors.mark_failed(repository_url)
+
+    def get_versions(self, repo_id, group, artifact, max_age=60):
+        """
+        Gets all versions of an artifact from maven-metadata.xml, which costs one request. Results are cached.
+
+        :param repo_id: id of repository
+        :param group: group of artifact
+        :param artifact: name of artifact
+        :param max_age: how many seconds a cached result can be used
+        :return: list of version strings
+        """
+        cache_key = (repo_id, group, artifact)
+        cached = self._versions_cache.get(cache_key)
+
+        if cached is not None and time.time() - cached[0] < max_age:
+            return cached[1]
+
+        from xml.etree import ElementTree
+
+        path = '{group}/{artifact}/maven-metadata.xml'.format(group=group.replace('.', '/'), artifact=artifact)
+        metadata = ElementTree.fromstring(self._read(self._get_content_path(repo_id, path))[1].content)
+        versions = [element.text for element in metadata.findall('versioning/versions/version')]
+
+        self._versions_cache[cache_key] = (time.time(), versions)
+        return versions
+
+    def resolve_latest(self, remote_artifact, version_range=None, scheme='maven', include_snapshots=False):
+        """
+        Resolves the newest version of an artifact matching a version range. Versions are compared locally, so only
+        the chosen version is resolved.
+
+        :param remote_artifact: RemoteArtifact, its version is changed to the chosen one
+        :param version_range: maven version range, e.g. [1.2,2.0), if None, version of remote_artifact is used as
+         range, if it's empty, any version matches
+        :param scheme: 'maven' or 'rpm', see repositorytools.lib.version
+        :param include_snapshots: if True, also -SNAPSHOT versions are considered
+        :return: chosen version
+        """
+        if version_range is None:
+            version_range = remote_artifact.version or None
+
+        versions = self.get_versions(remote_artifact.repo_id, remote_artifact.group, remote_artifact.artifact)
+        version = latest_version(versions, version_range, scheme, include_snapshots)
+
+        if version is None:
+            raise ArtifactNotFoundError('No version of {group}:{artifact} matching {version_range} in {repo_id}'.format(
+                group=remote_artifact.group, artifact=remote_artifact.artifact, version_range=version_range,
+                repo_id=remote_artifact.repo_id))
+
+        remote_artifact.version = version
+        self.resolve_artifact(remote_artifact)
+        return version
 
     def upload_artifacts(self, local_artifacts, repo_id, print_created_artifacts=True, _hostname_for_download=None,
-                         _path_prefix='content/repositories', use_direct_put=False):
+                         _path_prefix='content/repositories', use_direct_put=False, max_workers=1, _on_uploaded=None,
+                         verify=VERIFY_EACH, journal=None, checksum_sidecars=()):
         """
-        Uploads artifacts to repository.
+        Uploads artifacts to repository. If the server supports it, files of one component (with the same group,
+        artifact and version) are uploaded together by one request.
 
         :param local_artifacts: list[LocalArtifact]
         :param repo_id: id of target repository
-        :param print_created_artifacts: if True prints to stdout what was uploaded and where
-        :return: list[RemoteArtifact]
+        :param print_created_artifacts: if True reports what was uploaded and where, see attribute reporter
+        :param max_workers: number of artifacts uploaded in parallel
+        :param verify: how urls of uploaded artifacts are obtained. VERIFY_EACH: the server is asked after each upload,
+         VERIFY_BATCH: urls are computed locally and presence of all artifacts is checked at the end with as few
+         requests as possible, VERIFY_NONE: urls are computed locally and not checked. Urls of snapshots are always
+         resolved, because the server chooses their names.
+        :param journal: UploadJournal, if given, files already uploaded to repo_id by this or another process are
+         skipped and concurrent uploads of the same file by more processes are done only once. Artifacts whose
+         source is a stream are always uploaded.
+        :param checksum_sidecars: names of hashlib algorithms, e.g. ('sha1', 'md5'). With use_direct_put, checksums are
+         computed while the file is sent and uploaded as .sha1, .md5 etc. files next to it. Servers which generate
+         checksum files themselves ignore this.
+        :return: list[RemoteArtifact] in the same order as local_artifacts
         """
+        if verify not in _VERIFY_MODES:
+            raise ValueError('verify has to be one of {modes}'.format(modes=', '.join(_VERIFY_MODES)))
+
+        local_artifacts = list(local_artifacts)
 
         # upload files
-        remote_artifacts = []
+        upload_kwargs = dict(path_prefix=_path_prefix, hostname_for_download=_hostname_for_download,
+                             use_direct_put=use_direct_put, resolve=verify == VERIFY_EACH,
+                             checksum_sidecars=checksum_sidecars)
 
-        for local_artifact in local_artifacts:
-            remote_artifact = self._upload_artifact(local_artifact=local_artifact, path_prefix=_path_prefix,
-                                                    repo_id=repo_id, hostname_for_download=_hostname_for_download,
-                                                    use_direct_put=use_direct_put)
-            remote_artifacts.append(remote_artifact)
+        def send_files(batch):
+            if len(batch) > 1:
+                return self._upload_component(batch, repo_id, **upload_kwargs)
+
+            return [self._upload_artifact(local_artifact=batch[0], repo_id=repo_id, **upload_kwargs)]
+
+        def upload_files(batch):
+            if self.reporter is None:
+                return send_files(batch)
+
+            return self._upload_reported(batch, repo_id, send_files)
+
+        def upload(batch):
+            batch = [local_artifact for _, local_artifact in batch]
+
+            # the journal keys files by sha1, which a stream doesn't have before it's uploaded
+            if journal is None or not all(local_artifact.source.reopenable for local_artifact in batch):
+                return upload_files(batch)
+
+            return journal.upload(repo_id, batch, upload_files)
+
+        if journal is not None:
+            streams = [local_artifact for local_artifact in local_artifacts if not local_artifact.source.reopenable]
+            if streams:
+                logger.warning('Streams can be read only once, their uploads are not journaled: %s', streams)
+
+            # files are keyed by sha1, hash them all in parallel at once
+            LocalArtifact.compute_checksums([local_artifact for local_artifact in local_artifacts
+                                             if local_artifact.source.reopenable], ('sha1',))
+
+        batches = _group_by_component(local_artifacts, self._max_assets_per_upload)
+        remote_artifacts = [None] * sum(len(batch) for batch in batches)
+
+        with span('upload_files'):
+            for batch, uploaded in zip(batches, imap_concurrently(upload, batches, max_workers)):
+                for (i, _), remote_artifact in zip(batch, uploaded):
+                    remote_artifacts[i] = remote_artifact
+
+                    if _on_uploaded:
+                        _on_uploaded(remote_artifact)
+
+        if verify == VERIFY_BATCH:
+            with span('verify_uploaded'):
+                self._verify_uploaded(remote_artifacts, max_workers=max(max_workers, DEFAULT_MAX_WORKERS))
 
         if print_created_artifacts:
-            NexusRepositoryClient._print_created_artifacts(remote_artifacts, repo_id)
+            self._report_created_artifacts(remote_artifacts, repo_id)
 
         return remote_artifacts
 
-    def _upload_artifact(self, local_artifact, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False):
+    def _upload_reported(self, local_artifacts, repo_id, upload):
+        """
+        Calls upload(local_artifacts) and emits events about it to the reporter.
 
-        filename = os.path.basename(local_artifact.local_path)
-        logger.info('-> Uploading %s', filename)
-        logger.debug('local artifact: %s', local_artifact)
+        :return: what upload returned
+        """
+        # None for streams, whose size isn't known in advance
+        sizes = [local_artifact.source.size for local_artifact in local_artifacts]
+        for local_artifact, size in zip(local_artifacts, sizes):
+            self.reporter.emit(events.Event(events.UPLOAD_STARTED, local_path=local_artifact.local_path,
+                                            repo_id=repo_id, size=size))
+
+        start = time.time()
+        try:
+            remote_artifacts = upload(local_artifacts)
+        except Exception as e:
+            for local_artifact, size in zip(local_artifacts, sizes):
+                self.reporter.emit(events.Event(events.UPLOAD_FAILED, local_path=local_artifact.local_path,
+                                                repo_id=repo_id, size=size, duration=time.time() - start, error=e))
+            raise
+
+        # files of one component are sent by one request, they share its duration
+        duration = time.time() - start
+        for local_artifact, size, remote_artifact in zip(local_artifacts, sizes, remote_artifacts):
+            self.reporter.emit(events.Event(events.UPLOAD_FINISHED, local_path=local_artifact.local_path,
+                                            repo_id=repo_id, size=size, duration=duration, url=remote_artifact.url))
 
-        # rgavf stands for repo-group-local_artifact-version-filename
-        gavf = '{group}/{name}/{ver}/{filename}'.format(group=local_artifact.group.replace('.', '/'),
-                                                        name=local_artifact.artifact, ver=local_artifact.version,
-                                                        filename=filename)
-        rgavf = '{repo_id}/{gavf}'.format(repo_id=repo_id, gavf=gavf)
+        return remote_artifacts
 
-        with open(local_artifact.local_path, 'rb') as f:
-            if not use_direct_put:
-                data = {
-                    'g':local_artifact.group,
-                    'a':local_artifact.artifact,
-                    'v':local_artifact.version,
-                    'r':repo_id,
-                    'e': local_artifact.extension,
-                    'p': local_artifact.extension,
-                    'c': local_artifact.classifier,
-                    'hasPom': 'false'
-                }
-
-
-                data_list = list(data.items())
-                data_list.append( ('file', (filename, f, 'text/plain') ))
-                m_for_logging = MultipartEncoder(fields=data_list)
-                logger.debug('payload: %s', m_for_logging.to_string())
+    def _upload_component(self, local_artifacts, repo_id, **kwargs):
+        """
+        Uploads more files of one component. Servers with _max_assets_per_upload > 1 override this to upload them by
+        one request, by default they're uploaded one by one.
 
-                f.seek(0)
-                m = MultipartEncoder(fields=data_list)
-                headers = {'Content-Type': m.content_type}
+        :param local_artifacts: list[LocalArtifact], all with the same group, artifact and version
+        :param repo_id: id of target repository
+        :param kwargs: other arguments of _upload_artifact, e.g. path_prefix
+        :return: list[RemoteArtifact]
+        """
+        return [self._upload_artifact(local_artifact=local_artifact, repo_id=repo_id, **kwargs)
+                for local_artifact in local_artifacts]
 
-                self._send('service/local/artifact/maven/content', method='POST', data=m, headers=headers)
+    def _verify_uploaded(self, remote_artifacts, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Checks that uploaded artifacts are present in repository.
 
-                result = RemoteArtifact(group=local_artifact.group, artifact=local_artifact.artifact,
-                                      version=local_artifact.version, classifier=local_artifact.classifier,
-                                      extension=local_artifact.extension, repo_id=repo_id)
-                self.resolve_artifact(result)
+        :param remote_artifacts: list[RemoteArtifact]
+        :param max_workers: number of requests sent in parallel
+        :raise RepositoryClientError: if some artifacts are missing
+        """
+        found = map_concurrently(self._exists, remote_artifacts, max_workers)
+        self._raise_if_missing([a for a, present in zip(remote_artifacts, found) if not present])
+
+    def _exists(self, remote_artifact):
+        r = self._session.head(remote_artifact.url, verify=self._verify_ssl, allow_redirects=True)
+        return r.status_code == 200
+
+    @staticmethod
+    def _raise_if_missing(missing):
+        if missing:
+            raise RepositoryClientError('Uploaded artifacts not found in repository: {urls}'.format(
+                urls=', '.join(remote_artifact.url for remote_artifact in missing)))
+
+    def copy_artifacts(self, remote_artifacts, repo_id, source_client=None, skip_existing=True,
+                       max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Copies artifacts to a repository of this server. Content is streamed from source to destination without
+        touching the disk.
+
+        :param remote_artifacts: list[RemoteArtifact] in source repository, artifacts without url are resolved first
+        :param repo_id: id of destination repository
+        :param source_client: client of the server where artifacts are now, if None, the same server is used
+        :param skip_existing: if True, artifacts with the same sha1 in destination are not copied
+        :param max_workers: number of artifacts copied in parallel
+        :return: list[RemoteArtifact] in destination repository, each has attribute copied, False if it was skipped
+        """
+        source_client = source_client or self
+
+        def copy(remote_artifact):
+            return self._copy_artifact(remote_artifact, repo_id, source_client, skip_existing)
+
+        return map_concurrently(copy, remote_artifacts, max_workers)
+
+    def _copy_artifact(self, remote_artifact, repo_id, source_client, skip_existing):
+        if not remote_artifact.url:
+            source_client.resolve_artifact(remote_artifact)
+
+        # the url may point to a mirror of the source server, see resolve_artifact
+        server_path = source_client._get_server_path(remote_artifact.url)
+        content_prefix = source_client._get_server_path(source_client.get_content_url(remote_artifact.repo_id, ''))
+        if server_path is None or not server_path.startswith(content_prefix):
+            raise RepositoryClientError('Unable to get path of {url}'.format(url=remote_artifact.url))
+        path = server_path[len(content_prefix):]
+
+        result = RemoteArtifact(group=remote_artifact.group, artifact=remote_artifact.artifact,
+                                version=remote_artifact.version, classifier=remote_artifact.classifier,
+                                extension=remote_artifact.extension, url=self.get_content_url(repo_id, path),
+                                repo_id=repo_id)
+        result.sha1 = getattr(remote_artifact, 'sha1', None)
+        result.copied = False
+
+        if skip_existing:
+            if result.sha1 is None:
+                result.sha1 = source_client._get_checksum(remote_artifact.url)
+
+            if result.sha1 is not None and result.sha1 == self._get_checksum(result.url):
+                logger.info('%s already present in %s, skipping', path, repo_id)
                 return result
 
+        logger.info('-> Copying %s to %s', remote_artifact.url, repo_id)
+        response = source_client._session.get(remote_artifact.url, stream=True, verify=source_client._verify_ssl,
+                                              headers={'Accept-Encoding': 'identity'})
+        try:
+            response.raise_for_status()
+            headers = {'Content-Type': response.headers.get('Content-Type', 'application/octet-stream')}
+
+            if 'Content-Length' in response.headers:
+                data = _ResponseStream(response)
             else:
-                headers = {'Content-Type': 'application/x-rpm'}
-                remote_path = '{path_prefix}/{rgavf}'.format(path_prefix=path_prefix, rgavf=rgavf)
-                self._send(remote_path, method='PUT', headers=headers, data=f)
+                data = response.iter_content(_ResponseStream.CHUNK_SIZE)
+
+            self._send(self._get_content_path(repo_id, path), method='PUT', headers=headers, data=data)
+        finally:
+            response.close()
 
-                # if not specified, use repository url
-                hostname_for_download = hostname_for_download or self._repository_url
-                url = '{hostname}/content/repositories/{rgavf}'.format(hostname=hostname_for_download, rgavf=rgavf)
+        result.copied = True
+        return result
+
+    def _get_checksum(self, url, algorithm='sha1'):
+        """
+        :param url: url of a file in a repository
+        :return: checksum from the sidecar file generated by the server or None if there is no such file
+        """
+        r = self._session.get('{url}.{algorithm}'.format(url=url, algorithm=algorithm), verify=self._verify_ssl)
 
-                # get classifier and extension from nexus
-                path = 'service/local/repositories/{repo_id}/content/{gavf}?describe=maven2'.format(repo_id=repo_id, gavf=gavf)
-                maven_metadata = self._send_json(path)['data']
+        if r.status_code == 404:
+            return None
 
-                return RemoteArtifact(group=maven_metadata['groupId'], artifact=maven_metadata['artifactId'],
-                                      version=maven_metadata['version'], classifier=maven_metadata.get('classifier', ''),
-                                      extension=maven_metadata.get('extension', ''), url=url, repo_id=repo_id)
+        r.raise_for_status()
+        return r.text.split()[0] if r.text.strip() else None
 
-    def delete_artifact(self, url):
+    def delete_artifact(self, url, missing_ok=False):
         """
         Deletes an artifact from repository.
 
-        :param url: string
+        :param url: string, url of a directory deletes all its content
+        :param missing_ok: if True, an artifact which doesn't exist isn't an error
         :return:
         """
         r = self._session.delete(url)
+        if missing_ok and r.status_code == 404:
+            return
+
         r.raise_for_status()
 
-    @staticmethod
-    def _print_created_artifacts(remote_artifacts, repo_id):
-        caption = 'The following files were uploaded to repository {repo_id}'.format(repo_id=repo_id)
+    def delete_artifacts(self, urls, max_workers=DEFAULT_MAX_WORKERS, missing_ok=False):
+        """
+        Deletes many artifacts in parallel.
 
-        if os.environ.get('TEAM_CITY_URL'):
-            for remote_artifact in remote_artifacts:
-                text = '<a href="{url}">{url}</a>'.format(url=remote_artifact.url)
-                print("##teamcity[highlight title='{caption}' text='{text}']".format(caption=caption, text=text))
+        :param urls: list of URLs of artifacts
+        :param max_workers: number of requests sent in parallel
+        :param missing_ok: see delete_artifact
+        :return:
+        """
+        map_concurrently(lambda url: self.delete_artifact(url, missing_ok), urls, max_workers)
+
+    def _report_created_artifacts(self, remote_artifacts, repo_id):
+        event = events.Event(events.ARTIFACTS_CREATED, repo_id=repo_id, remote_artifacts=remote_artifacts)
+
+        if self.reporter is not None:
+            self.reporter.emit(event)
+            return
+
+        # one batch, written right away, as TeamCity service messages when running in TeamCity
+        reporter = events.EventReporter()
+        reporter.emit(event)
+        reporter.flush()
+
+    def _send(self, path, method='GET', repository_url=None, **kwargs):
+        with span('http'):
+            r = self._session.request(method, '{hostname}/{path}'.format(
+                hostname=repository_url or self._repository_url, path=path), verify=self._verify_ssl, **kwargs)
+
+        # decoding of the text is expensive for big responses, streamed responses are read by the caller
+        if not kwargs.get('stream') and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('response: %s', r.text)
+        try:
+            r.raise_for_status()
+        except Exception:
+            # a streamed response would hold its connection till garbage collected
+            r.close()
+            raise
 
-        else:
-            print(caption, file=sys.stderr)
+        return r
 
-            for remote_artifact in remote_artifacts:
-                print(remote_artifact.url)
+    def _send_compressible(self, path, method, data, headers, **kwargs):
+        """
+        Sends a JSON request whose body is compressed if compression is turned on.
 
-    def _send(self, path, method='GET', **kwargs):
-        r = self._session.request(method, '{hostname}/{path}'.format(hostname=self._repository_url, path=path),
-                                  verify=self._verify_ssl,
-                                  **kwargs)
+        :param data: bytes
+        :return: response
+        """
+        if not self._compression or len(data) < compression.MIN_SIZE:
+            return self._send(path, method=method, data=data, headers=headers, **kwargs)
 
-        logger.debug('response: %s', r.text)
-        r.raise_for_status()
+        compressed_headers = dict(headers, **{'Content-Encoding': self._compression})
+        compressed_data = compression.compress(data, self._compression)
 
-        return r
+        import requests
+
+        try:
+            return self._send(path, method=method, data=compressed_data, headers=compressed_headers, **kwargs)
+        except requests.HTTPError as e:
+            if e.response.status_code not in (400, 415):
+                raise
+
+        logger.warning('Server refused %s request body, sending it uncompressed and turning compression off',
+                       self._compression)
+        self._compression = None
+
+        return self._send(path, method=method, data=data, headers=headers, **kwargs)
 
     def _send_json(self, path, json_data=None, method='GET', params=None):
         headers = {'Content-Type': 'application/json', 'accept': 'application/json'}
         if json_data is None:
-            data = None
+            r = self._send(path, headers=headers, method=method, params=params, stream=True)
         else:
-            data = json.dumps(json_data)
-        r = self._send(path, data=data, headers=headers, method=method, params=params)
+            r = self._send_compressible(path, method, json.dumps(json_data).encode('utf-8'), headers, params=params,
+                                        stream=True)
+
+        return self._decode_json(r)
 
-        if r.text:
-            return json.loads(r.text)
+    def _read_json(self, path, params=None):
+        """
+        Like _send_json for GET requests, which can be answered by mirrors, see _read.
+
+        :return: tuple (url of the server or mirror which answered, decoded JSON)
+        """
+        repository_url, r = self._read(path, headers={'Content-Type': 'application/json', 'accept': 'application/json'},
+                                       params=params, stream=True)
+        return repository_url, self._decode_json(r)
+
+    @staticmethod
+    def _get_request_body(f):
+        """
+        :param f: file-like object
+        :return: what requests should send, content in memory is sent as it is instead of being copied by blocks
+        """
+        getbuffer = getattr(f, 'getbuffer', None)
+        return f if getbuffer is None else getbuffer()
+
+    @staticmethod
+    def _decode_json(r):
+        # the response is decompressed while it's being decoded, so its compressed and decompressed bytes aren't kept
+        # in memory together with the text, which matters for big listings
+        try:
+            r.raw.decode_content = True
+            text = codecs.getreader(r.encoding or 'utf-8')(r.raw).read()
+        finally:
+            r.close()
+
+        logger.debug('response: %s', text)
+
+        if text:
+            with span('decode_json'):
+                return json.loads(text)
 
     @staticmethod
     def _first_contains_second(first, second):
@@ -255,13 +1267,373 @@ class NexusRepositoryClient(object):
         return result
 
 
+class NexusRepositoryClient(RepositoryClient):
+    """
+    Class for working with Sonatype Nexus OSS
+    """
+    _status_path = 'service/local/status'
+
+    def __init__(self, repository_url=None, user=None, password=None, verify_ssl=True, compression=None,
+                 replica_urls=None, mirror_urls=None):
+        """
+        :param replica_urls: urls of more servers which publish_artifacts uploads to, with the same credentials. If
+         None, they are taken from environment variable REPOSITORY_REPLICA_URLS, separated by spaces.
+        """
+        super(NexusRepositoryClient, self).__init__(repository_url=repository_url, user=user, password=password,
+                                                    verify_ssl=verify_ssl, compression=compression,
+                                                    mirror_urls=mirror_urls)
+
+        if replica_urls is None:
+            replica_urls = os.environ.get('REPOSITORY_REPLICA_URLS', '').split()
+
+        self._replicas = [NexusRepositoryClient(repository_url=url, user=user, password=password,
+                                                verify_ssl=verify_ssl, compression=compression, replica_urls=(),
+                                                mirror_urls=())
+                          for url in replica_urls]
+        for replica in self._replicas:
+            replica._auth = self._auth
+
+    def publish_artifacts(self, local_artifacts, repo_id, required=PUBLISH_ALL, print_created_artifacts=True,
+                          use_direct_put=False, max_workers=1, verify=VERIFY_EACH, checksum_sidecars=()):
+        """
+        Uploads artifacts to this server and all its replicas at once. Each file is read once and its content is sent
+        to all servers in parallel. A server which fails gets no more artifacts, the others continue as long as the
+        policy can be met.
+
+        :param local_artifacts: list[LocalArtifact]
+        :param repo_id: id of target repository, the same on all servers
+        :param required: which servers have to succeed. PUBLISH_ALL: all of them, PUBLISH_PRIMARY: this one, failures
+         of replicas are only logged, PUBLISH_ANY: at least one
+        :param print_created_artifacts: if True reports what was uploaded and where, see attribute reporter
+        :param max_workers: number of artifacts uploaded in parallel
+        :param use_direct_put, verify, checksum_sidecars: see upload_artifacts
+        :return: PublishResult. Events of uploads to each server have attribute repository_url, see attribute reporter
+        :raise PublishError: if the policy wasn't met
+        """
+        if required not in _PUBLISH_POLICIES:
+            raise ValueError('required has to be one of {policies}'.format(policies=', '.join(_PUBLISH_POLICIES)))
+        if verify not in _VERIFY_MODES:
+            raise ValueError('verify has to be one of {modes}'.format(modes=', '.join(_VERIFY_MODES)))
+
+        local_artifacts = list(local_artifacts)
+        clients = [self] + self._replicas
+        result = PublishResult(client._repository_url for client in clients)
+        uploaded = dict((client._repository_url, [None] * len(local_artifacts)) for client in clients)
+
+        lock = threading.Lock()
+
+        def fail(client, error):
+            logger.warning('Publishing to %s failed: %s', client._repository_url, error)
+            with lock:
+                result.errors.setdefault(client._repository_url, error)
+
+        def publish(item):
+            i, local_artifact = item
+            with lock:
+                targets = [client for client in clients if client._repository_url not in result.errors]
+                if not result.is_acceptable(required):
+                    return
+
+            # None for streams, whose size isn't known in advance
+            size = local_artifact.source.size
+
+            def emit(kind, client, **fields):
+                if self.reporter is not None:
+                    self.reporter.emit(events.Event(kind, local_path=local_artifact.local_path, repo_id=repo_id,
+                                                    size=size, repository_url=client._repository_url, **fields))
+
+            for client in targets:
+                emit(events.UPLOAD_STARTED, client)
+
+            start = time.time()
+            try:
+                outcomes = self._fan_out_artifact(local_artifact, targets, repo_id, use_direct_put=use_direct_put,
+                                                  resolve=verify == VERIFY_EACH, checksum_sidecars=checksum_sidecars)
+            except Exception as e:
+                for client in targets:
+                    emit(events.UPLOAD_FAILED, client, duration=time.time() - start, error=e)
+                raise
+
+            # the content is sent to all servers at once, they share the duration
+            duration = time.time() - start
+            for client, outcome in zip(targets, outcomes):
+                if isinstance(outcome, Exception):
+                    fail(client, outcome)
+                    emit(events.UPLOAD_FAILED, client, duration=duration, error=outcome)
+                else:
+                    uploaded[client._repository_url][i] = outcome
+                    emit(events.UPLOAD_FINISHED, client, duration=duration, url=outcome.url)
+
+        for _ in imap_concurrently(publish, list(enumerate(local_artifacts)), max_workers):
+            pass
+
+        if verify == VERIFY_BATCH:
+            def verify_client(client):
+                try:
+                    client._verify_uploaded([a for a in uploaded[client._repository_url] if a is not None],
+                                            max_workers=DEFAULT_MAX_WORKERS)
+                except Exception as e:
+                    fail(client, e)
+
+            map_concurrently(verify_client, [client for client in clients
+                                             if client._repository_url not in result.errors], len(clients))
+
+        for url in result.repository_urls:
+            result.remote_artifacts[url] = [a for a in uploaded[url] if a is not None]
+
+        if not result.is_acceptable(required):
+            raise PublishError('Publishing to {failed} failed, required {required} of {urls}'.format(
+                failed=', '.join(result.failed), required=required, urls=', '.join(result.repository_urls)), result)
+
+        if print_created_artifacts:
+            for url in result.succeeded:
+                self._report_created_artifacts(result.remote_artifacts[url], repo_id)
+
+        return result
+
+    def _fan_out_artifact(self, local_artifact, clients, repo_id, use_direct_put, resolve, checksum_sidecars):
+        """
+        Uploads one artifact to more servers, reading the file once.
+
+        :return: list with RemoteArtifact or the exception it failed with, for each of clients
+        """
+        def upload(item):
+            client, data, checksums = item
+            try:
+                return client._upload_file(local_artifact, data, 'content/repositories', repo_id,
+                                           use_direct_put=use_direct_put, resolve=resolve, checksums=checksums)
+            except Exception as e:
+                logger.debug('Upload of %s to %s failed', local_artifact.local_path, client._repository_url,
+                             exc_info=True)
+                return e
+            finally:
+                if isinstance(data, _TeeReader):
+                    data.close()
+
+        # multipart bodies need the length in advance
+        with local_artifact.source.open(sized=not use_direct_put) as f:
+            source = _HashingReader.for_source(f, checksum_sidecars, local_artifact.source) if checksum_sidecars else f
+            checksums = source.hexdigests if checksum_sidecars else None
+
+            if len(clients) == 1:
+                return [upload((clients[0], source, checksums))]
+
+            tee = _Tee(source, local_artifact.source.size, len(clients))
+            with BackgroundTask(tee.pump) as task:
+                outcomes = map_concurrently(upload, [(client, reader, checksums)
+                                                     for client, reader in zip(clients, tee.readers)], len(clients))
+                task.result()
+
+        return outcomes
+
+    def resolve_artifact(self, remote_artifact):
+        params = dict(g=remote_artifact.group,
+                      a=remote_artifact.artifact,
+                      v=remote_artifact.version,
+                      r=remote_artifact.repo_id,
+                      c=remote_artifact.classifier,
+                      e=remote_artifact.extension)
+        repository_url, data = self._read_json('service/local/artifact/maven/resolve', params=params)
+        data = data['data']
+
+        remote_artifact.group = data.get('groupId', remote_artifact.group)
+        remote_artifact.artifact = data.get('artifactId', remote_artifact.artifact)
+        remote_artifact.version = data.get('version', remote_artifact.version)
+        remote_artifact.classifier = data.get('classifier', remote_artifact.classifier)
+        remote_artifact.extension = data.get('extension', remote_artifact.extension)
+
+        remote_artifact.url = self.get_content_url(remote_artifact.repo_id, data['repositoryPath'], repository_url)
+
+        remote_artifact.present_locally = data['presentLocally']
+        remote_artifact.snapshot = data['snapshot']
+        remote_artifact.snapshot_buildnumber = data['snapshotBuildNumber']
+        remote_artifact.snapshot_timestamp = data['snapshotTimeStamp']
+        if 'baseVersion' in data:
+            remote_artifact.base_version = data['baseVersion']
+        if 'sha1' in data:
+            remote_artifact.sha1 = data.get('sha1')
+
+    def _get_content_path(self, repo_id, path):
+        return 'content/repositories/{repo_id}/{path}'.format(repo_id=repo_id, path=path.lstrip('/'))
+
+    def list_content(self, repo_id, path=''):
+        """
+        Lists a directory in a repository.
+
+        :param repo_id: id of repository
+        :param path: path of the directory, '' for root
+        :return: list of dicts, each describes one file or directory, important keys are relativePath, leaf (False
+         for directories) and lastModified
+        """
+        path = path.strip('/')
+        if path:
+            path += '/'
+
+        return self._send_json('service/local/repositories/{repo_id}/content/{path}'.format(repo_id=repo_id,
+                                                                                            path=path))['data']
+
+    def _upload_checksum_sidecars(self, remote_path, checksums):
+        """
+        Uploads checksum files next to an uploaded file, all at once.
+
+        :param remote_path: path where the file was uploaded, relative to repository url
+        :param checksums: dict algorithm -> hex digest
+        """
+        def upload(item):
+            algorithm, hexdigest = item
+            self._send('{path}.{algorithm}'.format(path=remote_path, algorithm=algorithm), method='PUT',
+                       headers={'Content-Type': 'text/plain'}, data=hexdigest.encode('ascii'))
+
+        map_concurrently(upload, sorted(checksums.items()), len(checksums))
+
+    def _verify_uploaded(self, remote_artifacts, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Checks that uploaded artifacts are present in repository, by listing each directory containing them once.
+        """
+        by_directory = {}
+        unknown_path = []
+
+        for remote_artifact in remote_artifacts:
+            path = getattr(remote_artifact, 'path', None)
+            if path is None:
+                unknown_path.append(remote_artifact)
+            else:
+                directory = (remote_artifact.repo_id, path.rsplit('/', 1)[0])
+                by_directory.setdefault(directory, []).append(remote_artifact)
+
+        import requests
+
+        def check_directory(item):
+            (repo_id, directory), directory_artifacts = item
+            try:
+                listed = set(entry['relativePath'].lstrip('/') for entry in self.list_content(repo_id, directory))
+            except requests.HTTPError as e:
+                if e.response.status_code != 404:
+                    raise
+                listed = set()
+            return [a for a in directory_artifacts if a.path not in listed]
+
+        missing = sum(map_concurrently(check_directory, list(by_directory.items()), max_workers), [])
+        super(NexusRepositoryClient, self)._verify_uploaded(unknown_path, max_workers)
+        self._raise_if_missing(missing)
+
+    def _upload_artifact(self, local_artifact, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False,
+                         resolve=True, checksum_sidecars=()):
+        # multipart bodies need the length in advance
+        with local_artifact.source.open(sized=not use_direct_put) as f:
+            data, checksums = f, None
+            if checksum_sidecars and use_direct_put:
+                # files hashed in advance, e.g. while a staging repository is created, aren't hashed again
+                cached = local_artifact.source.get_cached_checksums(checksum_sidecars)
+                if cached is not None:
+                    checksums = lambda: cached
+                else:
+                    data = _HashingReader.for_source(f, checksum_sidecars, local_artifact.source)
+                    checksums = data.hexdigests
+
+            return self._upload_file(local_artifact, data, path_prefix, repo_id,
+                                     hostname_for_download=hostname_for_download, use_direct_put=use_direct_put,
+                                     resolve=resolve, checksums=checksums)
+
+    def _upload_file(self, local_artifact, f, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False,
+                     resolve=True, checksums=None):
+        """
+        Uploads content of local_artifact read from f, see _upload_artifact.
+
+        :param f: file-like object with content of the artifact, it has to have a length without use_direct_put
+        :param checksums: with use_direct_put, callable returning dict algorithm -> hex digest of the sent content,
+         which are uploaded as checksum files next to the artifact
+        """
+        filename = os.path.basename(local_artifact.local_path)
+        logger.info('-> Uploading %s to %s', filename, self._repository_url)
+        logger.debug('local artifact: %s', local_artifact)
+
+        # rgavf stands for repo-group-local_artifact-version-filename
+        gavf = '{group}/{name}/{ver}/{filename}'.format(group=local_artifact.group.replace('.', '/'),
+                                                        name=local_artifact.artifact, ver=local_artifact.version,
+                                                        filename=filename)
+        rgavf = '{repo_id}/{gavf}'.format(repo_id=repo_id, gavf=gavf)
+
+        if not use_direct_put:
+            data = {
+                'g':local_artifact.group,
+                'a':local_artifact.artifact,
+                'v':local_artifact.version,
+                'r':repo_id,
+                'e': local_artifact.extension,
+                'p': local_artifact.extension,
+                'c': local_artifact.classifier,
+                'hasPom': 'false'
+            }
+
+
+            from requests_toolbelt import MultipartEncoder
+
+            data_list = list(data.items())
+            data_list.append( ('file', (filename, f, 'text/plain') ))
+
+            # the payload is logged only when it's wanted and the file can be read again
+            if logger.isEnabledFor(logging.DEBUG) and hasattr(f, 'seek'):
+                m_for_logging = MultipartEncoder(fields=data_list)
+                logger.debug('payload: %s', m_for_logging.to_string())
+                f.seek(0)
+
+            m = MultipartEncoder(fields=data_list)
+            headers = {'Content-Type': m.content_type}
+
+            self._send('service/local/artifact/maven/content', method='POST', data=m, headers=headers)
+
+            result = RemoteArtifact(group=local_artifact.group, artifact=local_artifact.artifact,
+                                  version=local_artifact.version, classifier=local_artifact.classifier,
+                                  extension=local_artifact.extension, repo_id=repo_id)
+
+            # Nexus stores releases uploaded by REST API in maven2 layout, names of snapshots contain timestamps
+            if resolve or local_artifact.version.endswith('-SNAPSHOT'):
+                self.resolve_artifact(result)
+            else:
+                result.path = result.get_maven_path()
+                result.url = self.get_content_url(repo_id, result.path)
+
+            return result
+
+        else:
+            headers = {'Content-Type': 'application/x-rpm'}
+            remote_path = '{path_prefix}/{rgavf}'.format(path_prefix=path_prefix, rgavf=rgavf)
+
+            self._send(remote_path, method='PUT', headers=headers, data=self._get_request_body(f))
+
+            if checksums is not None:
+                self._upload_checksum_sidecars(remote_path, checksums())
+
+            # if not specified, use repository url
+            hostname_for_download = hostname_for_download or self._repository_url
+            url = '{hostname}/content/repositories/{rgavf}'.format(hostname=hostname_for_download, rgavf=rgavf)
+
+            if not resolve:
+                result = RemoteArtifact(group=local_artifact.group, artifact=local_artifact.artifact,
+                                        version=local_artifact.version, classifier=local_artifact.classifier,
+                                        extension=local_artifact.extension, url=url, repo_id=repo_id)
+                result.path = gavf
+                return result
+
+            # get classifier and extension from nexus
+            path = 'service/local/repositories/{repo_id}/content/{gavf}?describe=maven2'.format(repo_id=repo_id, gavf=gavf)
+            maven_metadata = self._send_json(path)['data']
+
+            return RemoteArtifact(group=maven_metadata['groupId'], artifact=maven_metadata['artifactId'],
+                                  version=maven_metadata['version'], classifier=maven_metadata.get('classifier', ''),
+                                  extension=maven_metadata.get('extension', ''), url=url, repo_id=repo_id)
+
+
 class NexusProRepositoryClient(NexusRepositoryClient):
     """
     Class for working with Sonatype Nexus Professional
     """
-    def __init__(self, repository_url=None, user=None, password=None, verify_ssl=True, staging_repository_url=None):
+    def __init__(self, repository_url=None, user=None, password=None, verify_ssl=True, staging_repository_url=None,
+                 compression=None, replica_urls=None, mirror_urls=None):
         super(NexusProRepositoryClient, self).__init__(repository_url=repository_url, user=user, password=password,
-                                                       verify_ssl=verify_ssl)
+                                                       verify_ssl=verify_ssl, compression=compression,
+                                                       replica_urls=replica_urls, mirror_urls=mirror_urls)
 
         """
         We redirect users to mirrors, but we don't mirror staging repositories, we when we upload artifacts and populate
@@ -273,53 +1645,205 @@ class NexusProRepositoryClient(NexusRepositoryClient):
         else:
             self._staging_repository_url = os.environ.get('STAGING_REPOSITORY_URL', self._repository_url)
 
-    def upload_artifacts_to_staging(self, local_artifacts, repo_id, print_created_artifacts=True, upload_filelist=False):
+    def upload_artifacts_to_staging(self, local_artifacts, repo_id, print_created_artifacts=True, upload_filelist=False,
+                                    max_workers=1, compress_filelist=False, verify=VERIFY_EACH, journal=None,
+                                    checksum_sidecars=(), _filelist=None):
         """
         :param local_artifacts: list[LocalArtifact]
         :param repo_id: name of staging repository
-        :param print_created_artifacts: if True prints to stdout what was uploaded and where
+        :param print_created_artifacts: if True reports what was uploaded and where, see attribute reporter
         :param staging: bool
         :param upload_filelist: if True, creates and uploads a list of uploaded files
+        :param max_workers: number of artifacts uploaded in parallel
+        :param compress_filelist: if True, the filelist is sent gzipped, the server has to accept Content-Encoding gzip
+        :param verify: see upload_artifacts
+        :param journal: see upload_artifacts
+        :param checksum_sidecars: see upload_artifacts
+        :param _filelist: _Filelist with all artifacts written already, it's uploaded instead of one written during
+         the upload
 
         :return: list[RemoteArtifact]
         """
         hostname_for_download = self._staging_repository_url
         path_prefix = 'service/local/staging/deployByRepositoryId'
 
-        # upload files
-        remote_artifacts = self.upload_artifacts(local_artifacts, repo_id, print_created_artifacts,
-                                                 hostname_for_download, path_prefix, use_direct_put=True)
-
-        # upload filelist
-        if upload_filelist:
-            coord_list = [a.get_coordinates_string() for a in remote_artifacts]
-            data = '\n'.join(coord_list)
-            remote_path = '{path_prefix}/{repo_id}/{filelist_path}'.format(path_prefix=path_prefix, repo_id=repo_id,
-                                                                           filelist_path=self._get_filelist_path(repo_id))
-            self._send(remote_path, method='POST', data=data, headers={'Content-Type': 'text/csv'})
+        # filelist is written as artifacts are uploaded, so memory use doesn't grow with number of artifacts
+        if _filelist is not None:
+            filelist, on_uploaded = _filelist, None
+        else:
+            filelist = _Filelist(compress_filelist) if upload_filelist else None
+            on_uploaded = filelist and filelist.add
+
+        try:
+            # upload files
+            remote_artifacts = self.upload_artifacts(local_artifacts, repo_id, print_created_artifacts,
+                                                     hostname_for_download, path_prefix, use_direct_put=True,
+                                                     max_workers=max_workers,
+                                                     _on_uploaded=on_uploaded, verify=verify,
+                                                     journal=journal, checksum_sidecars=checksum_sidecars)
+
+            # upload filelist
+            if filelist:
+                remote_path = '{path_prefix}/{repo_id}/{filelist_path}'.format(
+                    path_prefix=path_prefix, repo_id=repo_id, filelist_path=self._get_filelist_path(repo_id))
+                headers = {'Content-Type': 'text/csv'}
+
+                if compress_filelist:
+                    headers['Content-Encoding'] = 'gzip'
+
+                with span('upload_filelist'):
+                    self._send(remote_path, method='POST', data=filelist.iter_chunks(), headers=headers)
+        finally:
+            if filelist:
+                filelist.close()
 
         return remote_artifacts
 
     def upload_artifacts_to_new_staging(self, local_artifacts, profile_name, print_created_artifacts=True,
-                                        description='No description', upload_filelist=False):
+                                        description='No description', upload_filelist=False, pipelined=False,
+                                        max_workers=DEFAULT_MAX_WORKERS, compress_filelist=False, verify=VERIFY_EACH,
+                                        checksum_sidecars=()):
         """
         Creates a staging repository in staging profile with name repo_id and uploads local_artifacts there.
 
         :param local_artifacts: list[LocalArtifact]
         :param profile_name: name of staging profile
-        :param print_created_artifacts: if True prints to stdout what was uploaded and where
+        :param print_created_artifacts: if True reports what was uploaded and where, see attribute reporter
         :param description: description of staging repo
         :param upload_filelist: see upload_artifacts_to_staging
+        :param compress_filelist: see upload_artifacts_to_staging
+        :param verify: see upload_artifacts
+        :param checksum_sidecars: see upload_artifacts
+        :param pipelined: if True, local artifacts are checked and hashed for checksum_sidecars and the filelist is
+         written while the staging repository is being created, files are uploaded in parallel (see max_workers) and
+         the staging repository is dropped if anything fails
+        :param max_workers: number of artifacts uploaded in parallel, used only when pipelined is True
 
         :return: list[RemoteArtifact]
         """
-        repo_id = self.create_staging_repo(profile_name, description)
-        remote_artifacts = self.upload_artifacts_to_staging(local_artifacts, repo_id, print_created_artifacts, upload_filelist)
+        with span('upload_artifacts_to_new_staging'):
+            if pipelined:
+                return self._upload_artifacts_to_new_staging_pipelined(local_artifacts, profile_name,
+                                                                       print_created_artifacts, description,
+                                                                       upload_filelist, max_workers, compress_filelist,
+                                                                       verify, checksum_sidecars)
+
+            with span('create_staging_repo'):
+                repo_id = self.create_staging_repo(profile_name, description)
+
+            with span('upload_artifacts_to_staging'):
+                remote_artifacts = self.upload_artifacts_to_staging(local_artifacts, repo_id, print_created_artifacts,
+                                                                    upload_filelist,
+                                                                    compress_filelist=compress_filelist,
+                                                                    verify=verify, checksum_sidecars=checksum_sidecars)
+
+            # close staging repo
+            with span('close_staging_repo'):
+                self.close_staging_repo(repo_id)
+            return remote_artifacts
+
+    def _upload_artifacts_to_new_staging_pipelined(self, local_artifacts, profile_name, print_created_artifacts,
+                                                   description, upload_filelist, max_workers, compress_filelist,
+                                                   verify, checksum_sidecars):
+        local_artifacts = list(local_artifacts)
+        filelist = None
+
+        with BackgroundTask(self.create_staging_repo, profile_name, description) as creation:
+            try:
+                with span('prepare_local_artifacts'):
+                    filelist = self._prepare_local_artifacts(local_artifacts, upload_filelist, compress_filelist,
+                                                             verify, checksum_sidecars, max_workers)
+            except Exception:
+                exc_info = sys.exc_info()
+                # the repo is being created anyway, don't leave it behind
+                try:
+                    self._drop_failed_staging_repo(creation.result(), 'Preparation of local artifacts')
+                except Exception:
+                    logger.exception('Creation of staging repository failed')
+                six.reraise(*exc_info)
+
+            # the repository is created in another thread, this is only the time spent waiting for it
+            try:
+                with span('create_staging_repo'):
+                    repo_id = creation.result()
+            except Exception:
+                if filelist:
+                    filelist.close()
+                raise
+
+        try:
+            with span('upload_artifacts_to_staging'):
+                remote_artifacts = self.upload_artifacts_to_staging(local_artifacts, repo_id, print_created_artifacts,
+                                                                    upload_filelist, max_workers=max_workers,
+                                                                    compress_filelist=compress_filelist,
+                                                                    verify=verify,
+                                                                    checksum_sidecars=checksum_sidecars,
+                                                                    _filelist=filelist)
+            with span('close_staging_repo'):
+                self.close_staging_repo(repo_id)
+        except Exception:
+            exc_info = sys.exc_info()
+            self._drop_failed_staging_repo(repo_id, 'Upload')
+            six.reraise(*exc_info)
 
-        # close staging repo
-        self.close_staging_repo(repo_id)
         return remote_artifacts
 
+    def _prepare_local_artifacts(self, local_artifacts, upload_filelist, compress_filelist, verify, checksum_sidecars,
+                                 max_workers):
+        """
+        Does the local part of an upload to a staging repository in advance, while the repository is being created
+
+        :param max_workers: number of files hashed in parallel
+        :return: _Filelist with all artifacts, if it can be written before they're uploaded, otherwise None
+        """
+        for local_artifact in local_artifacts:
+            self._check_local_artifact(local_artifact)
+
+        if checksum_sidecars:
+            # results are cached, the files are then only sent, not hashed again. Files are hashed by threads, hashlib
+            # releases the GIL, a pool of processes (LocalArtifact.compute_checksums) would be forked while the
+            # repository is being created by another thread, and a child could inherit a lock held by it.
+            files = [local_artifact for local_artifact in local_artifacts
+                     if isinstance(local_artifact.source, FileSource)]
+            map_concurrently(lambda local_artifact: local_artifact.get_checksums(checksum_sidecars), files,
+                             max_workers)
+
+        # without verification coordinates of uploaded artifacts are the local ones, except of snapshots, otherwise
+        # the server tells them during the upload
+        if not upload_filelist or verify == VERIFY_EACH or \
+                any(local_artifact.version.endswith('-SNAPSHOT') for local_artifact in local_artifacts):
+            return None
+
+        filelist = _Filelist(compress_filelist)
+        for local_artifact in local_artifacts:
+            filelist.add(local_artifact)
+        return filelist
+
+    def _drop_failed_staging_repo(self, repo_id, failed_step):
+        """
+        :param failed_step: what failed, e.g. 'Upload', it's logged and put to the description of the dropped repo
+        """
+        logger.error('%s failed, dropping staging repository %s', failed_step, repo_id)
+        try:
+            self.drop_staging_repo(repo_id, description='Dropped after failure: {step}'.format(step=failed_step))
+        except Exception:
+            logger.exception('Unable to drop staging repository %s', repo_id)
+
+    @staticmethod
+    def _check_local_artifact(local_artifact):
+        """
+        Fails early if a local artifact can't be uploaded, so we don't find it out in the middle of an upload.
+        """
+        if not isinstance(local_artifact.source, FileSource):
+            # content in memory or a stream can't be checked without reading it
+            return
+
+        if not os.path.isfile(local_artifact.local_path):
+            raise RepositoryClientError('{path} is not a file'.format(path=local_artifact.local_path))
+
+        if not os.access(local_artifact.local_path, os.R_OK):
+            raise RepositoryClientError('{path} is not readable'.format(path=local_artifact.local_path))
+
     @staticmethod
     def _get_filelist_path(repo_id):
         return '{repo_id}-filelist'.format(repo_id=repo_id)
@@ -334,9 +1858,7 @@ class NexusProRepositoryClient(NexusRepositoryClient):
         :param remote_artifact:
         :return:
         """
-        artifact_id = 'urn:maven/artifact#{coordinates}'.format(coordinates=remote_artifact.get_coordinates_string())
-        logger.debug('artifact_id: %s', artifact_id)
-        artifact_id_encoded = base64.b64encode(artifact_id)
+        artifact_id_encoded = _encode_artifact_urn(remote_artifact.get_coordinates_string())
         metadata_raw = self._send_json('service/local/index/custom_metadata/{repo_id}/{artifact_id_encoded}'.format(
             repo_id=remote_artifact.repo_id, artifact_id_encoded=artifact_id_encoded))
 
@@ -346,12 +1868,24 @@ class NexusProRepositoryClient(NexusRepositoryClient):
             try:
                 metadata[d["key"]] = d["value"]
             except KeyError:
-                raise RepositoryClientError('Malformed artifact metadata. Missing key or value at artifact {atrifact}'.format(
+                raise RepositoryClientError('Malformed artifact metadata. Missing key or value at artifact {artifact}'.format(
                     artifact=remote_artifact
                 ))
 
         return metadata
 
+    def get_artifacts_metadata(self, remote_artifacts, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Gets maven metadata of many artifacts in parallel.
+
+        The same requirements as for get_artifact_metadata have to be met.
+
+        :param remote_artifacts: list[RemoteArtifact]
+        :param max_workers: number of requests sent in parallel
+        :return: list of dicts, in the same order as remote_artifacts
+        """
+        return map_concurrently(self.get_artifact_metadata, remote_artifacts, max_workers)
+
     def set_artifact_metadata(self, remote_artifact, metadata):
         """
         Sets artifact metadata.
@@ -368,36 +1902,94 @@ class NexusProRepositoryClient(NexusRepositoryClient):
         if not isinstance(metadata, dict):
             raise RepositoryClientError('Metadata has to be a dictionary')
 
-        artifact_id = 'urn:maven/artifact#{coordinates}'.format(coordinates=remote_artifact.get_coordinates_string())
-        logger.debug('artifact_id: %s', artifact_id)
-        artifact_id_encoded = base64.b64encode(artifact_id)
+        artifact_id_encoded = _encode_artifact_urn(remote_artifact.get_coordinates_string())
 
         metadata_raw = []
 
-        for key, value in metadata.iteritems():
+        for key, value in six.iteritems(metadata):
             metadata_raw.append({"key": key, "value": value})
 
         return self._send_json('service/local/index/custom_metadata/{repo_id}/{artifact_id_encoded}'.format(
                                repo_id=remote_artifact.repo_id, artifact_id_encoded=artifact_id_encoded), method='POST',
                                json_data={"data": metadata_raw})
 
+    def set_artifacts_metadata(self, artifacts_metadata, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Sets metadata of many artifacts at once.
+
+        Current metadata of all artifacts are fetched in parallel first and only keys whose values differ are sent,
+        artifacts without any change are skipped.
+
+        The same requirements as for get_artifact_metadata have to be met.
+
+        :param artifacts_metadata: iterable of (RemoteArtifact, dict) pairs
+        :param max_workers: number of requests sent in parallel
+        :return: list of RemoteArtifact whose metadata were changed
+        """
+        artifacts_metadata = list(artifacts_metadata)
+
+        for remote_artifact, metadata in artifacts_metadata:
+            if not isinstance(metadata, dict):
+                raise RepositoryClientError('Metadata of {artifact} has to be a dictionary'.format(
+                    artifact=remote_artifact))
+
+        current_metadata = self.get_artifacts_metadata([remote_artifact for remote_artifact, _ in artifacts_metadata],
+                                                       max_workers)
+
+        changes = []
+
+        for (remote_artifact, metadata), current in zip(artifacts_metadata, current_metadata):
+            changed = self._get_changed_metadata(current, metadata)
+
+            if changed:
+                changes.append((remote_artifact, changed))
+            else:
+                logger.debug('metadata of %s are up to date', remote_artifact)
+
+        map_concurrently(lambda pair: self.set_artifact_metadata(*pair), changes, max_workers)
+        logger.info('Metadata changed at %d of %d artifacts', len(changes), len(artifacts_metadata))
+        return [remote_artifact for remote_artifact, _ in changes]
+
+    @staticmethod
+    def _get_changed_metadata(current, wanted):
+        """
+        :param current: dict with metadata stored in repository
+        :param wanted: dict with metadata we want to have there
+        :return: dict with keys from wanted which are missing in current or have a different value
+        """
+        return dict((key, value) for key, value in wanted.items() if key not in current or current[key] != value)
+
     def list_staging_repos(self, filter_dict=None):
         """
 
         :param filter_dict: dictionary with filters, for example {'description':'foo'}
         :return: list of dictionaries, each dict describes one staging repo
         """
-        r = self._send_json('service/local/staging/profile_repositories')
-        data = r['data']
-
-        if not filter_dict:
-            result = data
-        else:
-            result = [d for d in data if self._first_contains_second(d, filter_dict)]
+        result = list(self.iter_staging_repos(filter_dict))
 
         logger.debug('list_staging_repos result: %s', result)
         return result
 
+    def iter_staging_repos(self, filter_dict=None):
+        """
+        Like list_staging_repos, but yields staging repos as they're parsed from the response, so the whole list
+        isn't kept in memory. Stopping the iteration closes the connection.
+
+        :param filter_dict: dictionary with filters, for example {'description':'foo'}
+        :return: generator of dictionaries, each dict describes one staging repo
+        """
+        r = self._send('service/local/staging/profile_repositories', headers={'accept': 'application/json'},
+                       stream=True)
+        try:
+            r.raw.decode_content = True
+            reader = codecs.getreader(r.encoding or 'utf-8')(r.raw)
+
+            for repo in iter_array_items(reader, 'data'):
+                if not filter_dict or self._first_contains_second(repo, filter_dict):
+                    yield repo
+        finally:
+            r.close()
+
     def create_staging_repo(self, profile_name, description):
         """
         Creates a staging repository
@@ -454,6 +2046,110 @@ class NexusProRepositoryClient(NexusRepositoryClient):
         data = {'data': {'stagedRepositoryIds': repo_ids, 'description': description}}
         return self._send_json('service/local/staging/bulk/drop', data, method='POST')
 
+    def get_staging_repo(self, repo_id):
+        """
+        :param repo_id: id of staging repository
+        :return: dict describing the staging repository, important keys are type ('open', 'closed' or 'released'),
+         transitioning and notifications, or None if there is no such repository
+        """
+        import requests
+
+        try:
+            return self._send_json('service/local/staging/repository/{repo_id}'.format(repo_id=repo_id))
+        except requests.HTTPError as e:
+            if e.response.status_code != 404:
+                raise
+            return None
+
+    def wait_for_staging_state(self, repo_ids, state, timeout=600, initial_interval=1.0, max_interval=30.0,
+                               max_workers=DEFAULT_MAX_WORKERS, on_reached=None):
+        """
+        Waits until staging repositories get to a state, e.g. after close_staging_repos or release_staging_repo, which
+        only start the operation. Each round polls only repositories which didn't get there yet, in parallel. The
+        interval between rounds grows from initial_interval to max_interval while nothing changes.
+
+        :param repo_ids: list of ids of staging repositories
+        :param state: 'open', 'closed', 'released' or 'dropped'. Repositories dropped after release count as
+         released, a repository which doesn't exist counts as released or dropped only if it existed earlier in this
+         wait.
+        :param timeout: maximum number of seconds to wait
+        :param initial_interval: seconds between the first rounds of polling
+        :param max_interval: maximum seconds between rounds of polling
+        :param max_workers: number of requests sent in parallel
+        :param on_reached: callable called with repo_id and description of the repository (None if it was dropped)
+         as soon as the repository gets to the state
+        :return: dict repo_id -> description of the repository, None for dropped repositories
+        :raise StagingStateError: if a repository fails to get to the state, e.g. closing failed, or timeout expires
+        """
+        if state not in _STAGING_STATES:
+            raise ValueError('state has to be one of {states}'.format(states=', '.join(_STAGING_STATES)))
+
+        pending = list(repo_ids)
+        result = {}
+        # repositories which existed in some round, their disappearance means they were dropped
+        seen = set()
+        deadline = time.time() + timeout
+        interval = initial_interval
+
+        while True:
+            changed = False
+
+            for repo_id, data in zip(pending, map_concurrently(self.get_staging_repo, pending, max_workers)):
+                if not self._has_staging_state(repo_id, data, state, repo_id in seen):
+                    if data is not None:
+                        seen.add(repo_id)
+                    continue
+
+                logger.info('Staging repository %s is %s', repo_id, state)
+                result[repo_id] = data
+                changed = True
+
+                if on_reached:
+                    on_reached(repo_id, data)
+
+            pending = [repo_id for repo_id in pending if repo_id not in result]
+
+            if not pending:
+                return result
+
+            if time.time() + interval > deadline:
+                raise StagingStateError('Staging repositories {repo_ids} are not {state} after {timeout} s'.format(
+                    repo_ids=', '.join(pending), state=state, timeout=timeout))
+
+            interval = initial_interval if changed else min(interval * 1.5, max_interval)
+            time.sleep(interval)
+
+    @staticmethod
+    def _has_staging_state(repo_id, data, state, seen):
+        """
+        :param data: description of the repository, None if it doesn't exist
+        :param seen: True if the repository existed earlier in the wait
+        :return: True if the repository is in the state, False if it can still get there
+        :raise StagingStateError: if the repository can't get to the state anymore
+        """
+        if data is None:
+            # otherwise a typo in repo_id would look like a dropped repository
+            if seen and state in ('released', 'dropped'):
+                return True
+            raise StagingStateError('Staging repository {repo_id} does not exist'.format(repo_id=repo_id))
+
+        if data.get('transitioning'):
+            return False
+
+        if data['type'] == state:
+            return True
+
+        # Nexus reverts a repository whose close failed to open and reports why in notifications
+        if data['type'] == 'open' and data.get('notifications'):
+            raise StagingStateError('Staging repository {repo_id} failed to become {state}, see its activity in '
+                                    'Nexus'.format(repo_id=repo_id, state=state))
+
+        if _STAGING_STATES.index(data['type']) > _STAGING_STATES.index(state):
+            raise StagingStateError('Staging repository {repo_id} is already {type}'.format(repo_id=repo_id,
+                                                                                            type=data['type']))
+
+        return False
+
     def release_staging_repo(self, repo_id, description='No description', auto_drop_after_release=True,
                              keep_metadata=False):
         """
@@ -467,30 +2163,41 @@ class NexusProRepositoryClient(NexusRepositoryClient):
          can't do keep the metadata after release, so we manually read the metadata, release and then set them again.
         :return:
         """
-        if keep_metadata:
-            # download list of artifacts
-            resp = self._send('content/repositories/{repo_id}/{filelist_path}'.format(repo_id=repo_id,
-                                                                                      filelist_path=self._get_filelist_path(repo_id)))
+        with span('release_staging_repo'):
+            if keep_metadata:
+                # download list of artifacts
+                with span('read_filelist'):
+                    resp = self._send('content/repositories/{repo_id}/{filelist_path}'.format(
+                        repo_id=repo_id, filelist_path=self._get_filelist_path(repo_id)))
 
-            artifacts = [RemoteArtifact.from_repo_id_and_coordinates(repo_id, coordinates=coords)
-                        for coords in resp.text.split('\n')]
+                    content = resp.content
+                    if content.startswith(_Filelist.GZIP_MAGIC):
+                        content = gzip.GzipFile(fileobj=six.BytesIO(content)).read()
 
-            # download metadata for all files
-            for artifact in artifacts:
-                artifact.metadata = self.get_artifact_metadata(artifact)
+                    artifacts = [RemoteArtifact.from_repo_id_and_coordinates(repo_id, coordinates=coords)
+                                 for coords in content.decode('utf-8').split('\n')]
 
-            release_repo_id = self._get_target_repository(repo_id)
+                # download metadata for all files
+                with span('get_artifacts_metadata'):
+                    for artifact, metadata in zip(artifacts, self.get_artifacts_metadata(artifacts)):
+                        artifact.metadata = metadata
 
-        data = {'data': {'stagedRepositoryIds': [repo_id], 'description': description,
-                         'autoDropAfterRelease': auto_drop_after_release}}
-        result = self._send_json('service/local/staging/bulk/promote', data, method='POST')
+                    release_repo_id = self._get_target_repository(repo_id)
 
-        if keep_metadata:
-            for artifact in artifacts:
-                artifact.repo_id = release_repo_id
-                self.set_artifact_metadata(artifact, artifact.metadata)
+            data = {'data': {'stagedRepositoryIds': [repo_id], 'description': description,
+                             'autoDropAfterRelease': auto_drop_after_release}}
+            with span('promote'):
+                result = self._send_json('service/local/staging/bulk/promote', data, method='POST')
 
-        return result
+            if keep_metadata:
+                for artifact in artifacts:
+                    artifact.repo_id = release_repo_id
+
+                with span('set_artifacts_metadata'):
+                    map_concurrently(lambda artifact: self.set_artifact_metadata(artifact, artifact.metadata),
+                                     artifacts)
+
+            return result
 
     def _get_staging_profile(self, name):
         staging_profiles = self._send_json('service/local/staging/profiles')
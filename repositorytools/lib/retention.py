@@ -0,0 +1,254 @@
+"""
+Computing and executing cleanup of old artifacts and staging repositories
+"""
+
+__all__ = ['RetentionRule', 'CleanupPlan', 'plan_artifacts_cleanup', 'plan_staging_cleanup']
+
+import calendar
+import datetime
+import fnmatch
+import logging
+import time
+
+from repositorytools.lib.concurrency import map_concurrently, DEFAULT_MAX_WORKERS
+from repositorytools.lib.version import sort_versions
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# files which servers keep next to an artifact, deleted together with it
+SIDECAR_EXTENSIONS = ('.md5', '.sha1', '.sha256', '.sha512', '.asc')
+
+
+class RetentionRule(object):
+    """
+    Describes which items may be deleted. An item is deleted only if it matches the pattern, is not among keep_last
+    newest items and is older than older_than_days. Conditions which are None are not checked.
+    """
+    def __init__(self, pattern='*', keep_last=None, older_than_days=None):
+        """
+        :param pattern: shell-style pattern, matched against group:artifact:version of artifacts or repositoryId of
+         staging repositories
+        :param keep_last: number of newest versions (or staging repositories of a profile) which are always kept
+        :param older_than_days: only items older than this are deleted
+        """
+        self.pattern = pattern
+        self.keep_last = keep_last
+        self.older_than_days = older_than_days
+
+    def matches(self, text):
+        return fnmatch.fnmatchcase(text, self.pattern)
+
+    def is_old(self, timestamp, now):
+        if self.older_than_days is None:
+            return True
+
+        # when we don't know age of an item, we rather keep it
+        if timestamp is None:
+            return False
+
+        return now - timestamp > self.older_than_days * SECONDS_PER_DAY
+
+    def __repr__(self):
+        return 'RetentionRule(pattern={pattern!r}, keep_last={keep_last!r}, older_than_days={days!r})'.format(
+            pattern=self.pattern, keep_last=self.keep_last, days=self.older_than_days)
+
+
+class CleanupPlan(object):
+    """
+    Artifacts and staging repositories chosen for deletion
+    """
+    def __init__(self, artifacts=None, staging_repos=None, directories=None):
+        """
+        :param artifacts: list[RemoteArtifact] to be deleted
+        :param staging_repos: list of dicts describing staging repositories to be dropped, see list_staging_repos
+        :param directories: urls of version directories, ending with /, which contain only artifacts to be deleted.
+         They're deleted as a whole, including checksums and maven-metadata.xml, other artifacts are deleted one by
+         one together with their checksums and signatures.
+        """
+        self.artifacts = artifacts or []
+        self.staging_repos = staging_repos or []
+        self.directories = directories or []
+
+    def _get_loose_artifacts(self):
+        """
+        :return: artifacts which aren't deleted by deleting of their directory
+        """
+        directories = set(self.directories)
+        return [artifact for artifact in self.artifacts if _get_directory(artifact.url) not in directories]
+
+    def describe(self):
+        """
+        :return: list of lines describing what would be deleted, for a dry run
+        """
+        lines = ['delete {url}'.format(url=directory) for directory in self.directories]
+        lines.extend('delete {url}'.format(url=artifact.url) for artifact in self._get_loose_artifacts())
+        lines.extend('drop {repo_id}'.format(repo_id=repo['repositoryId']) for repo in self.staging_repos)
+        return lines
+
+    def execute(self, client, max_workers=DEFAULT_MAX_WORKERS, batch_size=50,
+                description='Dropped by retention policy'):
+        """
+        Deletes artifacts and drops staging repositories in the plan.
+
+        :param client: NexusProRepositoryClient
+        :param max_workers: number of requests sent in parallel
+        :param batch_size: number of staging repositories dropped by one request
+        :param description: description of the drop
+        :return:
+        """
+        if self.directories:
+            logger.info('Deleting %d version directories', len(self.directories))
+            client.delete_artifacts(self.directories, max_workers)
+
+        loose_artifacts = self._get_loose_artifacts()
+        if loose_artifacts:
+            logger.info('Deleting %d artifacts', len(loose_artifacts))
+            client.delete_artifacts([artifact.url for artifact in loose_artifacts], max_workers)
+            # not every artifact has all of them
+            client.delete_artifacts([artifact.url + extension for artifact in loose_artifacts
+                                     for extension in SIDECAR_EXTENSIONS], max_workers, missing_ok=True)
+
+        if self.staging_repos:
+            logger.info('Dropping %d staging repositories', len(self.staging_repos))
+            repo_ids = [repo['repositoryId'] for repo in self.staging_repos]
+            batches = [repo_ids[i:i + batch_size] for i in range(0, len(repo_ids), batch_size)]
+            map_concurrently(lambda batch: client.drop_staging_repos(batch, description), batches, max_workers)
+
+
+def _get_directory(url):
+    return url.rsplit('/', 1)[0] + '/'
+
+
+def _first_matching_rule(rules, text):
+    for rule in rules:
+        if rule.matches(text):
+            return rule
+    return None
+
+
+def _parse_last_modified(text):
+    """
+    :param text: lastModified from a content listing, e.g. 2017-07-13 10:03:11.0 UTC
+    :return: unix timestamp or None
+    """
+    if not text:
+        return None
+
+    try:
+        return calendar.timegm(datetime.datetime.strptime(text[:19], '%Y-%m-%d %H:%M:%S').timetuple())
+    except ValueError:
+        logger.warning('Unable to parse time %s', text)
+        return None
+
+
+def plan_artifacts_cleanup(remote_artifacts, rules, scheme='maven', now=None, whole_directories=False):
+    """
+    Chooses artifacts for deletion. Artifacts are grouped by group and artifact and versions are ordered by version
+    numbers, all files of a chosen version are deleted. For each artifact, the first rule with matching pattern is used,
+    artifacts not matching any rule are kept. Checksums and signatures of deleted artifacts are deleted too.
+
+    :param remote_artifacts: list[RemoteArtifact] with attribute last_modified, e.g. from RepositoryIndex.search
+    :param rules: RetentionRule or list of them
+    :param scheme: how versions are ordered, see repositorytools.lib.version
+    :param now: current unix time, for tests
+    :param whole_directories: if True, directories in which all artifacts are chosen are deleted as a whole, with
+     maven-metadata.xml and other files which aren't artifacts. This is the case of release versions, but not of
+     snapshot builds, which share their directory. Use it only if remote_artifacts are all artifacts of the
+     repository, otherwise artifacts not given would be deleted too.
+    :return: CleanupPlan
+    """
+    if isinstance(rules, RetentionRule):
+        rules = [rules]
+    now = now or time.time()
+    remote_artifacts = list(remote_artifacts)
+
+    # (group, artifact) -> version -> files
+    versions = {}
+    for remote_artifact in remote_artifacts:
+        versions.setdefault((remote_artifact.group, remote_artifact.artifact), {}).setdefault(
+            remote_artifact.version, []).append(remote_artifact)
+
+    result = []
+
+    for (group, artifact), files_by_version in sorted(versions.items()):
+        newest_first = sort_versions(files_by_version, scheme, reverse=True)
+        kept = 0
+
+        for version in newest_first:
+            rule = _first_matching_rule(rules, '{group}:{artifact}:{version}'.format(group=group, artifact=artifact,
+                                                                                     version=version))
+            if rule is None:
+                continue
+
+            files = files_by_version[version]
+
+            if rule.keep_last is not None and kept < rule.keep_last:
+                kept += 1
+                continue
+
+            timestamps = [_parse_last_modified(getattr(f, 'last_modified', None)) for f in files]
+            timestamp = None if None in timestamps else max(timestamps)
+
+            if rule.is_old(timestamp, now):
+                result.extend(files)
+
+    if not whole_directories:
+        return CleanupPlan(artifacts=result)
+
+    # directory -> number of artifacts in it
+    counts = {}
+    for remote_artifact in remote_artifacts:
+        directory = _get_directory(remote_artifact.url)
+        counts[directory] = counts.get(directory, 0) + 1
+
+    chosen = {}
+    for remote_artifact in result:
+        directory = _get_directory(remote_artifact.url)
+        chosen[directory] = chosen.get(directory, 0) + 1
+
+    directories = sorted(directory for directory, count in chosen.items() if count == counts[directory])
+    return CleanupPlan(artifacts=result, directories=directories)
+
+
+def plan_staging_cleanup(staging_repos, rules, now=None):
+    """
+    Chooses staging repositories for dropping. Repositories are grouped by staging profile and ordered by creation
+    time. For each repository, the first rule with matching pattern is used, repositories not matching any rule are
+    kept.
+
+    :param staging_repos: list of dicts, see list_staging_repos
+    :param rules: RetentionRule or list of them
+    :param now: current unix time, for tests
+    :return: CleanupPlan
+    """
+    if isinstance(rules, RetentionRule):
+        rules = [rules]
+    now = now or time.time()
+
+    by_profile = {}
+    for repo in staging_repos:
+        by_profile.setdefault(repo.get('profileName'), []).append(repo)
+
+    result = []
+
+    # repositories may have no profile name
+    for profile_name, repos in sorted(by_profile.items(), key=lambda item: item[0] or ''):
+        newest_first = sorted(repos, key=lambda repo: repo.get('createdTimestamp', 0), reverse=True)
+        kept = 0
+
+        for repo in newest_first:
+            rule = _first_matching_rule(rules, repo['repositoryId'])
+            if rule is None:
+                continue
+
+            if rule.keep_last is not None and kept < rule.keep_last:
+                kept += 1
+                continue
+
+            timestamp = repo.get('updatedTimestamp', repo.get('createdTimestamp'))
+            if rule.is_old(timestamp and timestamp / 1000.0, now):
+                result.append(repo)
+
+    return CleanupPlan(staging_repos=result)
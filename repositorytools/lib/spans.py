@@ -0,0 +1,126 @@
+"""
+Timing of phases of repository operations
+
+Code wraps its phases in span(name). Nothing is measured unless a SpanRecorder is recording, so spans cost almost
+nothing in normal runs. Spans opened inside another span of the same thread are nested in the summary.
+"""
+
+__all__ = ['span', 'SpanRecorder']
+
+import contextlib
+import threading
+import timeit
+
+_local = threading.local()
+_recorders = []
+_recorders_lock = threading.Lock()
+
+
+class _Stats(object):
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.calls += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+
+class SpanRecorder(object):
+    """
+    Collects durations of spans, from all threads, while it's used as a context manager
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # path of names -> _Stats, in order in which spans were first entered
+        self._stats = {}
+        self._order = []
+
+    def __enter__(self):
+        with _recorders_lock:
+            _recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with _recorders_lock:
+            _recorders.remove(self)
+
+    def enter(self, path):
+        """
+        :param path: tuple of names of the span and the spans it is nested in, outermost first
+        """
+        with self._lock:
+            if path not in self._stats:
+                self._stats[path] = _Stats()
+                self._order.append(path)
+
+    def record(self, path, duration):
+        """
+        :param path: see enter, which has to be called first
+        :param duration: seconds
+        """
+        with self._lock:
+            self._stats[path].add(duration)
+
+    def get_summary(self):
+        """
+        :return: list of (path, calls, total seconds, max seconds), nested spans follow their parents
+        """
+        with self._lock:
+            # spans which haven't finished yet are left out
+            order = [path for path in self._order if self._stats[path].calls]
+            result = dict((path, (stats.calls, stats.total, stats.max)) for path, stats in self._stats.items())
+
+        # a parent is always entered before its children, so sorting by first entry of each ancestor groups them
+        position = dict((path, i) for i, path in enumerate(order))
+        key = lambda path: [position.get(path[:i], -1) for i in range(1, len(path) + 1)]
+        return [(path,) + result[path] for path in sorted(order, key=key)]
+
+    def format_summary(self):
+        """
+        :return: the summary as a table, one line per span, names of nested spans are indented
+        """
+        rows = [('{indent}{name}'.format(indent='  ' * (len(path) - 1), name=path[-1]), str(calls),
+                 '{0:.3f}'.format(total), '{0:.3f}'.format(total / calls), '{0:.3f}'.format(max_))
+                for path, calls, total, max_ in self.get_summary()]
+        header = ('span', 'calls', 'total s', 'mean s', 'max s')
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+
+        lines = []
+        for row in [header] + rows:
+            cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            lines.append('  '.join(cells).rstrip())
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Times the code in the with block, if a SpanRecorder is recording.
+
+    :param name: name of the phase, e.g. 'create_staging_repo'
+    """
+    recorders = list(_recorders)
+    if not recorders:
+        yield
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    stack.append(name)
+    path = tuple(stack)
+    for recorder in recorders:
+        recorder.enter(path)
+
+    start = timeit.default_timer()
+    try:
+        yield
+    finally:
+        duration = timeit.default_timer() - start
+        stack.pop()
+        for recorder in recorders:
+            recorder.record(path, duration)
@@ -0,0 +1,430 @@
+"""
+Comparing versions of artifacts
+
+Two schemes are supported:
+
+- maven: semantics of Maven's ComparableVersion, e.g. 1.0-alpha-1 < 1.0-beta < 1.0-rc1 < 1.0 < 1.0-sp1 < 1.0.1
+- rpm: semantics of rpmvercmp for [epoch:]version[-release], e.g. 1.0~rc1-1 < 1.0-1 < 1.0-1.el6 < 1.0a-1
+
+Parsed versions are cached, so sorting long lists of versions or checking them against ranges repeatedly is cheap.
+"""
+
+__all__ = ['VersionError', 'VersionRange', 'version_key', 'compare_versions', 'sort_versions', 'latest_version']
+
+import functools
+import re
+
+
+class VersionError(Exception):
+    pass
+
+
+# --- maven ---
+
+_QUALIFIERS = ['alpha', 'beta', 'milestone', 'rc', 'snapshot', '', 'sp']
+_QUALIFIER_ALIASES = {'ga': '', 'final': '', 'release': '', 'cr': 'rc'}
+_RELEASE_QUALIFIER = str(_QUALIFIERS.index(''))
+
+
+def _comparable_qualifier(qualifier):
+    try:
+        return str(_QUALIFIERS.index(qualifier))
+    except ValueError:
+        # unknown qualifiers are newer than known ones and sorted alphabetically
+        return '{count}-{qualifier}'.format(count=len(_QUALIFIERS), qualifier=qualifier)
+
+
+def _cmp(a, b):
+    return (a > b) - (a < b)
+
+
+class _IntItem(object):
+    def __init__(self, value):
+        self.value = value
+
+    def is_null(self):
+        return self.value == 0
+
+    def compare(self, other):
+        if other is None:
+            return 0 if self.value == 0 else 1
+        if isinstance(other, _IntItem):
+            return _cmp(self.value, other.value)
+        return 1
+
+
+class _StringItem(object):
+    def __init__(self, value, followed_by_digit):
+        if followed_by_digit and len(value) == 1:
+            value = {'a': 'alpha', 'b': 'beta', 'm': 'milestone'}.get(value, value)
+        value = _QUALIFIER_ALIASES.get(value, value)
+        self.value = _comparable_qualifier(value)
+
+    def is_null(self):
+        return self.value == _RELEASE_QUALIFIER
+
+    def compare(self, other):
+        if other is None:
+            return _cmp(self.value, _RELEASE_QUALIFIER)
+        if isinstance(other, _StringItem):
+            return _cmp(self.value, other.value)
+        return -1
+
+
+class _ListItem(list):
+    def is_null(self):
+        return len(self) == 0
+
+    def normalize(self):
+        for i in range(len(self) - 1, -1, -1):
+            if self[i].is_null():
+                del self[i]
+            elif not isinstance(self[i], _ListItem):
+                break
+
+    def compare(self, other):
+        if other is None:
+            return 0 if not self else self[0].compare(None)
+        if isinstance(other, _IntItem):
+            return -1
+        if isinstance(other, _StringItem):
+            return 1
+
+        for i in range(max(len(self), len(other))):
+            left = self[i] if i < len(self) else None
+            right = other[i] if i < len(other) else None
+
+            if left is None:
+                result = 0 if right is None else -right.compare(None)
+            else:
+                result = left.compare(right)
+
+            if result:
+                return result
+
+        return 0
+
+
+def _parse_item(is_digit, text, followed_by_digit=False):
+    if is_digit:
+        return _IntItem(int(text))
+    return _StringItem(text, followed_by_digit)
+
+
+def _parse_maven_version(version):
+    version = version.lower()
+    items = current = _ListItem()
+    stack = [current]
+    start = 0
+    is_digit = False
+
+    for i, c in enumerate(version):
+        if c in '.-':
+            current.append(_IntItem(0) if i == start else _parse_item(is_digit, version[start:i]))
+            start = i + 1
+
+            if c == '-':
+                current.append(_ListItem())
+                current = current[-1]
+                stack.append(current)
+        elif c.isdigit():
+            if not is_digit and i > start:
+                current.append(_parse_item(False, version[start:i], followed_by_digit=True))
+                start = i
+                current.append(_ListItem())
+                current = current[-1]
+                stack.append(current)
+            is_digit = True
+        else:
+            if is_digit and i > start:
+                current.append(_parse_item(True, version[start:i]))
+                start = i
+                current.append(_ListItem())
+                current = current[-1]
+                stack.append(current)
+            is_digit = False
+
+    if len(version) > start:
+        current.append(_parse_item(is_digit, version[start:]))
+
+    while stack:
+        stack.pop().normalize()
+
+    return items
+
+
+# --- rpm ---
+
+def rpmvercmp(a, b):
+    """
+    Compares two version or release strings the same way as rpm does.
+
+    :return: -1, 0 or 1
+    """
+    if a == b:
+        return 0
+
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while i < len(a) and not a[i].isalnum() and a[i] not in '~^':
+            i += 1
+        while j < len(b) and not b[j].isalnum() and b[j] not in '~^':
+            j += 1
+
+        # tilde sorts before everything else, even the end of the string
+        a_tilde, b_tilde = i < len(a) and a[i] == '~', j < len(b) and b[j] == '~'
+        if a_tilde or b_tilde:
+            if not a_tilde:
+                return 1
+            if not b_tilde:
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        # caret sorts after the end of the string, but before everything else
+        a_caret, b_caret = i < len(a) and a[i] == '^', j < len(b) and b[j] == '^'
+        if a_caret or b_caret:
+            if i >= len(a):
+                return -1
+            if j >= len(b):
+                return 1
+            if not a_caret:
+                return 1
+            if not b_caret:
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        if i >= len(a) or j >= len(b):
+            break
+
+        is_num = a[i].isdigit()
+        in_segment = (lambda c: c.isdigit()) if is_num else (lambda c: c.isalpha())
+
+        i_end, j_end = i, j
+        while i_end < len(a) and in_segment(a[i_end]):
+            i_end += 1
+        while j_end < len(b) and in_segment(b[j_end]):
+            j_end += 1
+
+        one, two = a[i:i_end], b[j:j_end]
+        i, j = i_end, j_end
+
+        # segments of different types, numeric is newer
+        if not two:
+            return 1 if is_num else -1
+
+        if is_num:
+            one, two = one.lstrip('0'), two.lstrip('0')
+            result = _cmp(len(one), len(two)) or _cmp(one, two)
+        else:
+            result = _cmp(one, two)
+
+        if result:
+            return result
+
+    if i >= len(a) and j >= len(b):
+        return 0
+
+    return -1 if i >= len(a) else 1
+
+
+def _parse_rpm_version(version):
+    epoch = 0
+    if ':' in version:
+        epoch_text, version = version.split(':', 1)
+        epoch = int(epoch_text or 0)
+
+    if '-' in version:
+        version, release = version.rsplit('-', 1)
+    else:
+        release = None
+
+    return epoch, version, release
+
+
+def _compare_rpm_parsed(a, b):
+    result = _cmp(a[0], b[0]) or rpmvercmp(a[1], b[1])
+
+    # missing release matches any release, like in rpm dependencies
+    if result or a[2] is None or b[2] is None:
+        return result
+
+    return rpmvercmp(a[2], b[2])
+
+
+# --- common ---
+
+@functools.total_ordering
+class _VersionKey(object):
+    """
+    Parsed version, instances can be compared with each other
+    """
+    __slots__ = ('version', '_parsed', '_compare')
+
+    def __init__(self, version, parsed, compare):
+        self.version = version
+        self._parsed = parsed
+        self._compare = compare
+
+    def __eq__(self, other):
+        return self._compare(self._parsed, other._parsed) == 0
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return self._compare(self._parsed, other._parsed) < 0
+
+    # equal versions can have different strings, e.g. 1.0 and 1
+    __hash__ = None
+
+    def __repr__(self):
+        return '_VersionKey({version!r})'.format(version=self.version)
+
+
+_SCHEMES = {
+    'maven': (_parse_maven_version, lambda a, b: a.compare(b)),
+    'rpm': (_parse_rpm_version, _compare_rpm_parsed),
+}
+
+_KEY_CACHE_SIZE = 100000
+_key_cache = {}
+
+
+def version_key(version, scheme='maven'):
+    """
+    :param version: version string, e.g. 1.2.10
+    :param scheme: 'maven' or 'rpm'
+    :return: key for sorting and comparing versions
+    """
+    try:
+        return _key_cache[scheme, version]
+    except KeyError:
+        pass
+
+    try:
+        parse, compare = _SCHEMES[scheme]
+    except KeyError:
+        raise VersionError('Unknown version scheme {scheme}'.format(scheme=scheme))
+
+    result = _VersionKey(version, parse(version), compare)
+
+    if len(_key_cache) >= _KEY_CACHE_SIZE:
+        _key_cache.clear()
+
+    _key_cache[scheme, version] = result
+    return result
+
+
+def compare_versions(a, b, scheme='maven'):
+    """
+    :return: negative number if a is older than b, 0 if they are equal, positive number if a is newer
+    """
+    key_a, key_b = version_key(a, scheme), version_key(b, scheme)
+    return _cmp(key_a, key_b)
+
+
+def sort_versions(versions, scheme='maven', reverse=False):
+    """
+    :return: new list of versions, sorted from the oldest
+    """
+    return sorted(versions, key=lambda version: version_key(version, scheme), reverse=reverse)
+
+
+def latest_version(versions, version_range=None, scheme='maven', include_snapshots=False):
+    """
+    Picks the newest version.
+
+    :param versions: iterable of version strings
+    :param version_range: VersionRange or a string with range, None for any version
+    :param scheme: 'maven' or 'rpm'
+    :param include_snapshots: if False, versions ending with -SNAPSHOT are skipped
+    :return: the newest version or None if no version matches
+    """
+    if version_range is not None and not isinstance(version_range, VersionRange):
+        version_range = VersionRange(version_range, scheme)
+
+    result = None
+    result_key = None
+
+    for version in versions:
+        if not include_snapshots and version.endswith('-SNAPSHOT'):
+            continue
+        if version_range is not None and version not in version_range:
+            continue
+
+        key = version_key(version, scheme)
+        if result_key is None or key > result_key:
+            result, result_key = version, key
+
+    return result
+
+
+_RANGE_RE = re.compile(r'([\[(])([^,\])]*)(?:(,)([^\])]*))?([\])])')
+
+
+class VersionRange(object):
+    """
+    Maven version range, e.g. [1.2,2.0), (,1.0], [1.5] or union of more ranges [1,2),[3,4). A version without
+    brackets matches only itself.
+    """
+    def __init__(self, spec, scheme='maven'):
+        self.spec = spec
+        self.scheme = scheme
+        self._restrictions = []
+
+        spec = spec.replace(' ', '')
+
+        if not spec:
+            raise VersionError('Empty version range')
+
+        if spec.startswith(('[', '(')):
+            self._parse_restrictions(spec)
+        else:
+            self._restrictions.append((spec, True, spec, True))
+
+        # precompute keys of bounds
+        self._restrictions = [(lower and version_key(lower, scheme), lower_inclusive,
+                               upper and version_key(upper, scheme), upper_inclusive)
+                              for lower, lower_inclusive, upper, upper_inclusive in self._restrictions]
+
+    def _parse_restrictions(self, spec):
+        position = 0
+
+        while position < len(spec):
+            match = _RANGE_RE.match(spec, position)
+            if not match:
+                raise VersionError('Malformed version range {spec}'.format(spec=self.spec))
+
+            opening, lower, comma, upper, closing = match.groups()
+
+            if not comma:
+                if opening != '[' or closing != ']' or not lower:
+                    raise VersionError('Malformed version range {spec}'.format(spec=self.spec))
+                upper = lower
+
+            self._restrictions.append((lower or None, opening == '[', upper or None, closing == ']'))
+            position = match.end()
+
+            if position < len(spec):
+                if spec[position] != ',':
+                    raise VersionError('Malformed version range {spec}'.format(spec=self.spec))
+                position += 1
+
+    def __contains__(self, version):
+        key = version_key(version, self.scheme)
+
+        for lower, lower_inclusive, upper, upper_inclusive in self._restrictions:
+            if lower is not None and (key < lower or (key == lower and not lower_inclusive)):
+                continue
+            if upper is not None and (key > upper or (key == upper and not upper_inclusive)):
+                continue
+            return True
+
+        return False
+
+    def __repr__(self):
+        return 'VersionRange({spec!r})'.format(spec=self.spec)
@@ -0,0 +1,62 @@
+import os
+import unittest
+
+import six
+
+import repositorytools
+from repositorytools.cli.commands import artifact
+
+
+class TestSetMetadataBulk(unittest.TestCase):
+    def test_csv(self):
+        f = six.StringIO('coordinates,repo_id,build,branch\n'
+                         'com.fooware:foo:1.0,,1,\n'
+                         'com.fooware:bar:1.0,snapshots,2\n')
+        result = artifact.read_artifacts_metadata(f, 'releases', 'csv')
+
+        self.assertEqual(['releases', 'snapshots'], [a.repo_id for a, _ in result])
+        # empty values are kept, missing columns are skipped
+        self.assertEqual([{'build': '1', 'branch': ''}, {'build': '2'}], [metadata for _, metadata in result])
+
+    def test_detect_format(self):
+        self.assertEqual('jsonl', artifact._detect_metadata_file_format('-'))
+        self.assertEqual('csv', artifact._detect_metadata_file_format('metadata.CSV'))
+        self.assertRaises(ValueError, artifact._detect_metadata_file_format, 'metadata.txt')
+
+
+class TestCopy(unittest.TestCase):
+    def setUp(self):
+        self.environ = dict(os.environ)
+        os.environ.update({'REPOSITORY_USER': 'admin', 'REPOSITORY_PASSWORD': 'secret',
+                           'REPOSITORY_MIRROR_URLS': 'http://mirror'})
+        os.environ.pop('SOURCE_REPOSITORY_PASSWORD', None)
+        self.factory = repositorytools.repository_client_factory
+        self.created = []
+
+        def factory(**kwargs):
+            self.created.append(kwargs)
+            raise StopIteration
+
+        repositorytools.repository_client_factory = factory
+        self.cli = artifact.ArtifactCLI()
+
+    def tearDown(self):
+        repositorytools.repository_client_factory = self.factory
+        os.environ.clear()
+        os.environ.update(self.environ)
+
+    def _copy(self, *args):
+        return self.cli.copy(self.cli.parser.parse_args(['copy'] + list(args) + ['releases', 'releases', 'a:b:1']))
+
+    def test_source_is_anonymous_without_user(self):
+        self.assertRaises(StopIteration, self._copy, '--source-url', 'http://other')
+        self.assertEqual([{'repository_url': 'http://other', 'user': '', 'password': None, 'mirror_urls': (),
+                           'replica_urls': ()}], self.created)
+
+    def test_source_user_requires_password(self):
+        self.assertRaises(ValueError, self._copy, '--source-url', 'http://other', '--source-user', 'reader')
+        self.assertEqual([], self.created)
+
+    def test_anonymous_client(self):
+        client = repositorytools.NexusRepositoryClient(repository_url='http://other', user='', mirror_urls=())
+        self.assertEqual(None, client._auth)
@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
+import six
+
 from repositorytools.cli.common import CLI
 
 
@@ -11,12 +19,18 @@ class MyCli(CLI):
         subparsers = parser.add_subparsers()
         subparser = subparsers.add_parser('hello', help='Say hello')
         subparser.set_defaults(func=self.hello)
+        subparser = subparsers.add_parser('fail', help='Fail')
+        subparser.set_defaults(func=self.fail)
         return parser
 
     # noinspection PyUnusedLocal,PyMethodMayBeStatic
     def hello(self, args):
         return "hello"
 
+    # noinspection PyUnusedLocal,PyMethodMayBeStatic
+    def fail(self, args):
+        raise ValueError('failed')
+
 
 my_cli = MyCli()
 
@@ -26,3 +40,78 @@ class TestCLI(unittest.TestCase):
         """ __call__() must return 0 (success) """
         result = my_cli(["hello"])
         self.assertEqual(result, 0)
+
+    def test_repository_created_lazily(self):
+        cli = MyCli()
+        self.assertRaises(SystemExit, cli.run, ["--version"])
+        self.assertEqual(cli._repository, None)
+
+    def test_import_does_not_load_heavy_modules(self):
+        code = 'import sys, repositorytools.cli.commands; print("requests" in sys.modules)'
+        output = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+        self.assertEqual(output, 'False')
+
+    def test_batch(self):
+        cli = MyCli()
+        cli.repository = object()
+        fd, path = tempfile.mkstemp()
+
+        with os.fdopen(fd, 'w') as f:
+            f.write('["hello"]\n\n{"args": ["fail"], "id": "x"}\nhello\nunknown\n')
+
+        out = six.StringIO()
+        stdout = sys.stdout
+        try:
+            failures = cli.run_batch(path, workers=2, out=out)
+        finally:
+            os.unlink(path)
+
+        output = out.getvalue()
+        self.assertTrue(sys.stdout is stdout)
+
+        results = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(2, failures)
+        self.assertEqual([1, 3, 4, 5], [r['line'] for r in results])
+        self.assertEqual(['hello', None, 'hello', None], [r['result'] for r in results])
+        self.assertEqual('x', results[1]['id'])
+        self.assertEqual('ValueError: failed', results[1]['error'])
+        self.assertTrue(results[3]['error'].startswith('exited'))
+
+    def test_batch_without_sub_command(self):
+        fd, path = tempfile.mkstemp()
+
+        with os.fdopen(fd, 'w') as f:
+            f.write('hello\n')
+
+        cli = MyCli()
+        cli._ensure_repository = lambda: None
+        try:
+            self.assertEqual(0, cli.run(['--batch', path, '--batch-workers', '2']))
+            self.assertRaises(SystemExit, cli.run, ['--batch', path, 'hello'])
+        finally:
+            os.unlink(path)
+
+    def test_batch_exit_code(self):
+        fd, path = tempfile.mkstemp()
+
+        with os.fdopen(fd, 'w') as f:
+            f.write('hello\nfail\n')
+
+        cli = MyCli()
+        cli._ensure_repository = lambda: None
+        try:
+            self.assertEqual(1, cli(['--batch', path]))
+            self.assertEqual(0, cli(['hello']))
+        finally:
+            os.unlink(path)
+
+    def test_profile(self):
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'hello.prof')
+        try:
+            self.assertEqual(0, MyCli()(['--profile', path, 'hello']))
+            self.assertTrue(os.path.getsize(path) > 0)
+            if not six.PY2:
+                self.assertTrue(os.path.exists(path + '.memory.txt'))
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,56 @@
+import unittest
+
+import six
+
+from repositorytools.cli.commands import repo
+
+
+class TestRepoList(unittest.TestCase):
+    def setUp(self):
+        self.repos = [{'repositoryId': 'releases-{0}'.format(i), 'type': 'closed' if i % 2 else 'open',
+                       'createdTimestamp': (i * 7) % 10, 'description': 'foo, "bar"'} for i in range(10)]
+
+    def _list(self, output_format, fields=None, sort=None, limit=None):
+        records = iter(self.repos)
+        if fields is not None:
+            records = (repo._project(record, fields) for record in records)
+
+        out = six.StringIO()
+        count = repo._write_records(repo._sort_and_limit(records, sort, limit), output_format, fields, out)
+        return count, out.getvalue()
+
+    def test_limit_stops_reading(self):
+        records = iter(self.repos)
+        self.assertEqual(3, len(list(repo._sort_and_limit(records, limit=3))))
+        self.assertEqual('releases-3', next(records)['repositoryId'])
+
+    def test_sort(self):
+        count, output = self._list('ids', sort='-createdTimestamp', limit=3)
+        self.assertEqual(3, count)
+        self.assertEqual('releases-7\nreleases-4\nreleases-1\n', output)
+
+        _, output = self._list('ids', sort='createdTimestamp')
+        self.assertEqual('releases-0', output.split()[0])
+
+    def test_csv(self):
+        _, output = self._list('csv', fields=['repositoryId', 'description', 'missing'], limit=2)
+        self.assertEqual('repositoryId,description,missing\n'
+                         'releases-0,"foo, ""bar""",\n'
+                         'releases-1,"foo, ""bar""",\n', output)
+
+        _, output = self._list('tsv', fields=['repositoryId', 'type'], limit=1)
+        self.assertEqual('repositoryId\ttype\nreleases-0\topen\n', output)
+
+    def test_json(self):
+        _, output = self._list('jsonl', fields=['repositoryId'], limit=2)
+        self.assertEqual('{"repositoryId": "releases-0"}\n{"repositoryId": "releases-1"}\n', output)
+
+        _, output = self._list('json', fields=['repositoryId'], limit=2)
+        self.assertEqual('[{"repositoryId": "releases-0"}, {"repositoryId": "releases-1"}]\n', output)
+
+    def test_fields_rejected_for_ids(self):
+        cli = repo.RepoCLI()
+        args = cli.parser.parse_args(['list', '-s', '--fields', 'type'])
+        self.assertRaises(ValueError, cli.list, args)
+        # the server isn't asked
+        self.assertEqual(None, cli._repository)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Measures how request compression pays off on payloads typical for repository servers: how much gzip and deflate
+shrink them and how long compressing takes. Then measures reading of a big gzipped JSON listing from a local stub
+server, through NexusRepositoryClient._send_json, which decodes the response while it's being decompressed.
+
+usage: python tests/compression_benchmark.py [runs]
+"""
+from __future__ import print_function
+
+import gzip
+import json
+import os
+import sys
+import time
+
+import six
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'unit'))
+
+from repositorytools import NexusRepositoryClient
+from repositorytools.lib import compression
+from stub_nexus import StubNexusHandler, StubNexusServer
+
+
+def make_payloads():
+    dependencies = ''.join('<dependency><groupId>com.fooware.module{i}</groupId><artifactId>foo-{i}</artifactId>'
+                           '<version>1.{i}.0</version><scope>compile</scope></dependency>'.format(i=i)
+                           for i in range(200))
+    pom = '<?xml version="1.0"?><project><modelVersion>4.0.0</modelVersion><dependencies>{d}</dependencies>' \
+          '</project>'.format(d=dependencies)
+    metadata = json.dumps({'data': [{'artifact': 'com.fooware:foo{i}:1.0::jar'.format(i=i),
+                                     'metadata': {'buildNumber': str(i), 'vcsRevision': '%040x' % i}}
+                                    for i in range(5000)]})
+    log = ''.join('2017-07-13 10:03:{s:02d}.{i:03d} INFO [main] Uploading com/fooware/foo/1.{i}/foo-1.{i}.jar\n'.format(
+        s=i % 60, i=i % 1000) for i in range(20000))
+    binary = os.urandom(1024 * 1024)
+
+    return [('pom', pom.encode()), ('metadata json', metadata.encode()), ('build log', log.encode()),
+            ('jar (random)', binary)]
+
+
+def make_listing(entries):
+    return json.dumps({'data': [{'text': 'foo-1.{i}.jar'.format(i=i), 'leaf': True,
+                                 'relativePath': '/com/fooware/foo/1.{i}/foo-1.{i}.jar'.format(i=i),
+                                 'lastModified': '2017-07-13 10:03:11.0 UTC', 'sizeOnDisk': i}
+                                for i in range(entries)]}).encode()
+
+
+def measure(func, runs):
+    results = []
+
+    for _ in range(runs):
+        start = time.time()
+        func()
+        results.append(time.time() - start)
+
+    results.sort()
+    return results[len(results) // 2]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print('{name:<16}{size:>12}{algorithm:>10}{ratio:>10}{time:>12}'.format(name='payload', size='bytes',
+                                                                          algorithm='encoding', ratio='ratio',
+                                                                          time='ms'))
+    for name, payload in make_payloads():
+        for encoding in compression.COMPRESSIONS:
+            compressed = compression.compress(payload, encoding)
+            ms = measure(lambda: compression.compress(payload, encoding), runs) * 1000
+            print('{name:<16}{size:>12}{encoding:>10}{ratio:>10.2f}{ms:>12.1f}'.format(
+                name=name, size=len(payload), encoding=encoding, ratio=len(payload) / float(len(compressed)), ms=ms))
+
+    listing = make_listing(100000)
+    buf = six.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(listing)
+    path = '/service/local/repositories/releases/content/'
+
+    class GzipHandler(StubNexusHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(buf.getvalue())))
+            self.end_headers()
+            self.wfile.write(buf.getvalue())
+
+    server = StubNexusServer(handler=GzipHandler).start()
+    try:
+        client = NexusRepositoryClient(repository_url=server.url)
+        ms = measure(lambda: client._send_json(path.lstrip('/')), runs) * 1000
+        print('listing of {n} bytes ({c} gzipped) read in {ms:.1f} ms'.format(n=len(listing), c=len(buf.getvalue()),
+                                                                               ms=ms))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Measures cold-start latency of the command line tools, i.e. how long it takes to import
+repositorytools.cli.commands in a fresh interpreter. The time of an empty interpreter is subtracted.
+
+usage: python tests/import_time_benchmark.py [runs]
+"""
+from __future__ import print_function
+
+import subprocess
+import sys
+import time
+
+MODULE = 'repositorytools.cli.commands'
+HEAVY_MODULES = ['requests', 'requests_toolbelt', 'multiprocessing.pool']
+
+
+def measure(code, runs):
+    results = []
+
+    for _ in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code])
+        results.append(time.time() - start)
+
+    results.sort()
+    return results[len(results) // 2]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    empty = measure('pass', runs)
+    imported = measure('import {module}'.format(module=MODULE), runs)
+    print('median import time of {module}: {ms:.1f} ms ({runs} runs)'.format(module=MODULE,
+                                                                          ms=(imported - empty) * 1000, runs=runs))
+
+    check = 'import sys, {module}; print(",".join(m for m in {heavy!r} if m in sys.modules))'.format(
+        module=MODULE, heavy=HEAVY_MODULES)
+    loaded = subprocess.check_output([sys.executable, '-c', check]).decode().strip()
+    print('heavy modules imported at startup: {loaded}'.format(loaded=loaded or 'none'))
+
+
+if __name__ == '__main__':
+    main()
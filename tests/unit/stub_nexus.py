@@ -0,0 +1,206 @@
+"""
+Minimal in-process stand-in for a Nexus server, used by tests which need real HTTP. By changing content_prefix and
+routes it can pretend to be also Nexus 3 or Artifactory.
+"""
+import hashlib
+import threading
+import zlib
+
+from six.moves import BaseHTTPServer, socketserver
+
+CONTENT_PREFIX = '/content/repositories/'
+NEXUS3_CONTENT_PREFIX = '/repository/'
+ARTIFACTORY_CONTENT_PREFIX = '/'
+
+
+class StubNexusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+        # HTTP/1.1 keeps connections open for more requests
+        if self.server.keep_alive:
+            self.protocol_version = 'HTTP/1.1'
+
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _record(self):
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+            self.server.authorizations.add(self.headers.get('Authorization'))
+
+    def _respond(self, code, body=b'', content_type='application/octet-stream'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size)
+                self.rfile.readline()
+                if not size:
+                    break
+                chunks.append(chunk)
+            return b''.join(chunks)
+
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _route(self):
+        """
+        :return: True if the request was answered by a fixed route
+        """
+        route = self.server.routes.get((self.command, self.path.split('?')[0]))
+        if route is None:
+            return False
+
+        if callable(route):
+            route = route()
+
+        code, body = route[:2]
+        self._respond(code, body, *route[2:])
+        return True
+
+    def do_GET(self):
+        self._record()
+        if self._route():
+            return
+
+        path = self.path.split('?')[0]
+        prefix = self.server.content_prefix
+
+        if not path.startswith(prefix):
+            return self._respond(404)
+
+        key = path[len(prefix):]
+
+        with self.server.lock:
+            content = self.server.content.get(key)
+
+            if content is None and key.endswith('.sha1') and key[:-len('.sha1')] in self.server.content:
+                content = hashlib.sha1(self.server.content[key[:-len('.sha1')]]).hexdigest().encode()
+
+        if content is None:
+            return self._respond(404)
+
+        self._respond(200, content)
+
+    do_HEAD = do_GET
+
+    def _refuses_compression(self):
+        if self.headers.get('Content-Encoding') and not self.server.accept_compression:
+            self._respond(415)
+            return True
+        return False
+
+    def do_PUT(self):
+        self._record()
+        body = self._read_body()
+        path = self.path.split('?')[0]
+
+        if self._refuses_compression() or self._route():
+            return
+
+        with self.server.lock:
+            self.server.put_headers[path] = dict(self.headers.items())
+
+        encoding = self.headers.get('Content-Encoding')
+        if encoding:
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS)
+        prefix = self.server.content_prefix
+
+        if not path.startswith(prefix):
+            return self._respond(404)
+
+        with self.server.lock:
+            # Artifactory's deploy by checksum, succeeds only if a file with the same checksum is stored
+            if self.headers.get('X-Checksum-Deploy') == 'true':
+                sha1 = self.headers.get('X-Checksum-Sha1')
+                body = next((content for content in self.server.content.values()
+                             if hashlib.sha1(content).hexdigest() == sha1), None)
+                if body is None:
+                    return self._respond(404)
+
+            self.server.content[path[len(prefix):]] = body
+
+        self._respond(201)
+
+    def do_POST(self):
+        self._record()
+        body = self._read_body()
+
+        if self._refuses_compression():
+            return
+
+        with self.server.lock:
+            self.server.posts[self.path] = (dict(self.headers.items()), body)
+
+        if not self._route():
+            self._respond(201)
+
+    def do_DELETE(self):
+        self._record()
+        path = self.path.split('?')[0]
+
+        with self.server.lock:
+            found = self.server.content.pop(path[len(self.server.content_prefix):], None) is not None
+
+        self._respond(204 if found else 404)
+
+
+class StubNexusServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Serves content of repositories from a dict {'<repo_id>/<path>': bytes}. Other requests can be answered by fixed
+    routes {(method, path): (code, body[, content_type])}, instead of the tuple, a route can be a callable returning
+    it. Compressed PUT bodies are decompressed before storing, headers of PUT requests are recorded in attribute
+    put_headers, POST bodies are recorded as they came. With keep_alive,
+    connections are reused for more requests, their number is counted in attribute connections.
+
+    Usage::
+
+        server = StubNexusServer()
+        server.start()
+        client = NexusProRepositoryClient(repository_url=server.url)
+        ...
+        server.stop()
+    """
+    daemon_threads = True
+
+    def __init__(self, handler=StubNexusHandler, content_prefix=CONTENT_PREFIX, routes=None, accept_compression=True,
+                 keep_alive=False):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), handler)
+        self.lock = threading.Lock()
+        self.accept_compression = accept_compression
+        self.keep_alive = keep_alive
+        self.connections = 0
+        self.authorizations = set()
+        self.content_prefix = content_prefix
+        self.routes = routes or {}
+        self.content = {}
+        self.posts = {}
+        self.put_headers = {}
+        self.requests = []
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{port}'.format(port=self.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
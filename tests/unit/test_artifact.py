@@ -1,8 +1,10 @@
 from unittest import TestCase
+import hashlib
 import logging
 import six
 
-from repositorytools import LocalArtifact
+from repositorytools import LocalArtifact, BufferSource, StreamSource
+from repositorytools.lib.artifact import ArtifactError
 
 
 class ArtifactTest(TestCase):
@@ -25,3 +27,28 @@ class ArtifactTest(TestCase):
             self.assertEqual(expected_name, local_artifact.artifact)
             self.assertEqual(expected_version, local_artifact.version)
             self.assertEqual(expected_extension, local_artifact.extension)
+
+    def test_sources(self):
+        content = b'generated' * 1000
+        local_artifact = LocalArtifact('com.fooware', local_path='foo-1.0.tgz', source=bytearray(content))
+
+        self.assertIsInstance(local_artifact.source, BufferSource)
+        self.assertEqual(('foo', '1.0', len(content)), (local_artifact.artifact, local_artifact.version,
+                                                        local_artifact.source.size))
+        self.assertEqual(hashlib.sha1(content).hexdigest(), local_artifact.get_sha1())
+
+        with local_artifact.source.open() as f:
+            self.assertEqual(content[:9], f.read(9))
+            self.assertEqual(content[9:], f.getbuffer().tobytes())
+
+        stream = LocalArtifact('com.fooware', local_path='foo-1.0.tgz', source=six.BytesIO(content))
+        self.assertIsInstance(stream.source, StreamSource)
+        self.assertEqual(None, stream.source.size)
+        self.assertRaises(ArtifactError, stream.get_sha1)
+
+        with stream.source.open(sized=True) as f:
+            self.assertEqual(len(content), len(f))
+            self.assertEqual(content, f.read())
+
+        # it can be read only once
+        self.assertRaises(ArtifactError, stream.source.open)
@@ -0,0 +1,183 @@
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+
+from repositorytools import (LocalArtifact, RemoteArtifact, NexusRepositoryClient, NexusProRepositoryClient,
+                             Nexus3RepositoryClient, ArtifactoryRepositoryClient, repository_client_factory,
+                             detect_repository_type, RepositoryClientError)
+from repositorytools.lib import repository
+
+from stub_nexus import StubNexusServer, NEXUS3_CONTENT_PREFIX, ARTIFACTORY_CONTENT_PREFIX
+
+
+def _json_route(data):
+    return 200, json.dumps(data).encode(), 'application/json'
+
+
+class DetectRepositoryTypeTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'repository_types.json')
+        self.servers = []
+        repository._repository_types.clear()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        shutil.rmtree(self.tmp_dir)
+        repository._repository_types.clear()
+
+    def _server(self, routes):
+        server = StubNexusServer(routes=routes).start()
+        self.servers.append(server)
+        return server
+
+    def test_detection(self):
+        servers = {
+            'nexus-pro': self._server({('GET', '/service/local/status'): _json_route({'data': {'editionShort': 'PRO'}})}),
+            'nexus': self._server({('GET', '/service/local/status'): _json_route({'data': {'editionShort': 'OSS'}})}),
+            'nexus3': self._server({('GET', '/service/rest/v1/status'): (200, b'')}),
+            'artifactory': self._server({('GET', '/api/system/ping'): (200, b'OK', 'text/plain')}),
+            None: self._server({}),
+        }
+
+        for expected, server in servers.items():
+            self.assertEqual(expected, detect_repository_type(server.url, cache_path=self.cache_path))
+
+    def test_probed_once(self):
+        server = self._server({('GET', '/service/rest/v1/status'): (200, b'')})
+
+        self.assertEqual('nexus3', detect_repository_type(server.url, cache_path=self.cache_path))
+        probes = len(server.requests)
+
+        # cached in this process
+        self.assertEqual('nexus3', detect_repository_type(server.url, cache_path=self.cache_path))
+        # cached on disk, e.g. for the next command line invocation
+        repository._repository_types.clear()
+        self.assertEqual('nexus3', detect_repository_type(server.url, cache_path=self.cache_path))
+
+        self.assertEqual(probes, len(server.requests))
+
+    def test_not_recognized_cached(self):
+        server = self._server({})
+
+        self.assertEqual(None, detect_repository_type(server.url, cache_path=self.cache_path, auth=('admin', 'secret')))
+        probes = len(server.requests)
+        self.assertNotIn(None, server.authorizations)
+
+        repository._repository_types.clear()
+        self.assertEqual(None, detect_repository_type(server.url, cache_path=self.cache_path))
+        self.assertEqual(probes, len(server.requests))
+
+        self.assertRaises(RepositoryClientError, repository_client_factory, repository_url=server.url,
+                          repository_type='auto')
+        self.assertIsInstance(repository_client_factory(repository_url=server.url), NexusProRepositoryClient)
+
+    def test_factory(self):
+        server = self._server({('GET', '/api/system/ping'): (200, b'OK', 'text/plain')})
+        repository._repository_types[server.url] = detect_repository_type(server.url, cache_path=None)
+
+        self.assertIsInstance(repository_client_factory(repository_url=server.url), ArtifactoryRepositoryClient)
+        client = repository_client_factory(repository_url=server.url, repository_type='nexus',
+                                           staging_repository_url='http://staging')
+        self.assertIsInstance(client, NexusRepositoryClient)
+        self.assertNotIsInstance(client, NexusProRepositoryClient)
+
+        # the 4th positional argument would mean something else in each client class
+        self.assertRaises(TypeError, repository_client_factory, server.url, 'admin', 'secret', False)
+
+
+class BackendTestCase(TestCase):
+    content_prefix = None
+
+    def setUp(self):
+        self.server = StubNexusServer(content_prefix=self.content_prefix).start()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.local_path = os.path.join(self.tmp_dir, 'foo-1.0.jar')
+        with open(self.local_path, 'wb') as f:
+            f.write(b'jar content')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+
+class Nexus3RepositoryClientTest(BackendTestCase):
+    content_prefix = NEXUS3_CONTENT_PREFIX
+
+    def test_upload(self):
+        client = Nexus3RepositoryClient(repository_url=self.server.url)
+        local_artifact = LocalArtifact(group='com.fooware', local_path=self.local_path, classifier='linux')
+
+        remote_artifacts = client.upload_artifacts([local_artifact], 'releases', print_created_artifacts=False)
+
+        headers, body = self.server.posts['/service/rest/v1/components?repository=releases']
+        self.assertIn(b'name="maven2.asset1.classifier"', body)
+        self.assertIn(b'jar content', body)
+        self.assertEqual(self.server.url + '/repository/releases/com/fooware/foo/1.0/foo-1.0-linux.jar',
+                         remote_artifacts[0].url)
+
+    def test_upload_groups_components(self):
+        client = Nexus3RepositoryClient(repository_url=self.server.url)
+        local_artifacts = [LocalArtifact(group='com.fooware', local_path=self.local_path, classifier=classifier)
+                           for classifier in ('', 'sources', 'javadoc', 'tests')]
+        other_path = os.path.join(self.tmp_dir, 'bar-2.0.jar')
+        with open(other_path, 'wb') as f:
+            f.write(b'bar')
+        local_artifacts.insert(1, LocalArtifact(group='com.fooware', local_path=other_path))
+
+        remote_artifacts = client.upload_artifacts(local_artifacts, 'releases', print_created_artifacts=False,
+                                                   max_workers=4)
+
+        # foo in two requests of at most three assets, bar in one
+        self.assertEqual(3, len([r for r in self.server.requests if r[0] == 'POST']))
+        self.assertEqual([a.get_coordinates_string() for a in local_artifacts],
+                         [a.get_coordinates_string() for a in remote_artifacts])
+
+    def test_resolve(self):
+        url = self.server.url + '/repository/releases/com/fooware/foo/1.1/foo-1.1.jar'
+        self.server.routes[('GET', '/service/rest/v1/search/assets')] = _json_route({'items': [{
+            'downloadUrl': url, 'checksum': {'sha1': 'abc'},
+            'maven2': {'groupId': 'com.fooware', 'artifactId': 'foo', 'version': '1.1', 'extension': 'jar'}}]})
+        client = Nexus3RepositoryClient(repository_url=self.server.url)
+
+        remote_artifact = RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:foo:LATEST')
+        client.resolve_artifact(remote_artifact)
+
+        self.assertEqual(('1.1', url, 'abc'), (remote_artifact.version, remote_artifact.url, remote_artifact.sha1))
+        self.assertNotIn('baseVersion', self.server.requests[-1][1])
+
+
+class ArtifactoryRepositoryClientTest(BackendTestCase):
+    content_prefix = ARTIFACTORY_CONTENT_PREFIX
+
+    def test_upload_deploys_by_checksum(self):
+        client = ArtifactoryRepositoryClient(repository_url=self.server.url)
+        local_artifact = LocalArtifact(group='com.fooware', local_path=self.local_path)
+
+        client.upload_artifacts([local_artifact], 'libs-release', print_created_artifacts=False)
+        self.assertEqual(2, len([r for r in self.server.requests if r[0] == 'PUT']))
+
+        # the same content in another repository is deployed without sending it
+        remote_artifacts = client.upload_artifacts([local_artifact], 'libs-mirror', print_created_artifacts=False)
+        self.assertEqual(3, len([r for r in self.server.requests if r[0] == 'PUT']))
+        self.assertEqual(b'jar content', self.server.content['libs-mirror/com/fooware/foo/1.0/foo-1.0.jar'])
+        self.assertEqual(self.server.url + '/libs-mirror/com/fooware/foo/1.0/foo-1.0.jar', remote_artifacts[0].url)
+
+    def test_resolve(self):
+        storage = self.server.url + '/api/storage/libs-snapshot/com/fooware/foo/1.0-SNAPSHOT/'
+        self.server.routes[('GET', '/api/search/gavc')] = _json_route({'results': [
+            {'uri': storage + 'foo-1.0-20170101.120000-9.jar'},
+            {'uri': storage + 'foo-1.0-20170102.120000-10.jar'},
+            {'uri': storage + 'foo-1.0-20170102.120000-10.pom'},
+        ]})
+        client = ArtifactoryRepositoryClient(repository_url=self.server.url)
+
+        remote_artifact = RemoteArtifact.from_repo_id_and_coordinates('libs-snapshot', 'com.fooware:foo:1.0-SNAPSHOT')
+        client.resolve_artifact(remote_artifact)
+
+        self.assertEqual('1.0-20170102.120000-10', remote_artifact.version)
+        self.assertEqual(self.server.url + '/libs-snapshot/com/fooware/foo/1.0-SNAPSHOT/foo-1.0-20170102.120000-10.jar',
+                         remote_artifact.url)
@@ -0,0 +1,65 @@
+from unittest import TestCase
+import logging
+
+from repositorytools import NexusProRepositoryClient, RemoteArtifact
+
+from stub_nexus import StubNexusServer
+
+
+class CopyArtifactsTest(TestCase):
+    def setUp(self):
+        logging.basicConfig(level=logging.DEBUG)
+        self.source = StubNexusServer().start()
+        self.destination = StubNexusServer().start()
+
+        self.content = b'x' * 300000
+        self.source.content['releases/com/fooware/foo/1.0/foo-1.0.jar'] = self.content
+        self.source.content['releases/com/fooware/foo/1.0/foo-1.0.pom'] = b'<project/>'
+
+        self.source_client = NexusProRepositoryClient(repository_url=self.source.url)
+        self.client = NexusProRepositoryClient(repository_url=self.destination.url)
+
+        self.artifacts = []
+        for extension in ('jar', 'pom'):
+            artifact = RemoteArtifact.from_repo_id_and_coordinates('releases',
+                                                                   'com.fooware:foo:1.0::{0}'.format(extension))
+            artifact.url = self.source_client.get_content_url('releases',
+                                                              'com/fooware/foo/1.0/foo-1.0.{0}'.format(extension))
+            self.artifacts.append(artifact)
+
+    def tearDown(self):
+        self.source.stop()
+        self.destination.stop()
+
+    def test_copy_between_servers(self):
+        copied = self.client.copy_artifacts(self.artifacts, 'mirror', source_client=self.source_client)
+
+        self.assertEqual([True, True], [a.copied for a in copied])
+        self.assertEqual(self.content, self.destination.content['mirror/com/fooware/foo/1.0/foo-1.0.jar'])
+        self.assertEqual(self.client.get_content_url('mirror', 'com/fooware/foo/1.0/foo-1.0.pom'), copied[1].url)
+
+        # second copy finds the same sha1 in destination
+        self.destination.requests = []
+        copied = self.client.copy_artifacts(self.artifacts, 'mirror', source_client=self.source_client)
+        self.assertEqual([False, False], [a.copied for a in copied])
+        self.assertEqual([], [r for r in self.destination.requests if r[0] == 'PUT'])
+
+    def test_copy_from_mirror(self):
+        mirror = StubNexusServer().start()
+        try:
+            mirror.content['releases/com/fooware/foo/1.0/foo-1.0.jar'] = self.content
+            source_client = NexusProRepositoryClient(repository_url=self.source.url, mirror_urls=[mirror.url])
+            # e.g. resolved by the mirror
+            artifact = RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:foo:1.0::jar')
+            artifact.url = mirror.url + '/content/repositories/releases/com/fooware/foo/1.0/foo-1.0.jar'
+
+            copied = self.client.copy_artifacts([artifact], 'mirror', source_client=source_client)
+            self.assertEqual(self.client.get_content_url('mirror', 'com/fooware/foo/1.0/foo-1.0.jar'), copied[0].url)
+            self.assertEqual(self.content, self.destination.content['mirror/com/fooware/foo/1.0/foo-1.0.jar'])
+        finally:
+            mirror.stop()
+
+    def test_copy_within_server(self):
+        copied = self.source_client.copy_artifacts(self.artifacts[:1], 'other', skip_existing=False)
+        self.assertTrue(copied[0].copied)
+        self.assertEqual(self.content, self.source.content['other/com/fooware/foo/1.0/foo-1.0.jar'])
@@ -0,0 +1,101 @@
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+
+import six
+
+from repositorytools import (NexusRepositoryClient, LocalArtifact, RemoteArtifact, Event, EventReporter,
+                             TextRenderer, TeamCityRenderer, JsonLinesRenderer, ARTIFACTS_CREATED, UPLOAD_FAILED)
+
+from stub_nexus import StubNexusServer
+
+
+class EventReporterTest(TestCase):
+    def setUp(self):
+        self.out = six.StringIO()
+        self.err = six.StringIO()
+        remote_artifacts = [RemoteArtifact(group='com.fooware', artifact='foo', version='1.0', extension='jar',
+                                           repo_id='releases', url='http://repo/foo-1.0.jar')]
+        self.events = [Event(ARTIFACTS_CREATED, repo_id='releases', remote_artifacts=remote_artifacts),
+                       Event(UPLOAD_FAILED, local_path="bar's.jar", repo_id='releases', size=3, duration=0.1,
+                             error=IOError('timeout'))]
+
+    def _render(self, renderer):
+        reporter = EventReporter(renderer, out=self.out, err=self.err)
+        for event in self.events:
+            reporter.emit(event)
+
+        # nothing is written till flush
+        self.assertEqual('', self.out.getvalue())
+        reporter.flush()
+        return self.out.getvalue().splitlines()
+
+    def test_text(self):
+        self.assertEqual(['http://repo/foo-1.0.jar'], self._render(TextRenderer()))
+        self.assertEqual('The following files were uploaded to repository releases\n', self.err.getvalue())
+
+    def test_teamcity(self):
+        self.assertEqual(["##teamcity[highlight title='The following files were uploaded to repository releases' "
+                          "text='<a href=\"http://repo/foo-1.0.jar\">http://repo/foo-1.0.jar</a>']",
+                          "##teamcity[message text='Upload of bar|'s.jar failed: timeout' status='WARNING']"],
+                         self._render(TeamCityRenderer()))
+
+    def test_json_lines(self):
+        lines = [json.loads(line) for line in self._render(JsonLinesRenderer())]
+
+        self.assertEqual(['artifacts_created', 'upload_failed'], [line['event'] for line in lines])
+        self.assertEqual([{'coordinates': 'com.fooware:foo:1.0::jar', 'url': 'http://repo/foo-1.0.jar'}],
+                         lines[0]['remote_artifacts'])
+        self.assertEqual('IOError: timeout' if six.PY2 else 'OSError: timeout', lines[1]['error'])
+
+    def test_upload_events(self):
+        tmp_dir = tempfile.mkdtemp()
+        server = StubNexusServer().start()
+        try:
+            local_artifacts = []
+            for name in ('foo', 'bar'):
+                local_path = os.path.join(tmp_dir, '{name}-1.0.jar'.format(name=name))
+                with open(local_path, 'wb') as f:
+                    f.write(name.encode())
+                local_artifacts.append(LocalArtifact(group='com.fooware', local_path=local_path))
+
+            client = NexusRepositoryClient(repository_url=server.url)
+            with EventReporter(JsonLinesRenderer(), out=self.out, flush_interval=0.01) as reporter:
+                client.reporter = reporter
+                client.upload_artifacts(local_artifacts, 'releases', use_direct_put=True, verify='none')
+
+            lines = [json.loads(line) for line in self.out.getvalue().splitlines()]
+            self.assertEqual(['upload_started', 'upload_finished'] * 2 + ['artifacts_created'],
+                             [line['event'] for line in lines])
+            self.assertEqual(3, lines[1]['size'])
+            self.assertTrue(lines[1]['url'].endswith('/releases/com/fooware/foo/1.0/foo-1.0.jar'))
+        finally:
+            server.stop()
+            shutil.rmtree(tmp_dir)
+
+    def test_publish_events(self):
+        tmp_dir = tempfile.mkdtemp()
+        servers = [StubNexusServer().start(), StubNexusServer().start()]
+        try:
+            local_path = os.path.join(tmp_dir, 'foo-1.0.jar')
+            with open(local_path, 'wb') as f:
+                f.write(b'foo')
+            local_artifact = LocalArtifact(group='com.fooware', local_path=local_path)
+
+            client = NexusRepositoryClient(repository_url=servers[0].url, replica_urls=[servers[1].url])
+            with EventReporter(JsonLinesRenderer(), out=self.out, flush_interval=0.01) as reporter:
+                client.reporter = reporter
+                client.publish_artifacts([local_artifact], 'releases', use_direct_put=True, verify='none')
+
+            lines = [json.loads(line) for line in self.out.getvalue().splitlines()]
+            finished = [line for line in lines if line['event'] == 'upload_finished']
+            self.assertEqual(2, len([line for line in lines if line['event'] == 'upload_started']))
+            self.assertEqual(sorted(server.url for server in servers),
+                             sorted(line['repository_url'] for line in finished))
+            self.assertEqual([3, 3], [line['size'] for line in finished])
+        finally:
+            for server in servers:
+                server.stop()
+            shutil.rmtree(tmp_dir)
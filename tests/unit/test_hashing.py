@@ -0,0 +1,64 @@
+from unittest import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+
+from repositorytools import LocalArtifact
+from repositorytools.lib import hashing
+
+
+class HashingTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+
+        for i, size in enumerate((0, 1000, 3 * 1024 * 1024 + 7)):
+            path = os.path.join(self.tmp_dir, 'foo{i}-1.0.bin'.format(i=i))
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            self.paths.append(path)
+
+        self.threshold = hashing.MMAP_THRESHOLD
+        hashing._cache.clear()
+
+    def tearDown(self):
+        hashing.MMAP_THRESHOLD = self.threshold
+        shutil.rmtree(self.tmp_dir)
+
+    def _expected(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        return dict((algorithm, hashlib.new(algorithm, content).hexdigest()) for algorithm in hashing.DEFAULT_ALGORITHMS)
+
+    def test_read_and_mmap(self):
+        # the big file is memory-mapped, the small ones are read
+        hashing.MMAP_THRESHOLD = 1024 * 1024
+
+        for path in self.paths:
+            self.assertEqual(self._expected(path), hashing.hash_file(path))
+
+    def test_hash_files_in_processes(self):
+        result = hashing.hash_files(self.paths + self.paths[:1], processes=2)
+        self.assertEqual([self._expected(path) for path in self.paths + self.paths[:1]], result)
+
+    def test_cache(self):
+        local_artifact = LocalArtifact(group='com.fooware', local_path=self.paths[1])
+        sha1 = local_artifact.get_sha1()
+
+        # cached results are used until the file changes
+        hashing._cache[hashing._cache_key(self.paths[1])]['sha1'] = 'cached'
+        self.assertEqual('cached', local_artifact.get_sha1())
+
+        with open(self.paths[1], 'ab') as f:
+            f.write(b'x')
+        self.assertNotEqual(sha1, local_artifact.get_sha1())
+        self.assertEqual(self._expected(self.paths[1])['sha1'], local_artifact.get_sha1())
+
+    def test_get_cached_checksums(self):
+        self.assertEqual(None, hashing.get_cached_checksums(self.paths[1], ('sha1',)))
+        hashing.hash_file(self.paths[1], ('sha1',))
+        self.assertEqual({'sha1': self._expected(self.paths[1])['sha1']},
+                         hashing.get_cached_checksums(self.paths[1], ('sha1',)))
+        # all algorithms have to be cached
+        self.assertEqual(None, hashing.get_cached_checksums(self.paths[1], ('sha1', 'md5')))
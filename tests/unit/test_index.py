@@ -0,0 +1,101 @@
+from unittest import TestCase
+import logging
+
+from repositorytools import RepositoryIndex
+from repositorytools.lib.index import parse_artifact_path
+
+
+class FakeContentClient(object):
+    """
+    Serves directory listings from a list of file paths
+    """
+    def __init__(self, paths, last_modified='2017-01-01 00:00:00.0 UTC'):
+        self.paths = paths
+        self.last_modified = last_modified
+        self.listed = []
+
+    def list_content(self, repo_id, path=''):
+        self.listed.append(path)
+        children = {}
+
+        for file_path in self.paths:
+            if not file_path.startswith(path):
+                continue
+            name = file_path[len(path):].split('/')[0]
+            leaf = file_path[len(path):] == name
+            children[name] = {'relativePath': '/' + path + name + ('' if leaf else '/'), 'text': name,
+                              'leaf': leaf, 'lastModified': self.last_modified}
+
+        return list(children.values())
+
+    def get_content_url(self, repo_id, path):
+        return 'https://repository/content/repositories/{repo_id}/{path}'.format(repo_id=repo_id, path=path)
+
+    def read_content(self, repo_id, path):
+        return 'da39a3ee5e6b4b0d3255bfef95601890afd80709  {path}'.format(path=path)
+
+
+PATHS = [
+    'com/fooware/foo/1.0/foo-1.0.jar',
+    'com/fooware/foo/1.0/foo-1.0.jar.sha1',
+    'com/fooware/foo/1.0/foo-1.0.pom',
+    'com/fooware/foo/1.0/foo-1.0-sources.jar',
+    'com/fooware/foo/1.10/foo-1.10.jar',
+    'com/fooware/foo/2.0/foo-2.0.jar',
+    'com/fooware/foo/maven-metadata.xml',
+    'com/fooware/foobar/3.0-SNAPSHOT/foobar-3.0-20170101.120000-1.tar.gz',
+    'org/other/bar/1.0/bar-1.0.jar',
+]
+
+
+class RepositoryIndexTest(TestCase):
+    def setUp(self):
+        logging.basicConfig(level=logging.DEBUG)
+        self.client = FakeContentClient(list(PATHS))
+        self.index = RepositoryIndex(':memory:')
+        self.index.refresh(self.client, 'releases', fetch_sha1=True)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_parse_artifact_path(self):
+        self.assertEqual(('com.fooware', 'foo', '1.0', 'sources', 'jar'),
+                         parse_artifact_path('com/fooware/foo/1.0/foo-1.0-sources.jar'))
+        self.assertEqual(('com.fooware', 'foobar', '3.0-20170101.120000-1', '', 'tar.gz'),
+                         parse_artifact_path('com/fooware/foobar/3.0-SNAPSHOT/foobar-3.0-20170101.120000-1.tar.gz'))
+        self.assertEqual(None, parse_artifact_path('com/fooware/foo/1.0/foo-1.0.jar.sha1'))
+        self.assertEqual(None, parse_artifact_path('com/fooware/foo/maven-metadata.xml'))
+
+    def test_search_prefix(self):
+        coordinates = [a.get_coordinates_string() for a in self.index.search('releases', group='com.fooware',
+                                                                             artifact='foo')]
+        self.assertEqual(['com.fooware:foo:1.0:sources:jar', 'com.fooware:foo:1.0::jar', 'com.fooware:foo:1.0::pom',
+                          'com.fooware:foo:1.10::jar', 'com.fooware:foo:2.0::jar',
+                          'com.fooware:foobar:3.0-20170101.120000-1::tar.gz'], coordinates)
+        self.assertEqual(1, len(self.index.search('releases', group='org')))
+        self.assertEqual(0, len(self.index.search('snapshots', group='com')))
+
+    def test_search_version_range(self):
+        artifacts = self.index.search('releases', group='com.fooware', artifact='foo', version='[1.1,2.0)',
+                                      extension='jar')
+        self.assertEqual(['1.10'], [a.version for a in artifacts])
+        self.assertEqual('https://repository/content/repositories/releases/com/fooware/foo/1.10/foo-1.10.jar',
+                         artifacts[0].url)
+
+    def test_sha1(self):
+        artifact = self.index.search('releases', artifact='foo', version='1.0', classifier='', extension='jar')[0]
+        self.assertEqual('da39a3ee5e6b4b0d3255bfef95601890afd80709', artifact.sha1)
+
+    def test_incremental_refresh(self):
+        self.client.listed = []
+        self.client.paths.remove('org/other/bar/1.0/bar-1.0.jar')
+        self.client.paths.append('com/fooware/foo/3.0/foo-3.0.jar')
+        self.index.refresh(self.client, 'releases')
+
+        # unchanged version directories are not listed again
+        self.assertFalse('com/fooware/foo/1.0/' in self.client.listed)
+        self.assertTrue('com/fooware/foo/3.0/' in self.client.listed)
+        self.assertEqual(['1.0', '1.0', '1.0', '1.10', '2.0', '3.0'],
+                         [a.version for a in self.index.search('releases', group='com.fooware', artifact='foo')
+                          if a.artifact == 'foo'])
+        self.assertEqual([], self.index.search('releases', group='org'))
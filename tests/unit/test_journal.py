@@ -0,0 +1,97 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from repositorytools import UploadJournal, LocalArtifact, RemoteArtifact
+
+
+class UploadJournalTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'uploads.sqlite')
+        self.local_artifacts = []
+
+        for i in range(3):
+            local_path = os.path.join(self.tmp_dir, 'foo{i}-1.0.jar'.format(i=i))
+            with open(local_path, 'w') as f:
+                f.write('foo{i}'.format(i=i))
+            self.local_artifacts.append(LocalArtifact(group='com.fooware', local_path=local_path))
+
+        self.uploaded = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _upload(self, local_artifacts):
+        time.sleep(0.2)
+        with self.lock:
+            self.uploaded.extend(local_artifacts)
+        return [RemoteArtifact(group=a.group, artifact=a.artifact, version=a.version, extension=a.extension,
+                               url='http://repo/' + a.artifact, repo_id='releases') for a in local_artifacts]
+
+    def test_restarted_upload_skips_finished_files(self):
+        UploadJournal(self.path).upload('releases', self.local_artifacts[:2], self._upload)
+
+        # e.g. a job restarted after failure, in a new process
+        remote_artifacts = UploadJournal(self.path).upload('releases', self.local_artifacts, self._upload)
+
+        self.assertEqual(['foo0', 'foo1', 'foo2'], [a.artifact for a in self.uploaded])
+        self.assertEqual([True, True, False], [a.journaled for a in remote_artifacts])
+        self.assertEqual('http://repo/foo0', remote_artifacts[0].url)
+
+        # other repositories and changed files are uploaded again
+        UploadJournal(self.path).upload('snapshots', self.local_artifacts[:1], self._upload)
+        self.assertEqual(4, len(self.uploaded))
+
+    def test_concurrent_uploads_coalesced(self):
+        results = []
+
+        def upload():
+            journal = UploadJournal(self.path, poll_interval=0.05)
+            results.append(journal.upload('releases', self.local_artifacts, self._upload))
+
+        threads = [threading.Thread(target=upload) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(3, len(self.uploaded))
+        self.assertEqual(4, len(results))
+        self.assertEqual(3, sum(not a.journaled for result in results for a in result))
+
+    def test_failed_upload_released(self):
+        def fail(local_artifacts):
+            raise IOError('upload failed')
+
+        journal = UploadJournal(self.path)
+        self.assertRaises(IOError, journal.upload, 'releases', self.local_artifacts, fail)
+
+        journal.upload('releases', self.local_artifacts, self._upload)
+        self.assertEqual(3, len(self.uploaded))
+
+    def test_abandoned_upload(self):
+        import socket
+        import subprocess
+        import sys
+
+        # pid of a process which doesn't exist anymore
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        owner = '{host}:{pid}:1'.format(host=socket.gethostname(), pid=process.pid)
+
+        journal = UploadJournal(self.path, stale_after=60)
+        self.assertTrue(journal._is_abandoned(owner, time.time()))
+
+        # processes aren't checked on Windows, only age of the claim
+        platform = sys.platform
+        sys.platform = 'win32'
+        try:
+            self.assertFalse(journal._is_abandoned(owner, time.time()))
+            self.assertTrue(journal._is_abandoned(owner, time.time() - 120))
+        finally:
+            sys.platform = platform
@@ -0,0 +1,43 @@
+from unittest import TestCase
+import json
+
+import six
+
+from repositorytools import iter_array_items
+
+
+class IterArrayItemsTest(TestCase):
+    def _items(self, data, key='data', chunk_size=7):
+        return list(iter_array_items(six.StringIO(data), key, chunk_size=chunk_size))
+
+    def test_items(self):
+        repos = [{'repositoryId': 'releases-{0}'.format(i), 'notifications': i, 'description': u'foö [{,}]'}
+                 for i in range(100)]
+        data = json.dumps({'count': 12345, 'other': {'data': [1]}, 'data': repos, 'after': [True, None]}, indent=1)
+
+        # chunks split keys, strings and numbers
+        for chunk_size in (1, 7, 64 * 1024):
+            self.assertEqual(repos, self._items(data, chunk_size=chunk_size))
+
+    def test_big_item_read_in_growing_chunks(self):
+        class CountingStringIO(six.StringIO):
+            reads = 0
+
+            def read(self, *args):
+                self.reads += 1
+                return six.StringIO.read(self, *args)
+
+        item = {'description': 'x' * 100000}
+        f = CountingStringIO(json.dumps({'data': [item, 1]}))
+        self.assertEqual([item, 1], list(iter_array_items(f, 'data', chunk_size=16)))
+        # each read doubles the text, instead of adding one chunk
+        self.assertTrue(f.reads < 40)
+
+    def test_empty(self):
+        self.assertEqual([], self._items('{"data": []}'))
+        self.assertEqual([], self._items(' { } '))
+        self.assertEqual([3.25], self._items('{"data":[3.25]}', chunk_size=1))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self._items, '[1, 2]')
+        self.assertRaises(ValueError, self._items, '{"data": [1, 2')
@@ -0,0 +1,96 @@
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from repositorytools import MirrorSelector, NexusRepositoryClient, RemoteArtifact
+
+from stub_nexus import StubNexusServer
+
+
+class MirrorSelectorTest(TestCase):
+    def setUp(self):
+        self.now = 0
+        self.delays = {'http://near': 0.0, 'http://far': 0.05, 'http://down': None}
+        self.probes = []
+
+    def _probe(self, url):
+        self.probes.append(url)
+        if self.delays[url] is None:
+            raise IOError('connection refused')
+        time.sleep(self.delays[url])
+
+    def test_ordered_by_latency(self):
+        selector = MirrorSelector(['http://far', 'http://down', 'http://near'], self._probe, probe_interval=60,
+                                  clock=lambda: self.now)
+
+        self.assertEqual(['http://near', 'http://far'], selector.get_ordered())
+        self.assertEqual(3, len(self.probes))
+
+        # a failed mirror is skipped till the next probe
+        selector.mark_failed('http://near')
+        self.assertEqual(['http://far'], selector.get_ordered())
+        self.assertEqual(3, len(self.probes))
+
+        self.now = 60
+        self.delays['http://down'] = 0.0
+        self.delays['http://near'] = 0.1
+        self.assertEqual(['http://down', 'http://far', 'http://near'], selector.get_ordered())
+        self.assertEqual(6, len(self.probes))
+
+
+class MirrorsTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        status = {('GET', '/service/local/status'): (200, b'{}', 'application/json')}
+        self.primary = StubNexusServer(routes=dict(status)).start()
+        self.mirror = StubNexusServer(routes=dict(status)).start()
+        self.servers = [self.primary, self.mirror]
+
+        path = 'com/fooware/foo/1.0/foo-1.0.jar'
+        for server in self.servers:
+            server.content['releases/' + path] = b'foo'
+            data = {'data': {'repositoryPath': '/' + path, 'presentLocally': True, 'snapshot': False,
+                             'snapshotBuildNumber': None, 'snapshotTimeStamp': None}}
+            server.routes[('GET', '/service/local/artifact/maven/resolve')] = (200, json.dumps(data).encode(),
+                                                                               'application/json')
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_failover(self):
+        # a mirror which doesn't run at all, taken from a stopped server
+        down = StubNexusServer().start()
+        down_url = down.url
+        down.stop()
+
+        client = NexusRepositoryClient(repository_url=self.primary.url, mirror_urls=[down_url, self.mirror.url])
+        # the mirror is faster than the primary server
+        client._mirrors._latencies = {self.primary.url: 1.0, self.mirror.url: 0.1}
+        client._mirrors._probed_at = time.time()
+
+        artifact = RemoteArtifact(group='com.fooware', artifact='foo', version='1.0', repo_id='releases')
+        client.resolve_artifact(artifact)
+        self.assertTrue(artifact.url.startswith(self.mirror.url))
+
+        local_path = client.download_artifact(artifact, self.tmp_dir)
+        with open(local_path, 'rb') as f:
+            self.assertEqual(b'foo', f.read())
+        self.assertEqual(os.path.join(self.tmp_dir, 'foo-1.0.jar'), local_path)
+
+        # the mirror fails, the primary server takes over
+        self.mirror.stop()
+        self.servers.remove(self.mirror)
+
+        self.assertEqual('foo', client.read_content('releases', 'com/fooware/foo/1.0/foo-1.0.jar'))
+        self.assertEqual([self.primary.url], client._mirrors.get_ordered())
+
+    def test_probed(self):
+        client = NexusRepositoryClient(repository_url=self.primary.url, mirror_urls=[self.mirror.url])
+
+        self.assertEqual(set([self.primary.url, self.mirror.url]), set(client._mirrors.get_ordered()))
+        self.assertIn(('GET', '/service/local/status'), self.mirror.requests)
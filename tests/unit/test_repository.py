@@ -1,13 +1,273 @@
 from unittest import TestCase
 import logging
+import os
+import tempfile
+import shutil
+import zlib
+import gzip
+import hashlib
+import json
 
-from repositorytools import NexusRepositoryClient, WrongDataTypeError
+import requests
+import six
+
+from stub_nexus import StubNexusServer
+from repositorytools import NexusRepositoryClient, NexusProRepositoryClient, WrongDataTypeError, LocalArtifact, \
+    RemoteArtifact, RepositoryClientError, ArtifactNotFoundError, StagingStateError, PublishError, UploadJournal
+
+
+class OfflineNexusProRepositoryClient(NexusProRepositoryClient):
+    """
+    Client which records staging operations instead of sending them to a server
+    """
+    def __init__(self, failing_filename=None):
+        super(OfflineNexusProRepositoryClient, self).__init__(repository_url='http://localhost')
+        self.failing_filename = failing_filename
+        self.closed = []
+        self.dropped = []
+        self.metadata = {}
+        self.sent_metadata = []
+        self.content = {}
+        self.sent = []
+
+    def create_staging_repo(self, profile_name, description):
+        return '{profile_name}-1000'.format(profile_name=profile_name)
+
+    def _upload_artifact(self, local_artifact, path_prefix, repo_id, hostname_for_download=None, use_direct_put=False,
+                         resolve=True, checksum_sidecars=()):
+        if os.path.basename(local_artifact.local_path) == self.failing_filename:
+            raise IOError('upload failed')
+
+        return RemoteArtifact(group=local_artifact.group, artifact=local_artifact.artifact,
+                              version=local_artifact.version, extension=local_artifact.extension, repo_id=repo_id)
+
+    def _send(self, path, method='GET', **kwargs):
+        self.sent.append(path)
+        response = requests.models.Response()
+        response.status_code = 200
+        response._content = self.content.get(path, b'')
+        return response
+
+    def resolve_artifact(self, remote_artifact):
+        remote_artifact.url = self.get_content_url(remote_artifact.repo_id, remote_artifact.version)
+
+    def get_artifact_metadata(self, remote_artifact):
+        return dict(self.metadata.get(remote_artifact.get_coordinates_string(), {}))
+
+    def set_artifact_metadata(self, remote_artifact, metadata):
+        self.sent_metadata.append((remote_artifact.get_coordinates_string(), metadata))
+        self.metadata.setdefault(remote_artifact.get_coordinates_string(), {}).update(metadata)
+
+    def close_staging_repos(self, repo_ids, description=''):
+        self.closed.extend(repo_ids)
+
+    def drop_staging_repos(self, repo_ids, description='No description'):
+        self.dropped.extend(repo_ids)
 
 
 class NexusRepositoryTest(TestCase):
     def setUp(self):
         logging.basicConfig(level=logging.DEBUG)
 
+    def test_upload_artifacts_verified_in_batch(self):
+        tmp_dir = tempfile.mkdtemp()
+        server = StubNexusServer().start()
+        try:
+            local_artifacts = []
+            for classifier in ('', 'sources'):
+                local_path = os.path.join(tmp_dir, 'foo-1.0{0}.jar'.format(classifier and '-' + classifier))
+                with open(local_path, 'wb') as f:
+                    f.write(b'foo')
+                local_artifacts.append(LocalArtifact(group='com.fooware', local_path=local_path, version='1.0',
+                                                     classifier=classifier))
+
+            listing = {'data': [{'relativePath': '/com/fooware/foo/1.0/foo-1.0.jar', 'leaf': True}]}
+            server.routes[('GET', '/service/local/repositories/releases/content/com/fooware/foo/1.0/')] = (
+                200, json.dumps(listing).encode(), 'application/json')
+            client = NexusRepositoryClient(repository_url=server.url)
+
+            # the sources file is "lost" by the server
+            self.assertRaises(RepositoryClientError, client.upload_artifacts, local_artifacts, 'releases',
+                              print_created_artifacts=False, use_direct_put=True, verify='batch')
+
+            # no describe request per file, one listing for the whole directory
+            self.assertEqual(['PUT', 'PUT', 'GET'], [method for method, _ in server.requests])
+        finally:
+            server.stop()
+            shutil.rmtree(tmp_dir)
+
+    def test_upload_checksum_sidecars(self):
+        tmp_dir = tempfile.mkdtemp()
+        server = StubNexusServer().start()
+        try:
+            local_path = os.path.join(tmp_dir, 'foo-1.0.rpm')
+            with open(local_path, 'wb') as f:
+                f.write(b'rpm content')
+            client = NexusRepositoryClient(repository_url=server.url)
+
+            client.upload_artifacts([LocalArtifact(group='com.fooware', local_path=local_path)], 'releases',
+                                    print_created_artifacts=False, use_direct_put=True, verify='none',
+                                    checksum_sidecars=('sha1', 'md5'))
+
+            path = 'releases/com/fooware/foo/1.0/foo-1.0.rpm'
+            self.assertEqual(b'rpm content', server.content[path])
+            self.assertEqual(hashlib.sha1(b'rpm content').hexdigest().encode(), server.content[path + '.sha1'])
+            self.assertEqual(hashlib.md5(b'rpm content').hexdigest().encode(), server.content[path + '.md5'])
+        finally:
+            server.stop()
+            shutil.rmtree(tmp_dir)
+
+    def test_upload_from_memory_and_stream(self):
+        server = StubNexusServer().start()
+        try:
+            client = NexusRepositoryClient(repository_url=server.url)
+            content = b'tarball content'
+            path = 'releases/com/fooware/foo/{version}/foo-{version}.tgz'
+
+            # buffers without checksums are sent as they are, the others through a hashing reader
+            sources = {'1.0': (memoryview(content), ()), '1.1': (six.BytesIO(content), ('sha1',)),
+                       '1.2': (bytearray(content), ('sha1',))}
+            for version, (source, checksum_sidecars) in sorted(sources.items()):
+                local_artifact = LocalArtifact(group='com.fooware', local_path='foo-{0}.tgz'.format(version),
+                                               source=source)
+                client.upload_artifacts([local_artifact], 'releases', print_created_artifacts=False,
+                                        use_direct_put=True, verify='none', checksum_sidecars=checksum_sidecars)
+
+                self.assertEqual(content, server.content[path.format(version=version)])
+                if checksum_sidecars:
+                    self.assertEqual(hashlib.sha1(content).hexdigest().encode(),
+                                     server.content[path.format(version=version) + '.sha1'])
+
+            # a stream of unknown length is sent chunked to all servers
+            replica = StubNexusServer().start()
+            try:
+                fan_out_client = NexusRepositoryClient(repository_url=server.url, replica_urls=[replica.url])
+                local_artifact = LocalArtifact(group='com.fooware', local_path='foo-1.3.tgz',
+                                               source=six.BytesIO(content))
+                fan_out_client.publish_artifacts([local_artifact], 'releases', print_created_artifacts=False,
+                                                 use_direct_put=True, verify='none')
+                self.assertEqual(content, replica.content[path.format(version='1.3')])
+                self.assertEqual('chunked', replica.put_headers['/content/repositories/' +
+                                                               path.format(version='1.3')]['Transfer-Encoding'])
+            finally:
+                replica.stop()
+
+            # multipart uploads need the length, the stream is read to memory
+            local_artifact = LocalArtifact(group='com.fooware', local_path='foo-2.0.tgz', source=six.BytesIO(content))
+            client.upload_artifacts([local_artifact], 'releases', print_created_artifacts=False, verify='none')
+
+            headers, body = server.posts['/service/local/artifact/maven/content']
+            self.assertEqual(str(len(body)), headers['Content-Length'])
+            self.assertIn(content, body)
+        finally:
+            server.stop()
+
+    def test_journal_uploads_streams(self):
+        tmp_dir = tempfile.mkdtemp()
+        server = StubNexusServer().start()
+        try:
+            client = NexusRepositoryClient(repository_url=server.url)
+            journal = UploadJournal(os.path.join(tmp_dir, 'uploads.sqlite'))
+
+            for _ in range(2):
+                local_artifacts = [LocalArtifact(group='com.fooware', local_path='foo-1.0.tgz', source=b'buffer'),
+                                   LocalArtifact(group='com.fooware', local_path='bar-1.0.tgz',
+                                                 source=six.BytesIO(b'stream'))]
+                remote_artifacts = client.upload_artifacts(local_artifacts, 'releases', print_created_artifacts=False,
+                                                           use_direct_put=True, verify='none', journal=journal)
+
+            # the buffer was skipped the second time, the stream can't be journaled
+            self.assertEqual([True, False], [getattr(a, 'journaled', False) for a in remote_artifacts])
+            self.assertEqual(b'stream', server.content['releases/com/fooware/bar/1.0/bar-1.0.tgz'])
+        finally:
+            server.stop()
+            shutil.rmtree(tmp_dir)
+
+    def test_compression(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            local_path = os.path.join(tmp_dir, 'foo-1.0.pom')
+            content = b'<project>' + b'<dependency/>' * 1000 + b'</project>'
+            with open(local_path, 'wb') as f:
+                f.write(content)
+            local_artifact = LocalArtifact(group='com.fooware', local_path=local_path)
+
+            server = StubNexusServer().start()
+            try:
+                # artifacts are sent as they are, a server ignoring Content-Encoding would store them compressed
+                client = NexusRepositoryClient(repository_url=server.url, compression='gzip')
+                client.upload_artifacts([local_artifact], 'releases', print_created_artifacts=False,
+                                        use_direct_put=True, verify='none', checksum_sidecars=('sha1',))
+
+                path = 'releases/com/fooware/foo/1.0/foo-1.0.pom'
+                self.assertEqual(content, server.content[path])
+                self.assertNotIn('Content-Encoding', server.put_headers['/content/repositories/' + path])
+                self.assertEqual(hashlib.sha1(content).hexdigest().encode(), server.content[path + '.sha1'])
+            finally:
+                server.stop()
+
+            data = {'data': {'stagedRepositoryIds': ['releases-{0}'.format(i) for i in range(1000)]}}
+            for accept_compression in (True, False):
+                server = StubNexusServer(accept_compression=accept_compression).start()
+                try:
+                    client = NexusRepositoryClient(repository_url=server.url, compression='deflate')
+                    client._send_json('service/local/staging/bulk/close', data, method='POST')
+
+                    headers, body = server.posts['/service/local/staging/bulk/close']
+                    if accept_compression:
+                        self.assertEqual('deflate', headers['Content-Encoding'])
+                        body = zlib.decompress(body)
+                    self.assertEqual(data, json.loads(body.decode('utf-8')))
+                    # compression is turned off after the server refused it
+                    self.assertEqual('deflate' if accept_compression else None, client._compression)
+                finally:
+                    server.stop()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_publish_artifacts(self):
+        tmp_dir = tempfile.mkdtemp()
+        servers = []
+        try:
+            local_artifacts = []
+            for name, size in (('foo', 3 * 1024 * 1024 + 1), ('bar', 10)):
+                local_path = os.path.join(tmp_dir, '{name}-1.0.jar'.format(name=name))
+                with open(local_path, 'wb') as f:
+                    f.write(os.urandom(size))
+                local_artifacts.append(LocalArtifact(group='com.fooware', local_path=local_path))
+
+            failing_path = '/content/repositories/releases/com/fooware/foo/1.0/foo-1.0.jar'
+            servers = [StubNexusServer().start(), StubNexusServer().start(),
+                       StubNexusServer(routes={('PUT', failing_path): (500, b'')}).start()]
+            urls = [server.url for server in servers]
+            client = NexusRepositoryClient(repository_url=urls[0], replica_urls=urls[1:])
+
+            with self.assertRaises(PublishError) as cm:
+                client.publish_artifacts(local_artifacts, 'releases', print_created_artifacts=False,
+                                         use_direct_put=True, verify='none', checksum_sidecars=('sha1',))
+            self.assertEqual([urls[2]], cm.exception.result.failed)
+
+            result = client.publish_artifacts(local_artifacts, 'releases', required='primary',
+                                              print_created_artifacts=False, use_direct_put=True, verify='none',
+                                              checksum_sidecars=('sha1',))
+            self.assertEqual(urls[:2], result.succeeded)
+            self.assertEqual(['foo', 'bar'], [a.artifact for a in result.remote_artifacts[urls[1]]])
+            # the failed server gets no more artifacts
+            self.assertEqual([], result.remote_artifacts[urls[2]])
+            self.assertNotIn('releases/com/fooware/bar/1.0/bar-1.0.jar', servers[2].content)
+
+            for server in servers[:2]:
+                for local_artifact in local_artifacts:
+                    path = 'releases/com/fooware/{name}/1.0/{name}-1.0.jar'.format(name=local_artifact.artifact)
+                    with open(local_artifact.local_path, 'rb') as f:
+                        content = f.read()
+                    self.assertEqual(content, server.content[path])
+                    self.assertEqual(hashlib.sha1(content).hexdigest().encode(), server.content[path + '.sha1'])
+        finally:
+            for server in servers:
+                server.stop()
+            shutil.rmtree(tmp_dir)
+
     def test_first_contains_second(self):
         first = {u'repositoryId': u'test-1345', u'profileType': u'repository'}
         second = {"repositoryId": "test-1345"}
@@ -15,4 +275,197 @@ class NexusRepositoryTest(TestCase):
         self.assertTrue(NexusRepositoryClient._first_contains_second(first, second))
         self.assertFalse(NexusRepositoryClient._first_contains_second(second, first))
         self.assertFalse(NexusRepositoryClient._first_contains_second(dict(x=1), dict(y=1)))
-        self.assertRaises(WrongDataTypeError, NexusRepositoryClient._first_contains_second, 123, 'abc')
\ No newline at end of file
+        self.assertRaises(WrongDataTypeError, NexusRepositoryClient._first_contains_second, 123, 'abc')
+
+
+class NexusProRepositoryTest(TestCase):
+    def setUp(self):
+        logging.basicConfig(level=logging.DEBUG)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.local_artifacts = []
+
+        for i in range(5):
+            local_path = os.path.join(self.tmp_dir, 'foo{i}-1.0.txt'.format(i=i))
+            with open(local_path, 'w') as f:
+                f.write('foo')
+            self.local_artifacts.append(LocalArtifact(group='com.fooware', local_path=local_path))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_upload_artifacts_to_new_staging_pipelined(self):
+        client = OfflineNexusProRepositoryClient()
+        remote_artifacts = client.upload_artifacts_to_new_staging(self.local_artifacts, 'releases',
+                                                                  print_created_artifacts=False, pipelined=True)
+
+        self.assertEqual(['foo{i}'.format(i=i) for i in range(5)], [a.artifact for a in remote_artifacts])
+        self.assertEqual(['releases-1000'], client.closed)
+        self.assertEqual([], client.dropped)
+
+    def test_upload_artifacts_to_new_staging_pipelined_filelist(self):
+        client = OfflineNexusProRepositoryClient()
+        client.upload_artifacts_to_new_staging(self.local_artifacts, 'releases', print_created_artifacts=False,
+                                               upload_filelist=True, pipelined=True, verify='none',
+                                               checksum_sidecars=('sha1',))
+
+        self.assertEqual(['service/local/staging/deployByRepositoryId/releases-1000/releases-1000-filelist'],
+                         client.sent)
+        # files were hashed while the repository was created
+        for local_artifact in self.local_artifacts:
+            self.assertNotEqual(None, local_artifact.source.get_cached_checksums(('sha1',)))
+
+    def test_upload_component_by_default_one_by_one(self):
+        local_artifacts = []
+        for extension in ('jar', 'pom'):
+            local_path = os.path.join(self.tmp_dir, 'bar-1.0.{ext}'.format(ext=extension))
+            with open(local_path, 'w') as f:
+                f.write('bar')
+            local_artifacts.append(LocalArtifact(group='com.fooware', local_path=local_path))
+
+        client = OfflineNexusProRepositoryClient()
+        client._max_assets_per_upload = 2
+        remote_artifacts = client.upload_artifacts(local_artifacts, 'releases', print_created_artifacts=False)
+        self.assertEqual(['jar', 'pom'], [a.extension for a in remote_artifacts])
+
+    def test_upload_artifacts_to_new_staging_pipelined_drops_on_failure(self):
+        client = OfflineNexusProRepositoryClient(failing_filename='foo3-1.0.txt')
+        self.assertRaises(IOError, client.upload_artifacts_to_new_staging, self.local_artifacts, 'releases',
+                          print_created_artifacts=False, pipelined=True)
+        self.assertEqual([], client.closed)
+        self.assertEqual(['releases-1000'], client.dropped)
+
+    def test_upload_artifacts_to_new_staging_pipelined_missing_file(self):
+        client = OfflineNexusProRepositoryClient()
+        os.unlink(self.local_artifacts[2].local_path)
+        self.assertRaises(RepositoryClientError, client.upload_artifacts_to_new_staging, self.local_artifacts, 'releases',
+                          print_created_artifacts=False, pipelined=True)
+        self.assertEqual(['releases-1000'], client.dropped)
+
+    def test_set_artifacts_metadata_sends_only_changes(self):
+        client = OfflineNexusProRepositoryClient()
+        client.metadata = {
+            'com.fooware:foo:1.0::': {'build': '1', 'branch': 'master'},
+            'com.fooware:bar:1.0::': {'build': '1', 'branch': 'master'},
+        }
+        artifacts_metadata = [
+            (RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:foo:1.0'),
+             {'build': '1', 'branch': 'master'}),
+            (RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:bar:1.0'),
+             {'build': '2', 'branch': 'master'}),
+            (RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:baz:1.0'),
+             {'build': '1'}),
+        ]
+
+        changed = client.set_artifacts_metadata(artifacts_metadata)
+
+        self.assertEqual(['bar', 'baz'], [a.artifact for a in changed])
+        self.assertEqual([('com.fooware:bar:1.0::', {'build': '2'}), ('com.fooware:baz:1.0::', {'build': '1'})],
+                         sorted(client.sent_metadata))
+
+    def test_set_artifacts_metadata_wrong_type(self):
+        client = OfflineNexusProRepositoryClient()
+        artifact = RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:foo:1.0')
+        self.assertRaises(RepositoryClientError, client.set_artifacts_metadata, [(artifact, '{"a": "b"}')])
+
+    def test_encode_artifact_urn(self):
+        from repositorytools.lib.repository import _encode_artifact_urn
+
+        encoded = _encode_artifact_urn('com.fooware:foo:1.0::')
+        self.assertEqual('dXJuOm1hdmVuL2FydGlmYWN0I2NvbS5mb293YXJlOmZvbzoxLjA6Og==', encoded)
+        self.assertTrue(isinstance(encoded, six.text_type))
+        self.assertEqual(encoded, _encode_artifact_urn('com.fooware:foo:1.0::'))
+
+    def test_get_artifacts_metadata(self):
+        client = OfflineNexusProRepositoryClient()
+        client.metadata = {'com.fooware:foo:1.0::': {'build': '1'}, 'com.fooware:bar:1.0::': {'build': '2'}}
+        artifacts = [RemoteArtifact.from_repo_id_and_coordinates('releases', coordinates)
+                     for coordinates in ['com.fooware:foo:1.0', 'com.fooware:bar:1.0', 'com.fooware:baz:1.0']]
+
+        self.assertEqual([{'build': '1'}, {'build': '2'}, {}], client.get_artifacts_metadata(artifacts))
+
+    def test_resolve_latest(self):
+        client = OfflineNexusProRepositoryClient()
+        client.content['content/repositories/releases/com/fooware/foo/maven-metadata.xml'] = b'''<metadata>
+            <groupId>com.fooware</groupId><artifactId>foo</artifactId>
+            <versioning><versions>
+                <version>1.0</version><version>1.9</version><version>1.10</version><version>2.0</version>
+            </versions></versioning>
+        </metadata>'''
+
+        artifact = RemoteArtifact.from_repo_id_and_coordinates('releases', 'com.fooware:foo:[1.0,2.0)')
+        self.assertEqual('1.10', client.resolve_latest(artifact))
+        self.assertEqual('1.10', artifact.version)
+        self.assertEqual('2.0', client.resolve_latest(artifact, version_range='[1.0,)'))
+        self.assertRaises(ArtifactNotFoundError, client.resolve_latest, artifact, '[3.0,)')
+
+        # versions are downloaded only once
+        self.assertEqual(1, len(client.sent))
+
+    def test_wait_for_staging_state(self):
+        server = StubNexusServer().start()
+        try:
+            responses = {'releases-1000': [{'type': 'open', 'transitioning': True}] * 2 + [{'type': 'closed'}],
+                         'releases-1001': [{'type': 'closed'}],
+                         'releases-1002': [{'type': 'open', 'notifications': 1}],
+                         'releases-1003': [{'type': 'closed', 'transitioning': True}, None]}
+
+            def route(repo_id):
+                def respond():
+                    states = responses[repo_id]
+                    state = states.pop(0) if len(states) > 1 else states[0]
+                    if state is None:
+                        return 404, b''
+                    return 200, json.dumps(state).encode()
+                return respond
+
+            for repo_id in responses:
+                server.routes[('GET', '/service/local/staging/repository/' + repo_id)] = route(repo_id)
+
+            client = NexusProRepositoryClient(repository_url=server.url)
+            reached = []
+            result = client.wait_for_staging_state(['releases-1000', 'releases-1001'], 'closed', initial_interval=0.01,
+                                                   on_reached=lambda repo_id, data: reached.append(repo_id))
+
+            self.assertEqual(['releases-1001', 'releases-1000'], reached)
+            self.assertEqual('closed', result['releases-1000']['type'])
+            # repositories which got to the state aren't polled anymore
+            self.assertEqual(1, len([r for r in server.requests if r[1].endswith('releases-1001')]))
+            self.assertEqual(3, len([r for r in server.requests if r[1].endswith('releases-1000')]))
+
+            # close failed
+            self.assertRaises(StagingStateError, client.wait_for_staging_state, ['releases-1002'], 'closed')
+            # dropped after release
+            self.assertEqual({'releases-1003': None}, client.wait_for_staging_state(['releases-1003'], 'released',
+                                                                                    initial_interval=0.01))
+            # never existed
+            self.assertRaises(StagingStateError, client.wait_for_staging_state, ['releases-1004'], 'released')
+            self.assertRaises(StagingStateError, client.wait_for_staging_state, ['releases-1000'], 'released',
+                              timeout=0.05, initial_interval=0.01)
+        finally:
+            server.stop()
+
+    def test_upload_filelist_streamed(self):
+        server = StubNexusServer().start()
+        try:
+            for compress in (False, True):
+                client = OfflineNexusProRepositoryClient()
+                client._repository_url = server.url
+                # use real HTTP for the filelist
+                client._send = super(OfflineNexusProRepositoryClient, client)._send
+
+                client.upload_artifacts_to_staging(self.local_artifacts, 'releases-1000',
+                                                   print_created_artifacts=False, upload_filelist=True,
+                                                   max_workers=3, compress_filelist=compress)
+
+                headers, body = server.posts[
+                    '/service/local/staging/deployByRepositoryId/releases-1000/releases-1000-filelist']
+                self.assertEqual('chunked', headers.get('Transfer-Encoding'))
+
+                if compress:
+                    self.assertEqual('gzip', headers.get('Content-Encoding'))
+                    body = gzip.GzipFile(fileobj=six.BytesIO(body)).read()
+
+                self.assertEqual('\n'.join('com.fooware:foo{i}:1.0::txt'.format(i=i) for i in range(5)),
+                                 body.decode('utf-8'))
+        finally:
+            server.stop()
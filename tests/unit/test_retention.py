@@ -0,0 +1,96 @@
+from unittest import TestCase
+
+from repositorytools import RemoteArtifact, RetentionRule, plan_artifacts_cleanup, plan_staging_cleanup
+
+DAY = 24 * 60 * 60
+NOW = 1500000000  # 2017-07-14 02:40:00 UTC
+
+
+def remote_artifact(coordinates, last_modified='2017-07-01 00:00:00.0 UTC'):
+    result = RemoteArtifact.from_repo_id_and_coordinates('releases', coordinates)
+    result.url = coordinates
+    result.last_modified = last_modified
+    return result
+
+
+class OfflineClient(object):
+    def __init__(self):
+        self.deleted = []
+        self.missing_ok = []
+        self.dropped = []
+
+    def delete_artifacts(self, urls, max_workers, missing_ok=False):
+        (self.missing_ok if missing_ok else self.deleted).extend(urls)
+
+    def drop_staging_repos(self, repo_ids, description):
+        self.dropped.append(repo_ids)
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        self.artifacts = [
+            remote_artifact('com.fooware:foo:1.9::jar', '2017-01-01 00:00:00.0 UTC'),
+            remote_artifact('com.fooware:foo:1.9::pom', '2017-01-01 00:00:00.0 UTC'),
+            remote_artifact('com.fooware:foo:1.10::jar', '2017-02-01 00:00:00.0 UTC'),
+            remote_artifact('com.fooware:foo:2.0::jar', '2017-07-10 00:00:00.0 UTC'),
+            remote_artifact('com.fooware:foo:2.1::jar', '2017-07-13 00:00:00.0 UTC'),
+            remote_artifact('com.fooware:bar:1.0::jar', '2017-01-01 00:00:00.0 UTC'),
+        ]
+
+    def test_keep_last(self):
+        plan = plan_artifacts_cleanup(self.artifacts, RetentionRule(keep_last=2), now=NOW)
+        self.assertEqual(['delete com.fooware:foo:1.10::jar', 'delete com.fooware:foo:1.9::jar',
+                          'delete com.fooware:foo:1.9::pom'], plan.describe())
+
+    def test_older_than_and_pattern(self):
+        rules = [RetentionRule(pattern='com.fooware:bar:*', keep_last=1),
+                 RetentionRule(pattern='com.fooware:foo:*', older_than_days=30)]
+        plan = plan_artifacts_cleanup(self.artifacts, rules, now=NOW)
+        self.assertEqual(['1.10', '1.9', '1.9'], [a.version for a in plan.artifacts])
+
+        plan = plan_artifacts_cleanup(self.artifacts, RetentionRule(pattern='com.fooware:foo:1.*', keep_last=1),
+                                      now=NOW)
+        self.assertEqual(['1.9', '1.9'], [a.version for a in plan.artifacts])
+
+    def test_whole_directories(self):
+        base = 'http://localhost/content/repositories/releases/com/fooware/foo/'
+        artifacts = [remote_artifact('com.fooware:foo:1.0::jar'), remote_artifact('com.fooware:foo:1.0::pom'),
+                     remote_artifact('com.fooware:foo:1.0-20170101.000000-1::jar'),
+                     remote_artifact('com.fooware:foo:1.0-20170102.000000-2::jar'),
+                     remote_artifact('com.fooware:foo:2.0::jar')]
+        for a in artifacts:
+            directory = '1.0-SNAPSHOT' if a.version.startswith('1.0-') else a.version
+            a.url = '{base}{directory}/foo-{version}.{extension}'.format(base=base, directory=directory,
+                                                                          version=a.version, extension=a.extension)
+
+        rules = [RetentionRule(pattern='com.fooware:foo:1.0-20170101*', keep_last=0),
+                 RetentionRule(pattern='com.fooware:foo:1.0', keep_last=0)]
+        plan = plan_artifacts_cleanup(artifacts, rules, now=NOW, whole_directories=True)
+        self.assertEqual(['delete {base}1.0/'.format(base=base), 'delete ' + artifacts[2].url], plan.describe())
+
+        client = OfflineClient()
+        plan.execute(client)
+        self.assertEqual([base + '1.0/', artifacts[2].url], client.deleted)
+        self.assertIn(artifacts[2].url + '.sha1', client.missing_ok)
+        self.assertEqual(5, len(client.missing_ok))
+
+        # without whole_directories only the artifacts and their checksums are deleted
+        plan = plan_artifacts_cleanup(artifacts, rules, now=NOW)
+        self.assertEqual(sorted('delete ' + a.url for a in artifacts[:3]), sorted(plan.describe()))
+
+    def test_staging(self):
+        repos = [
+            {'repositoryId': 'releases-1001', 'profileName': 'releases', 'createdTimestamp': (NOW - 10 * DAY) * 1000},
+            {'repositoryId': 'releases-1002', 'profileName': 'releases', 'createdTimestamp': (NOW - 5 * DAY) * 1000},
+            {'repositoryId': 'releases-1003', 'profileName': 'releases', 'createdTimestamp': (NOW - 1 * DAY) * 1000},
+            {'repositoryId': 'other-1000', 'profileName': 'other', 'createdTimestamp': (NOW - 10 * DAY) * 1000},
+            {'repositoryId': 'unknown-1000', 'profileName': None, 'createdTimestamp': NOW * 1000},
+        ]
+
+        plan = plan_staging_cleanup(repos, RetentionRule(pattern='releases-*', older_than_days=3), now=NOW)
+        self.assertEqual(['drop releases-1002', 'drop releases-1001'], plan.describe())
+
+        client = OfflineClient()
+        plan = plan_staging_cleanup(repos, RetentionRule(keep_last=1), now=NOW)
+        plan.execute(client, batch_size=1)
+        self.assertEqual([['releases-1001'], ['releases-1002']], sorted(client.dropped))
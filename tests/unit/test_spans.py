@@ -0,0 +1,52 @@
+from unittest import TestCase
+import threading
+
+from repositorytools import span, SpanRecorder
+
+
+class SpanRecorderTest(TestCase):
+    def test_nested(self):
+        with SpanRecorder() as recorder:
+            with span('release'):
+                for _ in range(3):
+                    with span('http'):
+                        pass
+                with span('promote'):
+                    with span('http'):
+                        pass
+
+            with span('http'):
+                pass
+
+        paths = [(path, calls) for path, calls, total, max_ in recorder.get_summary()]
+        self.assertEqual([(('release',), 1), (('release', 'http'), 3), (('release', 'promote'), 1),
+                          (('release', 'promote', 'http'), 1), (('http',), 1)], paths)
+
+        lines = recorder.format_summary().splitlines()
+        self.assertEqual(['span', 'calls', 'total', 's', 'mean', 's', 'max', 's'], lines[0].split())
+        self.assertEqual(['release', 'http', 'promote', 'http', 'http'], [line.split()[0] for line in lines[1:]])
+        self.assertTrue(lines[4].startswith('    http '))
+
+    def test_threads(self):
+        def work():
+            with span('upload'):
+                pass
+
+        with SpanRecorder() as recorder:
+            with span('release'):
+                threads = [threading.Thread(target=work) for _ in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        # spans of other threads aren't nested in spans of this one
+        self.assertEqual([(('release',), 1), (('upload',), 4)],
+                         [(path, calls) for path, calls, total, max_ in recorder.get_summary()])
+
+    def test_not_recording(self):
+        recorder = SpanRecorder()
+        with span('http'):
+            pass
+
+        self.assertEqual([], recorder.get_summary())
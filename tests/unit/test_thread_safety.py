@@ -0,0 +1,67 @@
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from repositorytools import NexusRepositoryClient, LocalArtifact, RemoteArtifact
+from repositorytools.lib.concurrency import map_concurrently
+
+from stub_nexus import StubNexusServer
+
+THREADS = 16
+TASKS = 400
+
+
+class ThreadSafetyTest(TestCase):
+    """
+    One client shared by many threads, which upload, resolve, read and delete at once
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        data = {'data': {'repositoryPath': '/com/fooware/foo/1.0/foo-1.0.jar', 'presentLocally': True,
+                         'snapshot': False, 'snapshotBuildNumber': None, 'snapshotTimeStamp': None}}
+        routes = {('GET', '/service/local/artifact/maven/resolve'): (200, json.dumps(data).encode(),
+                                                                     'application/json')}
+        self.server = StubNexusServer(routes=routes, keep_alive=True).start()
+        self.client = NexusRepositoryClient(repository_url=self.server.url, user='admin', password='secret')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def _task(self, i):
+        local_path = os.path.join(self.tmp_dir, 'foo{i}-1.0.jar'.format(i=i))
+        with open(local_path, 'wb') as f:
+            f.write('content of {i}'.format(i=i).encode())
+
+        local_artifact = LocalArtifact(group='com.fooware', local_path=local_path)
+        remote_artifact = self.client.upload_artifacts([local_artifact], 'releases', print_created_artifacts=False,
+                                                       use_direct_put=True, verify='none')[0]
+
+        path = 'com/fooware/foo{i}/1.0/foo{i}-1.0.jar'.format(i=i)
+        content = self.client.read_content('releases', path)
+
+        resolved = RemoteArtifact(group='com.fooware', artifact='foo', version='1.0', repo_id='releases')
+        self.client.resolve_artifact(resolved)
+
+        if i % 2:
+            self.client.delete_artifact(remote_artifact.url)
+
+        return content, resolved.url, threading.current_thread().ident
+
+    def test_shared_client(self):
+        results = map_concurrently(self._task, range(TASKS), THREADS)
+
+        self.assertEqual(['content of {i}'.format(i=i) for i in range(TASKS)], [r[0] for r in results])
+        self.assertEqual(set([self.client.get_content_url('releases', 'com/fooware/foo/1.0/foo-1.0.jar')]),
+                         set(r[1] for r in results))
+        self.assertEqual(TASKS // 2, len(self.server.content))
+
+        # each thread has its own session, all of them send credentials and share warm connections
+        self.assertEqual(THREADS, len(set(r[2] for r in results)))
+        self.assertEqual(1, len(self.server.authorizations))
+        self.assertNotIn(None, self.server.authorizations)
+        self.assertLessEqual(self.server.connections, THREADS)
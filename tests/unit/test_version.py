@@ -0,0 +1,48 @@
+from unittest import TestCase
+
+from repositorytools import VersionRange, VersionError, compare_versions, sort_versions, latest_version
+
+
+class VersionTest(TestCase):
+    def assert_ordered(self, versions, scheme='maven'):
+        for older, newer in zip(versions, versions[1:]):
+            self.assertTrue(compare_versions(older, newer, scheme) < 0, '{0} < {1}'.format(older, newer))
+            self.assertTrue(compare_versions(newer, older, scheme) > 0, '{0} > {1}'.format(newer, older))
+
+    def test_maven_qualifiers(self):
+        self.assert_ordered(['1-alpha2snapshot', '1-alpha2', '1-alpha-123', '1-beta-2', '1-beta123', '1-m2', '1-m11',
+                             '1-rc', '1-cr2', '1-rc123', '1-SNAPSHOT', '1', '1-sp', '1-sp2', '1-sp123', '1-abc',
+                             '1-def', '1-pom-1', '1-1-snapshot', '1-1', '1-2', '1-123'])
+
+    def test_maven_numbers(self):
+        self.assert_ordered(['2.0', '2-1', '2.0.a', '2.0.0.a', '2.0.2', '2.0.123', '2.1.0', '2.1-a', '2.1b', '2.1-c',
+                             '2.1-1', '2.1.0.1', '2.2', '2.123', '11.a2', '11.a11', '11.b2', '11.b11', '11.m2',
+                             '11.m11', '11', '11.a', '11b', '11c', '11m'])
+
+    def test_maven_equal(self):
+        for first, second in [('1', '1.0'), ('1', '1.0.0'), ('1-ga', '1'), ('1a', '1-a'), ('1.0-final', '1'),
+                              ('1-cr1', '1-rc1'), ('1.0-ALPHA1', '1.0-a1')]:
+            self.assertEqual(0, compare_versions(first, second), '{0} == {1}'.format(first, second))
+
+    def test_rpm(self):
+        self.assert_ordered(['1.0~rc1', '1.0', '1.0^git1', '1.0a', '1.0.0', '1.01.1', '2a', '2.0', '10xyz',
+                             '10.1xyz'], scheme='rpm')
+        self.assert_ordered(['5.5p1', '5.5p10'], scheme='rpm')
+        self.assert_ordered(['0.1.4-1.el6', '0.1.4-2.el6', '0.1.10-1.el6', '1:0.0.1-1'], scheme='rpm')
+        self.assertEqual(0, compare_versions('1.0', '1.0-5', 'rpm'))
+
+    def test_sort_and_latest(self):
+        versions = ['1.10', '1.9', '1.0-rc1', '2.0', '1.0', '1.11-SNAPSHOT']
+        self.assertEqual(['1.0-rc1', '1.0', '1.9', '1.10', '1.11-SNAPSHOT', '2.0'], sort_versions(versions))
+        self.assertEqual('1.10', latest_version(versions, '[1.0,2.0)'))
+        self.assertEqual('1.11-SNAPSHOT', latest_version(versions, '[1.0,2.0)', include_snapshots=True))
+        self.assertEqual('2.0', latest_version(versions))
+        self.assertEqual(None, latest_version(versions, '[3.0,)'))
+
+    def test_range(self):
+        version_range = VersionRange('(,1.0],[1.5],[2.0,3.0)')
+        self.assertEqual([True, True, False, True, True, False],
+                         [v in version_range for v in ['0.9', '1.0', '1.2', '1.5', '2.9', '3.0']])
+        self.assertTrue('1.0-5.el6' in VersionRange('[1.0-1,1.1)', 'rpm'))
+        self.assertRaises(VersionError, VersionRange, '[1.0')
+        self.assertRaises(VersionError, VersionRange, '(1.0)')